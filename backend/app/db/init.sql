@@ -1,5 +1,6 @@
 CREATE EXTENSION IF NOT EXISTS vector;
 CREATE EXTENSION IF NOT EXISTS "pgcrypto";
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 CREATE TABLE IF NOT EXISTS inbox_events (
     id              UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -43,6 +44,28 @@ CREATE TABLE IF NOT EXISTS enforcement_log (
     created_at      TIMESTAMPTZ DEFAULT NOW()
 );
 
+CREATE TABLE IF NOT EXISTS enforcement_runs (
+    id              UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    check_type      VARCHAR(30) NOT NULL,
+    timezone        VARCHAR(64) NOT NULL,
+    run_date        DATE NOT NULL,
+    status          VARCHAR(20) DEFAULT 'running',
+    owner           VARCHAR(200),
+    checked         INTEGER DEFAULT 0,
+    reminders       INTEGER DEFAULT 0,
+    last_task_id    UUID,
+    checkpoint_at   TIMESTAMPTZ,
+    started_at      TIMESTAMPTZ DEFAULT NOW(),
+    finished_at     TIMESTAMPTZ,
+    UNIQUE (check_type, timezone, run_date)
+);
+
+ALTER TABLE enforcement_log ADD COLUMN IF NOT EXISTS run_id UUID REFERENCES enforcement_runs(id);
+ALTER TABLE inbox_events ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(64);
+ALTER TABLE inbox_events ADD COLUMN IF NOT EXISTS response_json JSONB;
+-- Lease for the in-flight claim on idempotency_key; created_at is left as the event's creation time.
+ALTER TABLE inbox_events ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMPTZ;
+
 CREATE TABLE IF NOT EXISTS audit_log (
     id              UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     actor           VARCHAR(100) NOT NULL,
@@ -67,11 +90,58 @@ CREATE TABLE IF NOT EXISTS kb_chunks (
     chunk_index     INTEGER,
     chunk_text      TEXT NOT NULL,
     section_ref     VARCHAR(100),
+    section_path    TEXT,
     embedding       VECTOR(1536),
     created_at      TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Single row, bumped by ingest_sops in the same transaction as its KB writes.
+CREATE TABLE IF NOT EXISTS kb_version (
+    id              SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version         BIGINT NOT NULL DEFAULT 0,
+    chunk_count     INTEGER NOT NULL DEFAULT 0,
+    updated_at      TIMESTAMPTZ DEFAULT NOW()
+);
+
+INSERT INTO kb_version (id) VALUES (1) ON CONFLICT DO NOTHING;
+
+-- Extracted attachment text keyed by content hash, so reposted files are not reprocessed.
+CREATE TABLE IF NOT EXISTS attachment_texts (
+    sha256          CHAR(64) PRIMARY KEY,
+    content_type    VARCHAR(100),
+    size_bytes      BIGINT,
+    extractor       VARCHAR(30),
+    text            TEXT,
+    created_at      TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- One row per place a chunk occurs; near-duplicate chunks share one kb_chunks row.
+CREATE TABLE IF NOT EXISTS kb_chunk_sources (
+    id              UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    chunk_id        UUID NOT NULL REFERENCES kb_chunks(id) ON DELETE CASCADE,
+    doc_id          UUID NOT NULL REFERENCES kb_docs(id) ON DELETE CASCADE,
+    chunk_index     INTEGER,
+    section_ref     VARCHAR(100),
+    section_path    TEXT,
+    similarity      REAL DEFAULT 1.0,
+    created_at      TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Heading hierarchy of a chunk, e.g. "SOP > §2 What Can Be Purchased > §2.1 Employee Assets".
+ALTER TABLE kb_chunks ADD COLUMN IF NOT EXISTS section_path TEXT;
+ALTER TABLE kb_chunk_sources ADD COLUMN IF NOT EXISTS section_path TEXT;
+
 CREATE INDEX IF NOT EXISTS kb_chunks_embedding_idx ON kb_chunks USING ivfflat (embedding vector_cosine_ops) WITH (lists = 20);
+-- Serves the ILIKE keyword fallback in knowledge_base._keyword_search.
+CREATE INDEX IF NOT EXISTS kb_chunks_chunk_text_trgm_idx ON kb_chunks USING gin (chunk_text gin_trgm_ops);
 CREATE INDEX IF NOT EXISTS audit_log_created_at_idx ON audit_log (created_at DESC);
+CREATE INDEX IF NOT EXISTS tasks_created_at_idx ON tasks (created_at DESC);
+-- Enforcement candidates: open tasks by due date and priority.
+CREATE INDEX IF NOT EXISTS tasks_open_due_date_priority_idx ON tasks (due_date, priority) WHERE status = 'open';
+CREATE INDEX IF NOT EXISTS inbox_events_created_at_idx ON inbox_events (created_at DESC);
+CREATE INDEX IF NOT EXISTS enforcement_log_created_at_idx ON enforcement_log (created_at DESC);
 CREATE INDEX IF NOT EXISTS tasks_escalation_state_due_date_idx ON tasks (escalation_state, due_date);
+CREATE UNIQUE INDEX IF NOT EXISTS inbox_events_idempotency_key_idx ON inbox_events (idempotency_key);
 CREATE INDEX IF NOT EXISTS inbox_events_channel_created_at_idx ON inbox_events (source_channel, created_at DESC);
+CREATE INDEX IF NOT EXISTS enforcement_log_task_check_created_at_idx ON enforcement_log (task_id, check_type, created_at DESC);
+CREATE INDEX IF NOT EXISTS kb_chunk_sources_chunk_id_idx ON kb_chunk_sources (chunk_id);
@@ -1,7 +1,7 @@
 from datetime import date, datetime
 from typing import Any
 
-from sqlalchemy import JSON, Boolean, Date, DateTime, ForeignKey, Integer, SmallInteger, String, Text
+from sqlalchemy import JSON, BigInteger, Boolean, Date, DateTime, Float, ForeignKey, Integer, SmallInteger, String, Text, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from pgvector.sqlalchemy import Vector
@@ -25,6 +25,9 @@ class InboxEvent(Base):
     raw_json: Mapped[dict[str, Any] | None] = mapped_column(JSON)
     pipeline: Mapped[str | None] = mapped_column(String(50))
     intake_tier: Mapped[int] = mapped_column(SmallInteger, default=2)
+    idempotency_key: Mapped[str | None] = mapped_column(String(64), unique=True)
+    response_json: Mapped[dict[str, Any] | None] = mapped_column(JSON)
+    claimed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
 
     tasks: Mapped[list["Task"]] = relationship(back_populates="inbox_event")
@@ -60,9 +63,28 @@ class EnforcementLog(Base):
     check_type: Mapped[str | None] = mapped_column(String(30))
     has_update: Mapped[bool | None] = mapped_column(Boolean)
     notified_user: Mapped[str | None] = mapped_column(String(100))
+    run_id: Mapped[str | None] = mapped_column(UUID(as_uuid=False), ForeignKey("enforcement_runs.id"))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
 
 
+class EnforcementRun(Base):
+    __tablename__ = "enforcement_runs"
+    __table_args__ = (UniqueConstraint("check_type", "timezone", "run_date"),)
+
+    id: Mapped[str] = mapped_column(UUID(as_uuid=False), primary_key=True, server_default="gen_random_uuid()")
+    check_type: Mapped[str] = mapped_column(String(30), nullable=False)
+    timezone: Mapped[str] = mapped_column(String(64), nullable=False)
+    run_date: Mapped[date] = mapped_column(Date, nullable=False)
+    status: Mapped[str] = mapped_column(String(20), default="running")
+    owner: Mapped[str | None] = mapped_column(String(200))
+    checked: Mapped[int] = mapped_column(Integer, default=0)
+    reminders: Mapped[int] = mapped_column(Integer, default=0)
+    last_task_id: Mapped[str | None] = mapped_column(UUID(as_uuid=False))
+    checkpoint_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+
+
 class AuditLog(Base):
     __tablename__ = "audit_log"
 
@@ -93,5 +115,39 @@ class KbChunk(Base):
     chunk_index: Mapped[int | None] = mapped_column(Integer)
     chunk_text: Mapped[str] = mapped_column(Text, nullable=False)
     section_ref: Mapped[str | None] = mapped_column(String(100))
+    section_path: Mapped[str | None] = mapped_column(Text)
     embedding: Mapped[list[float] | None] = mapped_column(Vector(1536))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class AttachmentText(Base):
+    __tablename__ = "attachment_texts"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    content_type: Mapped[str | None] = mapped_column(String(100))
+    size_bytes: Mapped[int | None] = mapped_column(BigInteger)
+    extractor: Mapped[str | None] = mapped_column(String(30))
+    text: Mapped[str | None] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class KbVersion(Base):
+    __tablename__ = "kb_version"
+
+    id: Mapped[int] = mapped_column(SmallInteger, primary_key=True, default=1)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    chunk_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class KbChunkSource(Base):
+    __tablename__ = "kb_chunk_sources"
+
+    id: Mapped[str] = mapped_column(UUID(as_uuid=False), primary_key=True, server_default="gen_random_uuid()")
+    chunk_id: Mapped[str] = mapped_column(UUID(as_uuid=False), ForeignKey("kb_chunks.id", ondelete="CASCADE"), nullable=False)
+    doc_id: Mapped[str] = mapped_column(UUID(as_uuid=False), ForeignKey("kb_docs.id", ondelete="CASCADE"), nullable=False)
+    chunk_index: Mapped[int | None] = mapped_column(Integer)
+    section_ref: Mapped[str | None] = mapped_column(String(100))
+    section_path: Mapped[str | None] = mapped_column(Text)
+    similarity: Mapped[float] = mapped_column(Float, default=1.0)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
@@ -1,8 +1,29 @@
+import atexit
 import json
 import logging
-from logging.config import dictConfig
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
 from typing import Any, Dict
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else arrived through extra={...}.
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    if orjson is not None:
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(data, default=str, separators=(",", ":"))
+
 
 class JsonFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
@@ -12,28 +33,93 @@ class JsonFormatter(logging.Formatter):
             "message": record.getMessage(),
             "time": self.formatTime(record, self.datefmt),
         }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            log_record["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                log_record[key] = value
         if record.exc_info:
             log_record["exc_info"] = self.formatException(record.exc_info)
-        return json.dumps(log_record)
-
-
-def setup_logging(level: str = "INFO") -> None:
-    dictConfig(
-        {
-            "version": 1,
-            "disable_existing_loggers": False,
-            "formatters": {
-                "json": {"()": JsonFormatter},
-            },
-            "handlers": {
-                "default": {
-                    "class": "logging.StreamHandler",
-                    "formatter": "json",
-                }
-            },
-            "root": {
-                "handlers": ["default"],
-                "level": level,
-            },
-        }
-    )
+        return _dumps(log_record)
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or self.rate >= 1.0 or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge args here; JSON encoding and traceback formatting happen
+        # on the listener thread instead of the event loop.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+class _DrainingListener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Wait for room so a full queue still drains before shutdown.
+        self.queue.put(self._sentinel)
+
+
+_listener: QueueListener | None = None
+_queue: queue.Queue[logging.LogRecord] | None = None
+
+
+def setup_logging(level: str = "INFO", debug_sample_rate: float = 1.0, queue_size: int = 10000) -> None:
+    global _listener, _queue
+    shutdown_logging()
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter())
+    log_queue: queue.Queue[logging.LogRecord] = queue.Queue(maxsize=queue_size)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(DebugSamplingFilter(debug_sample_rate))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _queue = log_queue
+    _listener = _DrainingListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats() -> dict[str, Any]:
+    return {
+        "queued": _queue.qsize() if _queue is not None else 0,
+        "dropped": NonBlockingQueueHandler.dropped,
+    }
+
+
+atexit.register(shutdown_logging)
@@ -1,20 +1,68 @@
+import math
+import uuid
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 
 from app.config import settings
-from app.logging_config import setup_logging
+from app.db.session import engine, replica_engine
+from app.logging_config import request_id_var, setup_logging, shutdown_logging
 from app.routes import ask, enforce, health, inbound, debug
+from app.services.attachments import close_attachment_pool
+from app.services.kb_version import register_cache, start_kb_listener, stop_kb_listener
+from app.services.llm_client import close_llm_client
+from app.services.reranker import reload_term_stats
+from app.services.resilience import Overloaded
+from app.services.scheduler import start_scheduler, stop_scheduler
+from app.services.warmup import warm_up
 
 
 @asynccontextmanager
-async def lifespan(_: FastAPI):
-    setup_logging(settings.log_level)
+async def lifespan(app: FastAPI):
+    setup_logging(settings.log_level, settings.log_debug_sample_rate, settings.log_queue_size)
+    app.state.ready = False
+    app.state.warmup = await warm_up()
+    register_cache("reranker_term_stats", reload_term_stats)
+    app.state.kb_listener = start_kb_listener()
+    app.state.scheduler = start_scheduler()
+    app.state.ready = True
     yield
+    app.state.ready = False
+    await stop_scheduler(app.state.scheduler)
+    await stop_kb_listener(app.state.kb_listener)
+    await close_llm_client()
+    close_attachment_pool()
+    await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+    shutdown_logging()
 
 
 app = FastAPI(title="Ops Automation MVP", lifespan=lifespan)
 
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"{exc.dependency} is unavailable ({exc.reason})", "dependency": exc.dependency},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+
 app.include_router(health.router)
 app.include_router(inbound.router)
 app.include_router(ask.router)
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.db.session import get_db
-from app.schemas.ask import AskRequest, AskResponse
+from app.schemas.ask import AskBatchItem, AskBatchRequest, AskBatchResponse, AskRequest, AskResponse
 from app.services.audit import log_action
 from app.services.n8n_client import post_outbound
-from app.services.rag import answer_with_confidence
+from app.services.rag import answer_batch_with_confidence, answer_with_confidence
 from app.services.knowledge_base import retrieve_chunks
 
 router = APIRouter()
@@ -37,6 +40,21 @@ def _format_answer(answer_text: str) -> tuple[str | None, list[str], str | None]
     return title, bullets, source
 
 
+def _build_response(answer_data: dict[str, Any]) -> AskResponse:
+    confidence = float(answer_data.get("confidence", 0.0))
+    answer_text = answer_data.get("answer", "")
+    answer_title, answer_bullets, answer_source = _format_answer(answer_text)
+    return AskResponse(
+        answer=answer_text,
+        answer_title=answer_title,
+        answer_bullets=answer_bullets,
+        answer_source=answer_source,
+        citations=answer_data.get("citations", []),
+        confidence=confidence,
+        tier=_tier_from_confidence(confidence),
+    )
+
+
 @router.post("/ask", response_model=AskResponse)
 async def ask(request: AskRequest, session: AsyncSession = Depends(get_db)) -> AskResponse:
     chunks = await retrieve_chunks(session, request.query)
@@ -75,13 +93,31 @@ async def ask(request: AskRequest, session: AsyncSession = Depends(get_db)) -> A
             session=session,
         )
 
-    answer_title, answer_bullets, answer_source = _format_answer(answer_text)
-    return AskResponse(
-        answer=answer_text,
-        answer_title=answer_title,
-        answer_bullets=answer_bullets,
-        answer_source=answer_source,
-        citations=answer_data.get("citations", []),
-        confidence=confidence,
-        tier=tier,
+    return _build_response(answer_data)
+
+
+@router.post("/ask/batch", response_model=AskBatchResponse)
+async def ask_batch(request: AskBatchRequest, session: AsyncSession = Depends(get_db)) -> AskBatchResponse:
+    if len(request.queries) > settings.ask_batch_max_size:
+        raise HTTPException(status_code=400, detail=f"Batch too large (max {settings.ask_batch_max_size} queries)")
+
+    answers = await answer_batch_with_confidence(request.queries)
+    results: list[AskBatchItem] = []
+    for idx, (query, answer_data) in enumerate(zip(request.queries, answers)):
+        if answer_data.get("error"):
+            results.append(AskBatchItem(index=idx, query=query, error=answer_data["error"]))
+        else:
+            results.append(AskBatchItem(index=idx, query=query, result=_build_response(answer_data)))
+
+    await log_action(
+        session,
+        actor="ai:rag",
+        action="rag_batch_answered",
+        details={
+            "count": len(results),
+            "errors": sum(1 for item in results if item.error),
+            "tiers": [item.result.tier if item.result else None for item in results],
+            "user_id": request.user_id,
+        },
     )
+    return AskBatchResponse(results=results)
@@ -3,7 +3,15 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db import models
-from app.db.session import get_db
+from app.db.session import get_db, on_replica, pool_stats, replica_engine
+from app.logging_config import logging_stats
+from app.services.attachments import attachment_stats
+from app.services.content_router import router_stats
+from app.services.context_builder import context_stats
+from app.services.idempotency import idempotency_stats
+from app.services.kb_version import kb_version_stats
+from app.services.resilience import dependency_stats
+from app.services.singleflight import flight_stats
 
 router = APIRouter()
 
@@ -14,16 +22,16 @@ async def db_snapshot(
     limit: int = Query(default=10, ge=1, le=50),
 ) -> dict:
     audit_result = await session.execute(
-        select(models.AuditLog).order_by(models.AuditLog.created_at.desc()).limit(limit)
+        on_replica(select(models.AuditLog).order_by(models.AuditLog.created_at.desc()).limit(limit))
     )
     inbox_result = await session.execute(
-        select(models.InboxEvent).order_by(models.InboxEvent.created_at.desc()).limit(limit)
+        on_replica(select(models.InboxEvent).order_by(models.InboxEvent.created_at.desc()).limit(limit))
     )
     task_result = await session.execute(
-        select(models.Task).order_by(models.Task.created_at.desc()).limit(limit)
+        on_replica(select(models.Task).order_by(models.Task.created_at.desc()).limit(limit))
     )
     enforce_result = await session.execute(
-        select(models.EnforcementLog).order_by(models.EnforcementLog.created_at.desc()).limit(limit)
+        on_replica(select(models.EnforcementLog).order_by(models.EnforcementLog.created_at.desc()).limit(limit))
     )
 
     return {
@@ -82,3 +90,19 @@ async def db_snapshot(
             for row in enforce_result.scalars().all()
         ],
     }
+
+
+@router.get("/debug/metrics")
+async def metrics() -> dict:
+    return {
+        "singleflight": flight_stats(),
+        "context": context_stats(),
+        "content_router": router_stats(),
+        "idempotency": idempotency_stats(),
+        "attachments": attachment_stats(),
+        "kb_version": kb_version_stats(),
+        "dependencies": dependency_stats(),
+        "logging": logging_stats(),
+        "db_pool": pool_stats(),
+        "db_replica_pool": pool_stats(replica_engine) if replica_engine is not None else None,
+    }
@@ -1,4 +1,5 @@
 from datetime import datetime
+from zoneinfo import ZoneInfo
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import select
@@ -6,10 +7,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
 from app.db import models
-from app.db.session import get_db
-from app.services.audit import log_action
-from app.services.enforcement import check_high_priority_tasks
-from app.services.n8n_client import post_outbound
+from app.db.session import get_db, on_replica
+from app.services.enforcement import check_high_priority_tasks, send_reminders
+from app.services.scheduler import default_timezone
 from app.services.todoist_client import TodoistClient
 
 router = APIRouter()
@@ -31,52 +31,17 @@ async def enforce(
     if not settings.todoist_api_token:
         raise HTTPException(status_code=400, detail="Todoist API token not configured")
 
-    check_type = _check_type_for_hour(datetime.now().hour)
+    tz = ZoneInfo(default_timezone())
+    check_type = _check_type_for_hour(datetime.now(tz).hour)
     todoist_client = TodoistClient(settings.todoist_api_token)
-    reminders, checked = await check_high_priority_tasks(session, todoist_client, check_type)
+    reminders, checked = await check_high_priority_tasks(session, todoist_client, check_type, tz=tz)
 
-    for reminder in reminders:
-        assignee = reminder.assignee
-        if isinstance(assignee, str) and assignee.strip().lower() in {"none", "null", ""}:
-            assignee = None
-
-        if assignee:
-            outbound = {
-                "action": "send_slack_dm",
-                "user_id": assignee,
-                "text": f"⏰ Reminder: Your task '{reminder.title}' is high priority and needs an EOD status update in Todoist comments.",
-            }
-        elif settings.default_reminder_channel:
-            outbound = {
-                "action": "send_slack_message",
-                "channel": settings.default_reminder_channel,
-                "text": f"⏰ Reminder: Task '{reminder.title}' is high priority and needs an EOD status update in Todoist comments.",
-            }
-        elif settings.default_reminder_user_id:
-            outbound = {
-                "action": "send_slack_dm",
-                "user_id": settings.default_reminder_user_id,
-                "text": f"⏰ Reminder: Task '{reminder.title}' is high priority and needs an EOD status update in Todoist comments.",
-            }
-        else:
-            outbound = {
-                "action": "send_log",
-                "text": f"⏰ Reminder: Task '{reminder.title}' is high priority and needs an EOD status update in Todoist comments.",
-            }
-        await post_outbound(
-            outbound,
-            session=session,
-        )
-        await log_action(
-            session,
-            actor="system",
-            action="reminder_sent",
-            details={"todoist_task_id": reminder.todoist_task_id, "user": reminder.assignee},
-        )
+    digests_sent = await send_reminders(session, reminders)
 
     response = {
         "checked": checked,
         "reminders_sent": len(reminders),
+        "digests_sent": digests_sent,
         "tasks": [
             {
                 "task_id": reminder.todoist_task_id,
@@ -99,7 +64,7 @@ async def enforce(
             for task in tasks[:20]
         ]
         result = await session.execute(
-            select(models.Task).order_by(models.Task.created_at.desc()).limit(20)
+            on_replica(select(models.Task).order_by(models.Task.created_at.desc()).limit(20))
         )
         response["debug_db_tasks"] = [
             {
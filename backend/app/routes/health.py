@@ -1,4 +1,4 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Request
 
 router = APIRouter()
 
@@ -6,3 +6,10 @@ router = APIRouter()
 @router.get("/health")
 async def health() -> dict[str, str]:
     return {"status": "ok"}
+
+
+@router.get("/health/ready")
+async def ready(request: Request) -> dict[str, str]:
+    if not getattr(request.app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"status": "ready"}
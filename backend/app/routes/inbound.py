@@ -1,18 +1,24 @@
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Any
+
+from fastapi import APIRouter, Header, HTTPException
+from sqlalchemy import inspect as sa_inspect
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
 from app.db import models
-from app.db.session import get_db
+from app.db.session import AsyncSessionLocal
 from app.schemas.inbound import InboundEvent, InboundResponse
-from app.services.ai import extract_task_fields, generate_enrichment
+from app.services.ai import extract_and_enrich, extract_task_fields, generate_enrichment
+from app.services.attachments import process_attachments, with_attachment_text
 from app.services.audit import log_action
+from app.services.content_router import route_event
+from app.services.idempotency import InFlightElsewhere, cached_response, claim, complete, fail, release, request_key
 from app.services.knowledge_base import retrieve_chunks
 from app.services.n8n_client import post_outbound
 from app.services.rag import answer_with_confidence
-from app.services.router import route_channel
+from app.services.singleflight import get_flight
 from app.services.task_service import create_task_with_enrichment
 from app.services.todoist_client import TodoistClient
 
@@ -29,24 +35,73 @@ def _clean_user(value: str | None) -> str | None:
 
 
 @router.post("/inbound", response_model=InboundResponse)
-async def inbound(event: InboundEvent, session: AsyncSession = Depends(get_db)) -> InboundResponse:
-    route_info = route_channel(event.source_channel)
-    sender_user = _clean_user(event.sender_user) or _clean_user(settings.inbound_default_sender) or _clean_user(event.source_user)
-    receiver_user = _clean_user(event.receiver_user) or _clean_user(settings.inbound_default_receiver) or _clean_user(event.source_user)
-
-    inbox = models.InboxEvent(
-        source=event.source,
-        source_channel=event.source_channel,
-        source_user=event.source_user,
-        sender_user=sender_user,
-        receiver_user=receiver_user,
-        thread_id=event.thread_id,
-        text=event.text,
-        raw_json=event.model_dump(mode="json"),
-        pipeline=route_info["pipeline"],
-        intake_tier=route_info["intake_tier"],
-    )
-    session.add(inbox)
+async def inbound(
+    event: InboundEvent,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key"),
+) -> InboundResponse:
+    key = request_key(event, idempotency_key)
+    cached = cached_response(key)
+    if cached is not None:
+        return InboundResponse(**cached)
+    try:
+        # Retries that arrive while the original is still running await its result.
+        response = await get_flight("inbound").do(key, lambda: _handle(event, key))
+    except InFlightElsewhere:
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this idempotency key is still being processed",
+            headers={"Retry-After": str(settings.idempotency_retry_after_seconds)},
+        )
+    return InboundResponse(**response)
+
+
+async def _handle(event: InboundEvent, key: str) -> dict[str, Any]:
+    # Own session: the shared flight can outlive the request that started it.
+    async with AsyncSessionLocal() as session:
+        inbox = models.InboxEvent(
+            source=event.source,
+            source_channel=event.source_channel,
+            source_user=event.source_user,
+            sender_user=_clean_user(event.sender_user) or _clean_user(settings.inbound_default_sender) or _clean_user(event.source_user),
+            receiver_user=_clean_user(event.receiver_user) or _clean_user(settings.inbound_default_receiver) or _clean_user(event.source_user),
+            thread_id=event.thread_id,
+            text=event.text,
+            raw_json=event.model_dump(mode="json"),
+        )
+        inbox, stored = await claim(session, key, inbox)
+        if stored is not None:
+            return stored
+        inbox_id = inbox.id
+        side_effects: list[str] = []
+        try:
+            result = await _process(session, event, inbox, side_effects)
+        except Exception as exc:
+            if not side_effects:
+                await release(session, inbox_id)
+                raise
+            logger.exception("Inbound failed after side effects", extra={"side_effects": side_effects})
+            failed = InboundResponse(
+                status="failed",
+                # Read without a refresh: the session may already be rolled back.
+                pipeline=sa_inspect(inbox).dict.get("pipeline") or "general",
+                message="Processing failed after the task or reply was sent; not retrying to avoid duplicates.",
+                details={"error": exc.__class__.__name__, "side_effects": side_effects},
+            )
+            await fail(session, inbox_id, failed.model_dump(mode="json"))
+            raise
+        response = result.model_dump(mode="json")
+        await complete(session, inbox, response)
+        return response
+
+
+async def _process(
+    session: AsyncSession, event: InboundEvent, inbox: models.InboxEvent, side_effects: list[str]
+) -> InboundResponse:
+    route_info = await route_event(session, event.source_channel, event.text)
+    sender_user = inbox.sender_user
+    receiver_user = inbox.receiver_user
+    inbox.pipeline = route_info["pipeline"]
+    inbox.intake_tier = route_info["intake_tier"]
     await session.commit()
 
     actor_user = sender_user or event.source_user
@@ -56,7 +111,11 @@ async def inbound(event: InboundEvent, session: AsyncSession = Depends(get_db))
         action="inbound_received",
         entity_type="inbox_event",
         entity_id=inbox.id,
-        details={"pipeline": route_info["pipeline"]},
+        details={
+            "pipeline": route_info["pipeline"],
+            "routed_by": route_info.get("routed_by", "channel"),
+            "route_confidence": route_info.get("route_confidence"),
+        },
     )
 
     if route_info["pipeline"] == "sop_qa":
@@ -83,6 +142,7 @@ async def inbound(event: InboundEvent, session: AsyncSession = Depends(get_db))
             "receiver_user": receiver_user,
         }
         await post_outbound(outbound_payload, session=session)
+        side_effects.append("outbound")
         await log_action(
             session,
             actor="ai:rag",
@@ -98,7 +158,31 @@ async def inbound(event: InboundEvent, session: AsyncSession = Depends(get_db))
         raise HTTPException(status_code=400, detail="Todoist API token not configured")
 
     todoist_client = TodoistClient(settings.todoist_api_token)
-    extracted_fields = await extract_task_fields(event.text, route_info["pipeline"])
+    attachments = await process_attachments(session, event.attachments)
+    if attachments:
+        await log_action(
+            session,
+            actor="system",
+            action="attachments_processed",
+            entity_type="inbox_event",
+            entity_id=inbox.id,
+            details={
+                "attachments": [
+                    {"name": item.name, "sha256": item.sha256, "cached": item.cached, "error": item.error}
+                    for item in attachments
+                ]
+            },
+        )
+    # SOP retrieval stays keyed on the message; the attachment text feeds extraction and enrichment.
+    task_text = with_attachment_text(event.text, attachments)
+    if settings.combined_extraction_enabled:
+        chunks = await retrieve_chunks(session, event.text, k=6)
+        extracted_fields, enrichment_tips = await extract_and_enrich(task_text, route_info["pipeline"], chunks)
+    else:
+        extracted_fields = await extract_task_fields(task_text, route_info["pipeline"])
+        chunks = await retrieve_chunks(session, event.text, k=6)
+        enrichment_tips = await generate_enrichment(task_text, chunks)
+
     assignee = extracted_fields.get("assignee")
     if isinstance(assignee, str) and assignee.strip().lower() in {"none", "null", ""}:
         assignee = None
@@ -108,8 +192,6 @@ async def inbound(event: InboundEvent, session: AsyncSession = Depends(get_db))
         "Inbound assignment",
         extra={"source_user": event.source_user, "assignee": extracted_fields.get("assignee")},
     )
-    chunks = await retrieve_chunks(session, event.text, k=6)
-    enrichment_tips = await generate_enrichment(event.text, chunks)
 
     task_record = await create_task_with_enrichment(
         session=session,
@@ -118,7 +200,9 @@ async def inbound(event: InboundEvent, session: AsyncSession = Depends(get_db))
         enrichment_tips=enrichment_tips,
         inbox_event_id=inbox.id,
         task_type=route_info["pipeline"],
+        side_effects=side_effects,
     )
+    side_effects.append(f"task:{task_record.id}")
 
     message = f"📌 New task assigned: '{task_record.title}'. Please review in Todoist."
     outbound_payload = {
@@ -130,6 +214,7 @@ async def inbound(event: InboundEvent, session: AsyncSession = Depends(get_db))
         "receiver_user": receiver_user,
     }
     await post_outbound(outbound_payload, session=session)
+    side_effects.append("outbound")
 
     details = {"outbound": outbound_payload} if settings.debug_echo_outbound else None
     return InboundResponse(status="created", pipeline=route_info["pipeline"], message=message, details=details)
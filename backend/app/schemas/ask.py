@@ -22,3 +22,19 @@ class AskResponse(BaseModel):
     citations: list[Citation]
     confidence: float
     tier: str
+
+
+class AskBatchRequest(BaseModel):
+    queries: list[str]
+    user_id: str | None = None
+
+
+class AskBatchItem(BaseModel):
+    index: int
+    query: str
+    result: AskResponse | None = None
+    error: str | None = None
+
+
+class AskBatchResponse(BaseModel):
+    results: list[AskBatchItem]
@@ -0,0 +1,30 @@
+from pydantic import BaseModel, ConfigDict
+
+
+class ExtractedTask(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    title: str
+    summary: str
+    priority: int
+    due_date: str | None
+    labels: list[str]
+    assignee: str | None
+    key_details: list[str]
+    questions: list[str]
+    subtasks: list[str]
+
+
+class EnrichmentSections(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    checklist: list[str]
+    required_fields: list[str]
+    approvals_exceptions: list[str]
+
+
+class TaskExtraction(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    task: ExtractedTask
+    enrichment: EnrichmentSections
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import functools
+import json
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+from app.config import settings
+from app.db.session import AsyncSessionLocal
+from app.schemas.inbound import Attachment
+from app.services.attachments import attachment_stats, close_attachment_pool, process_attachments
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def copyfile(self, source: Any, outputfile: Any) -> None:
+        # Oversized downloads are aborted by the client mid-stream.
+        try:
+            super().copyfile(source, outputfile)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def _write_samples(root: Path, large_bytes: int) -> None:
+    rows = ["date,vendor,description,amount"] + [
+        f"2026-03-{day:02d},Acme Supplies,Office supplies order {day},{day * 12.5:.2f}" for day in range(1, 29)
+    ]
+    (root / "receipt.csv").write_text("\n".join(rows) + "\n", encoding="utf-8")
+    (root / "receipt-repost.csv").write_text("\n".join(rows) + "\n", encoding="utf-8")
+    (root / "invoice.txt").write_text(
+        "INVOICE 2026-118\nVendor: Blue Harbor Catering\nAmount due: $4,250.00\nDue: 2026-04-15\n", encoding="utf-8"
+    )
+    (root / "blob.bin").write_bytes(bytes(range(256)) * 64)
+    with (root / "huge.csv").open("wb") as handle:
+        line = b"2026-03-01,Acme,filler row,1.00\n"
+        for _ in range(large_bytes // len(line) + 1):
+            handle.write(line)
+
+
+def _serve(root: Path) -> tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_QuietHandler, directory=str(root)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+async def _run(attachments: list[Attachment], use_db: bool) -> tuple[list[dict[str, Any]], float]:
+    start = time.perf_counter()
+    if use_db:
+        async with AsyncSessionLocal() as session:
+            items = await process_attachments(session, attachments)
+    else:
+        items = await process_attachments(None, attachments)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return [
+        {
+            "name": item.name,
+            "size_bytes": item.size_bytes,
+            "extractor": item.extractor,
+            "cached": item.cached,
+            "error": item.error,
+            "chars": len(item.text),
+        }
+        for item in items
+    ], elapsed_ms
+
+
+async def run(directory: Path | None, use_db: bool, rounds: int) -> dict[str, Any]:
+    workdir = Path(tempfile.mkdtemp(prefix="attachments-bench-"))
+    try:
+        if directory is None:
+            _write_samples(workdir, settings.attachment_max_bytes + 1)
+        else:
+            for path in directory.iterdir():
+                if path.is_file():
+                    shutil.copy(path, workdir / path.name)
+        server, base_url = _serve(workdir)
+        try:
+            names = sorted(path.name for path in workdir.iterdir())
+            attachments = [Attachment(type="file", name=name, url=f"{base_url}/{name}") for name in names]
+            # Process every file in one event regardless of ATTACHMENT_MAX_COUNT.
+            settings.attachment_max_count = max(settings.attachment_max_count, len(attachments))
+            # The sample server listens on loopback.
+            settings.attachment_allow_private_networks = True
+            tracemalloc.start()
+            report: dict[str, Any] = {"rounds": []}
+            for _ in range(rounds):
+                items, elapsed_ms = await _run(attachments, use_db)
+                report["rounds"].append({"elapsed_ms": round(elapsed_ms, 1), "items": items})
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            report["peak_python_memory_kb"] = round(peak / 1024, 1)
+            report["stats"] = attachment_stats()
+            return report
+        finally:
+            server.shutdown()
+    finally:
+        close_attachment_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Run the attachment stage against a local file server (generated samples or a directory)."
+    )
+    parser.add_argument("--dir", type=Path, default=None, help="Serve these files instead of generated samples.")
+    parser.add_argument("--db", action="store_true", help="Also use the attachment_texts table as a cache.")
+    parser.add_argument("--rounds", type=int, default=2, help="Later rounds show cache hits.")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.dir, args.db, args.rounds)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any
+
+import httpx
+
+from app.services.llm_client import LangChainClient, LLMClient, OpenAICompatClient
+
+BASE_URL = "http://llm.bench/v1"
+MESSAGES = [
+    {"role": "system", "content": "Return JSON."},
+    {"role": "user", "content": "Pay the Acme invoice by Friday."},
+]
+
+# Constructing a client in a fresh interpreter captures import cost as well as setup.
+STARTUP_SNIPPETS = {
+    "native": (
+        "from app.services.llm_client import OpenAICompatClient; "
+        "OpenAICompatClient('sk-bench', 'http://llm.bench/v1', 'gpt-4o', 'text-embedding-3-small')"
+    ),
+    "langchain": (
+        "from app.services.llm_client import LangChainClient; "
+        "LangChainClient('sk-bench', 'http://llm.bench/v1', 'gpt-4o', 'text-embedding-3-small').warm()"
+    ),
+}
+
+
+def _handler(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content or b"{}")
+    if request.url.path.endswith("/embeddings"):
+        inputs = body.get("input") or []
+        return httpx.Response(
+            200,
+            json={
+                "object": "list",
+                "model": body.get("model"),
+                "data": [
+                    {"object": "embedding", "index": idx, "embedding": [0.0] * 1536}
+                    for idx in range(len(inputs))
+                ],
+                "usage": {"prompt_tokens": 1, "total_tokens": 1},
+            },
+        )
+    return httpx.Response(
+        200,
+        json={
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body.get("model"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": '{"title": "Pay Acme invoice"}'},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        },
+    )
+
+
+def _build(backend: str) -> LLMClient:
+    transport = httpx.MockTransport(_handler)
+    if backend == "langchain":
+        return LangChainClient(
+            "sk-bench",
+            BASE_URL,
+            "gpt-4o",
+            "text-embedding-3-small",
+            http_async_client=httpx.AsyncClient(transport=transport),
+        )
+    return OpenAICompatClient("sk-bench", BASE_URL, "gpt-4o", "text-embedding-3-small", transport=transport)
+
+
+def _startup_ms(backend: str, runs: int) -> float:
+    samples: list[float] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", STARTUP_SNIPPETS[backend]], check=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 1)
+
+
+async def _per_call_us(backend: str, iterations: int, embed_batch: int) -> dict[str, float]:
+    client = _build(backend)
+    texts = [f"chunk {idx}" for idx in range(embed_batch)]
+    try:
+        # First calls build the lazy models/connections and are excluded.
+        await client.chat(MESSAGES, temperature=0.0, json_mode=True)
+        await client.embed(texts)
+
+        chat: list[float] = []
+        embed: list[float] = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            await client.chat(MESSAGES, temperature=0.0, json_mode=True)
+            chat.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            await client.embed(texts)
+            embed.append(time.perf_counter() - start)
+    finally:
+        await client.aclose()
+    return {
+        "chat_us_p50": round(statistics.median(chat) * 1e6, 1),
+        "embed_us_p50": round(statistics.median(embed) * 1e6, 1),
+    }
+
+
+async def run(backends: list[str], iterations: int, startup_runs: int, embed_batch: int) -> dict[str, Any]:
+    report: dict[str, Any] = {}
+    for backend in backends:
+        report[backend] = {
+            "startup_ms_p50": _startup_ms(backend, startup_runs),
+            **await _per_call_us(backend, iterations, embed_batch),
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare client startup time and per-call overhead of the native and LangChain LLM backends."
+    )
+    parser.add_argument("--backend", choices=["native", "langchain"], action="append")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--startup-runs", type=int, default=5)
+    parser.add_argument("--embed-batch", type=int, default=32)
+    args = parser.parse_args()
+
+    backends = args.backend or ["native", "langchain"]
+    report = asyncio.run(run(backends, args.iterations, args.startup_runs, args.embed_batch))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
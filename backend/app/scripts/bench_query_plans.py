@@ -0,0 +1,258 @@
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.sql import Executable
+
+from app.config import settings
+from app.db import models
+from app.db.session import get_engine
+from app.services.enforcement import already_notified_query, candidate_tasks_query
+from app.services.knowledge_base import VECTOR_SEARCH_SQL, keyword_search_sql
+
+INIT_SQL = Path(__file__).resolve().parents[1] / "db" / "init.sql"
+EXTENSIONS = ("vector", "pgcrypto", "pg_trgm")
+
+# Tiny lookup tables may be scanned sequentially without it being a regression.
+SMALL_TABLES = {"kb_docs"}
+
+RARE_TERM = "zanzibarclause"
+
+
+@dataclass
+class HotQuery:
+    name: str
+    build: Callable[[dict[str, Any]], str]
+    budget_ms: float
+    allow_seq_scan: set[str] = field(default_factory=set)
+
+
+def _compile(stmt: Executable) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def _vector_literal(embedding: list[float]) -> str:
+    return "'[" + ",".join(f"{value:.6f}" for value in embedding) + "]'"
+
+
+def _render(sql: str, params: dict[str, str]) -> str:
+    # Inlines already-quoted literals for the text() statements knowledge_base
+    # binds at runtime; "::" casts are left alone.
+    return re.sub(r"(?<!:):(\w+)", lambda match: params[match.group(1)], sql)
+
+
+def _recent(model: Any) -> Callable[[dict[str, Any]], str]:
+    return lambda _: _compile(select(model).order_by(model.created_at.desc()).limit(10))
+
+
+HOT_QUERIES: list[HotQuery] = [
+    HotQuery(
+        "kb_vector_search",
+        lambda ctx: _render(VECTOR_SEARCH_SQL, {"embedding": ctx["embedding"], "k": "6"}),
+        budget_ms=50.0,
+    ),
+    HotQuery(
+        "kb_keyword_search",
+        lambda _: _render(keyword_search_sql(1), {"t0": f"'%{RARE_TERM}%'", "k": "6"}),
+        budget_ms=50.0,
+    ),
+    HotQuery(
+        "enforcement_candidates",
+        lambda ctx: _compile(
+            candidate_tasks_query(ctx["today"]).order_by(models.Task.id).limit(settings.enforcement_page_size)
+        ),
+        budget_ms=50.0,
+    ),
+    HotQuery(
+        "enforcement_suppression",
+        lambda ctx: _compile(already_notified_query(ctx["task_ids"], "reminder_16", ctx["day_start"])),
+        budget_ms=50.0,
+    ),
+    HotQuery("debug_recent_audit_log", _recent(models.AuditLog), budget_ms=20.0),
+    HotQuery("debug_recent_inbox_events", _recent(models.InboxEvent), budget_ms=20.0),
+    HotQuery("debug_recent_tasks", _recent(models.Task), budget_ms=20.0),
+    HotQuery("debug_recent_enforcement_log", _recent(models.EnforcementLog), budget_ms=20.0),
+]
+
+
+def _seed_sql(rows: int, chunks: int) -> list[str]:
+    return [
+        "INSERT INTO kb_docs (title) SELECT 'doc_' || g FROM generate_series(1, 20) g",
+        f"""
+        INSERT INTO kb_chunks (doc_id, chunk_index, chunk_text, section_ref, embedding)
+        SELECT (ARRAY(SELECT id FROM kb_docs))[1 + g % 20], g,
+               'Synthetic policy text ' || md5(g::text) || ' approvals expenses travel vendors'
+                   || CASE WHEN g % 997 = 0 THEN ' {RARE_TERM}' ELSE '' END,
+               '§' || (g % 40),
+               (SELECT array_agg(random())::vector FROM generate_series(1, 1536) d WHERE g > 0)
+        FROM generate_series(1, {chunks}) g
+        """,
+        f"""
+        INSERT INTO inbox_events (source, source_channel, text, pipeline, intake_tier, created_at)
+        SELECT 'slack', (ARRAY['expenses','travel','vendor-requests','maintenance','random'])[1 + g % 5],
+               'message ' || g, 'general', 1 + g % 2, NOW() - (g % 90) * INTERVAL '1 day'
+        FROM generate_series(1, {rows}) g
+        """,
+        f"""
+        INSERT INTO tasks (title, task_type, priority, assignee, due_date, status, created_at, todoist_id)
+        SELECT 'task ' || g, 'general', 1 + g % 4, 'U' || (g % 50),
+               CURRENT_DATE + (g % 120) - 60,
+               CASE WHEN g % 10 = 0 THEN 'open' ELSE 'done' END,
+               NOW() - (g % 365) * INTERVAL '1 day', g::text
+        FROM generate_series(1, {rows}) g
+        """,
+        # Every 50th chunk was also collapsed from a second document.
+        """
+        INSERT INTO kb_chunk_sources (chunk_id, doc_id, chunk_index, section_ref)
+        SELECT kc.id, (ARRAY(SELECT id FROM kb_docs))[1 + (kc.chunk_index + 1) % 20], kc.chunk_index, kc.section_ref
+        FROM kb_chunks kc
+        WHERE kc.chunk_index % 50 = 0
+        """,
+        """
+        INSERT INTO enforcement_log (task_id, todoist_task_id, check_type, has_update, created_at)
+        SELECT t.id, t.todoist_id, (ARRAY['reminder_16','escalation_18','escalation_20'])[1 + n],
+               false, NOW() - (n * 7 + (random() * 30)::int) * INTERVAL '1 day'
+        FROM tasks t CROSS JOIN generate_series(0, 2) n
+        """,
+        f"""
+        INSERT INTO audit_log (actor, action, details, created_at)
+        SELECT 'system', 'task_created', '{{}}'::jsonb, NOW() - (g % 365) * INTERVAL '1 day'
+        FROM generate_series(1, {rows * 2}) g
+        """,
+    ]
+
+
+async def _run_script(conn: AsyncConnection, sql: str) -> None:
+    # asyncpg's simple-query protocol accepts multi-statement scripts.
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.execute(sql)
+
+
+async def seed(conn: AsyncConnection, schema: str, rows: int, chunks: int) -> None:
+    for extension in EXTENSIONS:
+        await conn.execute(text(f'CREATE EXTENSION IF NOT EXISTS "{extension}"'))
+    await conn.execute(text(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE'))
+    await conn.execute(text(f'CREATE SCHEMA "{schema}"'))
+    await conn.execute(text(f'SET search_path TO "{schema}", public'))
+    await _run_script(conn, INIT_SQL.read_text(encoding="utf-8"))
+    for statement in _seed_sql(rows, chunks):
+        await conn.exec_driver_sql(statement)
+    await conn.commit()
+    # Rebuild the IVFFlat index now that it has data to pick list centroids from.
+    await _run_script(conn, "REINDEX TABLE kb_chunks; ANALYZE")
+
+
+def _walk(node: dict[str, Any]) -> list[dict[str, Any]]:
+    nodes = [node]
+    for child in node.get("Plans", []):
+        nodes.extend(_walk(child))
+    return nodes
+
+
+async def explain(conn: AsyncConnection, query: HotQuery, ctx: dict[str, Any], budget_scale: float) -> dict[str, Any]:
+    # Literal SQL (timestamps contain ':'), so bypass text() bind parsing.
+    result = await conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query.build(ctx)}")
+    raw = result.scalar_one()
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+    nodes = _walk(plan["Plan"])
+    seq_scans = sorted(
+        {
+            node.get("Relation Name", "?")
+            for node in nodes
+            if node["Node Type"] == "Seq Scan"
+            and node.get("Relation Name") not in SMALL_TABLES | query.allow_seq_scan
+        }
+    )
+    budget = query.budget_ms * budget_scale
+    execution_ms = float(plan["Execution Time"])
+    failures = [f"seq scan on {relation}" for relation in seq_scans]
+    if execution_ms > budget:
+        failures.append(f"{execution_ms:.1f} ms over {budget:.1f} ms budget")
+    return {
+        "query": query.name,
+        "execution_ms": round(execution_ms, 3),
+        "planning_ms": round(float(plan["Planning Time"]), 3),
+        "budget_ms": budget,
+        "nodes": [node["Node Type"] + (f" on {node['Relation Name']}" if "Relation Name" in node else "") for node in nodes],
+        "shared_hit": plan["Plan"].get("Shared Hit Blocks", 0),
+        "shared_read": plan["Plan"].get("Shared Read Blocks", 0),
+        "failures": failures,
+    }
+
+
+async def run(
+    database_url: str,
+    schema: str,
+    rows: int,
+    chunks: int,
+    budget_scale: float,
+    only: list[str] | None,
+    keep: bool,
+) -> list[dict[str, Any]]:
+    engine = get_engine(database_url)
+    try:
+        async with engine.connect() as conn:
+            await seed(conn, schema, rows, chunks)
+            await conn.execute(text(f'SET search_path TO "{schema}", public'))
+            today = datetime.now(timezone.utc).date()
+            task_ids = (await conn.execute(text("SELECT id::text FROM tasks LIMIT 200"))).scalars().all()
+            ctx = {
+                "today": today,
+                "day_start": datetime.combine(today, datetime.min.time(), tzinfo=timezone.utc),
+                "task_ids": list(task_ids),
+                "embedding": _vector_literal([random.random() for _ in range(1536)]),
+            }
+            reports = []
+            for query in HOT_QUERIES:
+                if only and query.name not in only:
+                    continue
+                reports.append(await explain(conn, query, ctx, budget_scale))
+            await conn.rollback()
+            if not keep:
+                await conn.execute(text(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE'))
+                await conn.commit()
+    finally:
+        await engine.dispose()
+    return reports
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Seed synthetic data in a scratch schema and check the plans of the hot SQL statements."
+    )
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument("--schema", default="plan_bench")
+    parser.add_argument("--rows", type=int, default=20000, help="Tasks / inbox events (audit rows are 2x, enforcement rows 3x).")
+    parser.add_argument("--chunks", type=int, default=5000, help="kb_chunks rows.")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="Multiply every latency budget.")
+    parser.add_argument("--query", action="append", help="Only run the named hot query.")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded schema for manual inspection.")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    reports = asyncio.run(
+        run(args.database_url, args.schema, args.rows, args.chunks, args.budget_scale, args.query, args.keep)
+    )
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            status = "FAIL" if report["failures"] else "ok"
+            print(f"{status:4} {report['query']:32} {report['execution_ms']:9.3f} ms  {' > '.join(report['nodes'])}")
+            for failure in report["failures"]:
+                print(f"     - {failure}")
+    sys.exit(1 if any(report["failures"] for report in reports) else 0)
+
+
+if __name__ == "__main__":
+    main()
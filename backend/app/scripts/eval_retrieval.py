@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db.session import AsyncSessionLocal
+from app.scripts.ingest_sops import ingest_all
+from app.services.knowledge_base import _keyword_search, _vector_search, retrieve_chunks
+
+GOLDEN_PATH = Path(__file__).resolve().parents[1] / "data" / "eval" / "retrieval_golden.json"
+
+Strategy = Callable[[AsyncSession, str, int, float], Awaitable[list[dict[str, Any]]]]
+
+
+async def _fallback(session: AsyncSession, query: str, k: int, min_similarity: float) -> list[dict[str, Any]]:
+    return await retrieve_chunks(session, query, k=k, min_similarity=min_similarity)
+
+
+async def _merge(session: AsyncSession, query: str, k: int, min_similarity: float) -> list[dict[str, Any]]:
+    # Mirrors rag_agent/app/knowledge_base.py::retrieve_chunks.
+    vector_chunks = await _vector_search(session, query, k, min_similarity)
+    keyword_chunks = await _keyword_search(session, query, k)
+    seen: set[str] = set()
+    merged: list[dict[str, Any]] = []
+    for chunk in vector_chunks + keyword_chunks:
+        text_value = chunk.get("chunk_text") or ""
+        if text_value in seen:
+            continue
+        seen.add(text_value)
+        merged.append(chunk)
+        if len(merged) >= k:
+            break
+    return merged
+
+
+async def _vector(session: AsyncSession, query: str, k: int, min_similarity: float) -> list[dict[str, Any]]:
+    return await _vector_search(session, query, k, min_similarity)
+
+
+async def _keyword(session: AsyncSession, query: str, k: int, _: float) -> list[dict[str, Any]]:
+    return await _keyword_search(session, query, k)
+
+
+STRATEGIES: dict[str, Strategy] = {
+    "fallback": _fallback,
+    "merge": _merge,
+    "vector": _vector,
+    "keyword": _keyword,
+}
+
+
+def _section_id(section_ref: str | None) -> str | None:
+    if not section_ref:
+        return None
+    parts = section_ref.strip().lstrip("#").split()
+    return parts[0] if parts else None
+
+
+def _relevant_sections(chunk: dict[str, Any], case: dict[str, Any]) -> set[str]:
+    if case.get("doc") and chunk.get("doc_title") != case["doc"]:
+        return set()
+    section = _section_id(chunk.get("section_ref"))
+    return {section} if section in case["sections"] else set()
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def _evaluate(
+    session: AsyncSession,
+    strategy: Strategy,
+    cases: list[dict[str, Any]],
+    k: int,
+    min_similarity: float,
+) -> dict[str, Any]:
+    recalls: list[float] = []
+    reciprocal_ranks: list[float] = []
+    hits = 0
+    latencies_ms: list[float] = []
+    for case in cases:
+        start = time.perf_counter()
+        chunks = await strategy(session, case["question"], k, min_similarity)
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+
+        found: set[str] = set()
+        first_rank: int | None = None
+        for rank, chunk in enumerate(chunks[:k], start=1):
+            matched = _relevant_sections(chunk, case)
+            if matched and first_rank is None:
+                first_rank = rank
+            found |= matched
+        recalls.append(len(found) / len(case["sections"]))
+        reciprocal_ranks.append(1 / first_rank if first_rank else 0.0)
+        if first_rank:
+            hits += 1
+
+    return {
+        "recall_at_k": statistics.mean(recalls) if recalls else 0.0,
+        "mrr": statistics.mean(reciprocal_ranks) if reciprocal_ranks else 0.0,
+        "section_hit_rate": hits / len(cases) if cases else 0.0,
+        "p50_ms": _percentile(latencies_ms, 50),
+        "p95_ms": _percentile(latencies_ms, 95),
+        "p99_ms": _percentile(latencies_ms, 99),
+        "queries": len(cases),
+    }
+
+
+def _print_table(rows: list[dict[str, Any]]) -> None:
+    header = f"{'strategy':<10} {'k':>3} {'recall@k':>9} {'mrr':>6} {'hit':>6} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['strategy']:<10} {row['k']:>3} {row['recall_at_k']:>9.3f} {row['mrr']:>6.3f} "
+            f"{row['section_hit_rate']:>6.3f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}"
+        )
+
+
+async def run_eval(
+    golden_path: Path,
+    strategies: list[str],
+    ks: list[int],
+    min_similarity: float,
+    chunk_tokens: int | None = None,
+) -> list[dict[str, Any]]:
+    cases = json.loads(golden_path.read_text(encoding="utf-8"))
+    if chunk_tokens:
+        print(f"Re-ingesting SOPs with chunk_tokens={chunk_tokens} (replaces the current KB).")
+        await ingest_all(chunk_tokens=chunk_tokens)
+    if settings.mock_mode:
+        print("OPENAI_API_KEY not set: embeddings are mocked, vector scores are not meaningful.")
+
+    rows: list[dict[str, Any]] = []
+    async with AsyncSessionLocal() as session:
+        for name in strategies:
+            for k in ks:
+                metrics = await _evaluate(session, STRATEGIES[name], cases, k, min_similarity)
+                rows.append({"strategy": name, "k": k, "min_similarity": min_similarity, **metrics})
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate SOP retrieval quality and latency.")
+    parser.add_argument("--golden", type=Path, default=GOLDEN_PATH)
+    parser.add_argument("--strategy", action="append", choices=sorted(STRATEGIES), dest="strategies")
+    parser.add_argument("--k", action="append", type=int, dest="ks")
+    parser.add_argument("--min-similarity", type=float, default=0.1)
+    parser.add_argument("--chunk-tokens", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    rows = asyncio.run(
+        run_eval(
+            args.golden,
+            args.strategies or list(STRATEGIES),
+            args.ks or [4, 6],
+            args.min_similarity,
+            chunk_tokens=args.chunk_tokens,
+        )
+    )
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        _print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
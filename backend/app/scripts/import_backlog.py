@@ -0,0 +1,327 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator
+
+from pydantic import ValidationError
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.db import models
+from app.db.session import AsyncSessionLocal
+from app.logging_config import setup_logging
+from app.schemas.inbound import InboundEvent, InboundResponse
+from app.services.ai import extract_and_enrich, extract_task_fields, generate_enrichment
+from app.services.attachments import process_attachments, with_attachment_text
+from app.services.audit import log_action
+from app.services.content_router import route_event
+from app.services.idempotency import inbound_key
+from app.services.knowledge_base import retrieve_chunks
+from app.services.task_service import format_enrichment_comment, parse_due_date
+from app.services.todoist_client import SYNC_COMMAND_LIMIT, TodoistClient
+
+logger = logging.getLogger(__name__)
+
+# Stable namespace so a record always maps to the same Todoist command uuids;
+# Todoist executes a command uuid only once, which makes replays after a crash safe.
+IMPORT_NAMESPACE = uuid.UUID("5d7c1f0e-8a3b-4f4e-9a51-0b6f3c2d9e17")
+
+
+@dataclass
+class PreparedTask:
+    key: str
+    line_no: int
+    event: InboundEvent
+    pipeline: str
+    intake_tier: int
+    sender_user: str | None
+    receiver_user: str | None
+    fields: dict[str, Any]
+    enrichment_tips: str
+
+
+def _clean_user(value: str | None) -> str | None:
+    if not value or value.strip().lower() in {"none", "null", ""}:
+        return None
+    return value
+
+
+class Checkpoint:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.done: set[str] = set()
+        if path.exists():
+            with path.open(encoding="utf-8") as handle:
+                for line in handle:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if entry.get("status") in {"done", "skipped"}:
+                        self.done.add(entry["key"])
+
+    def record(self, entries: list[dict[str, Any]]) -> None:
+        with self.path.open("a", encoding="utf-8") as handle:
+            for entry in entries:
+                handle.write(json.dumps(entry) + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+        self.done.update(entry["key"] for entry in entries if entry.get("status") in {"done", "skipped"})
+
+
+def _read_events(path: str) -> Iterator[tuple[int, InboundEvent | None, str]]:
+    handle = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for line_no, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, InboundEvent.model_validate_json(line), ""
+            except ValidationError as exc:
+                yield line_no, None, str(exc)
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+async def _prepare(line_no: int, event: InboundEvent, key: str) -> PreparedTask | None:
+    sender_user = _clean_user(event.sender_user) or _clean_user(settings.inbound_default_sender) or _clean_user(event.source_user)
+    receiver_user = _clean_user(event.receiver_user) or _clean_user(settings.inbound_default_receiver) or _clean_user(event.source_user)
+
+    async with AsyncSessionLocal() as session:
+        route_info = await route_event(session, event.source_channel, event.text)
+        if route_info["pipeline"] == "sop_qa":
+            return None
+        task_text = with_attachment_text(event.text, await process_attachments(session, event.attachments))
+        if settings.combined_extraction_enabled:
+            chunks = await retrieve_chunks(session, event.text, k=6)
+            fields, tips = await extract_and_enrich(task_text, route_info["pipeline"], chunks)
+        else:
+            fields = await extract_task_fields(task_text, route_info["pipeline"])
+            chunks = await retrieve_chunks(session, event.text, k=6)
+            tips = await generate_enrichment(task_text, chunks)
+
+    if receiver_user and not _clean_user(fields.get("assignee")):
+        fields["assignee"] = receiver_user
+    return PreparedTask(
+        key=key,
+        line_no=line_no,
+        event=event,
+        pipeline=route_info["pipeline"],
+        intake_tier=route_info["intake_tier"],
+        sender_user=sender_user,
+        receiver_user=receiver_user,
+        fields=fields,
+        enrichment_tips=tips,
+    )
+
+
+def _sync_ids(key: str) -> dict[str, str]:
+    return {
+        name: str(uuid.uuid5(IMPORT_NAMESPACE, f"{key}:{name}"))
+        for name in ("task_temp_id", "task_uuid", "note_uuid")
+    }
+
+
+def _commands_for(item: PreparedTask) -> list[dict[str, Any]]:
+    ids = _sync_ids(item.key)
+    args: dict[str, Any] = {
+        "content": item.fields.get("title") or "Untitled task",
+        "description": item.fields.get("description") or "",
+        "priority": item.fields.get("priority"),
+        "labels": item.fields.get("labels") or [],
+    }
+    if item.fields.get("due_date"):
+        args["due"] = {"string": item.fields["due_date"]}
+    return [
+        {"type": "item_add", "temp_id": ids["task_temp_id"], "uuid": ids["task_uuid"], "args": args},
+        {
+            "type": "note_add",
+            "uuid": ids["note_uuid"],
+            "args": {"item_id": ids["task_temp_id"], "content": format_enrichment_comment(item.enrichment_tips)},
+        },
+    ]
+
+
+async def _flush(
+    batch: list[PreparedTask],
+    todoist_client: TodoistClient,
+    checkpoint: Checkpoint,
+    stats: dict[str, int],
+) -> None:
+    if not batch:
+        return
+    commands = [command for item in batch for command in _commands_for(item)]
+    try:
+        result = await todoist_client.sync_commands(commands)
+    except Exception as exc:
+        logger.exception("Todoist sync request failed", exc_info=exc)
+        stats["failed"] += len(batch)
+        return
+
+    sync_status = result.get("sync_status", {})
+    temp_id_mapping = result.get("temp_id_mapping", {})
+    entries: list[dict[str, Any]] = []
+    async with AsyncSessionLocal() as session:
+        for item in batch:
+            ids = _sync_ids(item.key)
+            if sync_status.get(ids["task_uuid"]) != "ok":
+                logger.warning(
+                    "Todoist rejected imported task",
+                    extra={"line": item.line_no, "error": sync_status.get(ids["task_uuid"])},
+                )
+                stats["failed"] += 1
+                continue
+            todoist_id = temp_id_mapping.get(ids["task_temp_id"])
+            enrichment_added = sync_status.get(ids["note_uuid"]) == "ok"
+
+            title = item.fields.get("title") or "Untitled task"
+            # Keyed like /inbound (idempotency_key = inbound_key), so a rerun after a
+            # crash between commit and checkpoint, or a webhook retry of the same
+            # event, finds the row instead of creating a second one.
+            inbox_id = (
+                await session.execute(
+                    insert(models.InboxEvent)
+                    .values(
+                        source=item.event.source,
+                        source_channel=item.event.source_channel,
+                        source_user=item.event.source_user,
+                        sender_user=item.sender_user,
+                        receiver_user=item.receiver_user,
+                        thread_id=item.event.thread_id,
+                        text=item.event.text,
+                        raw_json=item.event.model_dump(mode="json"),
+                        pipeline=item.pipeline,
+                        intake_tier=item.intake_tier,
+                        idempotency_key=item.key,
+                        response_json=InboundResponse(
+                            status="created",
+                            pipeline=item.pipeline,
+                            message=f"📌 Task imported from backlog: '{title}'.",
+                        ).model_dump(mode="json"),
+                    )
+                    .on_conflict_do_nothing(index_elements=["idempotency_key"])
+                    .returning(models.InboxEvent.id)
+                )
+            ).scalar_one_or_none()
+            if inbox_id is None:
+                stats["already_done"] += 1
+                entries.append({"key": item.key, "line": item.line_no, "status": "done", "existing": True})
+                continue
+            session.add(
+                models.Task(
+                    todoist_id=str(todoist_id) if todoist_id else None,
+                    title=title,
+                    task_type=item.pipeline,
+                    priority=item.fields.get("priority"),
+                    assignee=item.fields.get("assignee"),
+                    due_date=parse_due_date(item.fields.get("due_date")),
+                    enrichment_added=enrichment_added,
+                    inbox_event_id=inbox_id,
+                )
+            )
+            entries.append({"key": item.key, "line": item.line_no, "status": "done", "todoist_id": todoist_id})
+        await session.commit()
+        created = sum(1 for entry in entries if not entry.get("existing"))
+        stats["created"] += created
+        await log_action(
+            session,
+            actor="system",
+            action="backlog_imported",
+            details={"tasks": created, "commands": len(commands)},
+        )
+    checkpoint.record(entries)
+
+
+async def import_backlog(
+    path: str,
+    checkpoint_path: Path,
+    concurrency: int = 4,
+    batch_size: int = SYNC_COMMAND_LIMIT // 2,
+) -> dict[str, int]:
+    if not settings.todoist_api_token:
+        raise SystemExit("TODOIST_API_TOKEN not configured")
+    # Each task takes two commands (item_add + note_add).
+    batch_size = max(1, min(batch_size, SYNC_COMMAND_LIMIT // 2))
+    todoist_client = TodoistClient(settings.todoist_api_token)
+    checkpoint = Checkpoint(checkpoint_path)
+    stats = {"read": 0, "already_done": 0, "invalid": 0, "skipped": 0, "created": 0, "failed": 0}
+
+    pending: asyncio.Queue[tuple[int, InboundEvent, str] | None] = asyncio.Queue(maxsize=concurrency * 2)
+    prepared: asyncio.Queue[PreparedTask | None] = asyncio.Queue(maxsize=batch_size * 2)
+
+    async def produce() -> None:
+        for line_no, event, error in _read_events(path):
+            stats["read"] += 1
+            if event is None:
+                logger.warning("Skipping invalid backlog record", extra={"line": line_no, "error": error})
+                stats["invalid"] += 1
+                continue
+            key = inbound_key(event)
+            if key in checkpoint.done:
+                stats["already_done"] += 1
+                continue
+            await pending.put((line_no, event, key))
+        for _ in range(concurrency):
+            await pending.put(None)
+
+    async def work() -> None:
+        while (job := await pending.get()) is not None:
+            line_no, event, key = job
+            try:
+                item = await _prepare(line_no, event, key)
+            except Exception as exc:
+                logger.exception("Backlog extraction failed", exc_info=exc)
+                stats["failed"] += 1
+                continue
+            if item is None:
+                stats["skipped"] += 1
+                checkpoint.record([{"key": key, "line": line_no, "status": "skipped"}])
+                continue
+            await prepared.put(item)
+
+    async def flush(batch: list[PreparedTask]) -> None:
+        # The consumer must keep draining `prepared`, or the workers block on put forever.
+        try:
+            await _flush(batch, todoist_client, checkpoint, stats)
+        except Exception as exc:
+            logger.exception("Backlog batch failed", exc_info=exc, extra={"lines": [item.line_no for item in batch]})
+            stats["failed"] += len(batch)
+
+    async def consume() -> None:
+        batch: list[PreparedTask] = []
+        while (item := await prepared.get()) is not None:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                await flush(batch)
+                batch = []
+        await flush(batch)
+
+    consumer = asyncio.create_task(consume())
+    await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+    await prepared.put(None)
+    await consumer
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import historical InboundEvent records (NDJSON) as Todoist tasks.")
+    parser.add_argument("path", help="NDJSON file of InboundEvent records, or - for stdin.")
+    parser.add_argument("--checkpoint", type=Path, default=None)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=SYNC_COMMAND_LIMIT // 2, help="Tasks per Todoist sync request.")
+    args = parser.parse_args()
+
+    setup_logging(settings.log_level, settings.log_debug_sample_rate, settings.log_queue_size)
+    checkpoint_path = args.checkpoint or Path(f"{args.path if args.path != '-' else 'stdin'}.checkpoint.ndjson")
+    stats = asyncio.run(import_backlog(args.path, checkpoint_path, args.concurrency, args.batch_size))
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,97 +1,181 @@
+import argparse
 import asyncio
+import logging
+import multiprocessing
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Iterable
+from typing import AsyncIterator
 
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.models import KbChunk, KbDoc
+from app.config import settings
+from app.db.models import KbChunk, KbChunkSource, KbDoc
 from app.db.session import AsyncSessionLocal
+from app.logging_config import setup_logging
+from app.services.kb_version import bump_version
 from app.services.knowledge_base import embed_texts
+from app.services.near_dup import NearDupIndex, minhash
+from app.services.sop_parser import ParsedDoc, parse_document, supported_extensions
 
-SOPS_DIR = Path(__file__).resolve().parents[1] / "data" / "sops"
-
-
-def _chunk_words(words: list[str], size: int = 400, overlap: int = 50) -> Iterable[list[str]]:
-    start = 0
-    while start < len(words):
-        end = min(start + size, len(words))
-        yield words[start:end]
-        start = max(end - overlap, end)
-
+logger = logging.getLogger(__name__)
 
-def _extract_sections(text: str) -> list[tuple[str | None, str]]:
-    lines = text.splitlines()
-    sections: list[tuple[str | None, str]] = []
-    current_section: str | None = None
-    buffer: list[str] = []
-
-    def flush() -> None:
-        if buffer:
-            sections.append((current_section, "\n".join(buffer).strip()))
-
-    for line in lines:
-        if line.strip().startswith("§") or line.strip().startswith("##"):
-            flush()
-            current_section = line.strip()
-            buffer = []
-        else:
-            buffer.append(line)
-    flush()
-    return sections
+SOPS_DIR = Path(__file__).resolve().parents[1] / "data" / "sops"
+_VERSION_RE = re.compile(r"[_-]v(\d+(?:[._-]\d+)*)$", re.IGNORECASE)
 
 
 async def _reset_kb(session: AsyncSession) -> None:
-    await session.execute(text("TRUNCATE kb_chunks CASCADE"))
-    await session.execute(text("TRUNCATE kb_docs CASCADE"))
-    await session.commit()
-
-
-async def _ingest_doc(session: AsyncSession, path: Path) -> int:
-    content = path.read_text(encoding="utf-8")
-    doc = KbDoc(title=path.name, source_path=str(path), content_text=content)
+    # DELETE rather than TRUNCATE: readers keep seeing the previous KB until the
+    # ingest transaction commits, instead of blocking on an exclusive lock.
+    await session.execute(text("DELETE FROM kb_chunks"))
+    await session.execute(text("DELETE FROM kb_docs"))
+
+
+async def _parse_all(paths: list[Path], chunk_tokens: int, workers: int) -> AsyncIterator[ParsedDoc | None]:
+    # Parse across processes but yield in _sop_paths order, so near-duplicate
+    # canonicals are the same on every run. At most 2 * workers parsed docs
+    # are held at once.
+    loop = asyncio.get_running_loop()
+    # Spawn, not fork: the logging listener thread is already running and a
+    # forked child could inherit its locks held.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        queued = iter(paths)
+        pending: deque[tuple[Path, asyncio.Future[ParsedDoc]]] = deque()
+
+        def submit() -> None:
+            path = next(queued, None)
+            if path is not None:
+                pending.append((path, loop.run_in_executor(pool, parse_document, str(path), chunk_tokens)))
+
+        for _ in range(workers * 2):
+            submit()
+        while pending:
+            path, future = pending.popleft()
+            try:
+                parsed: ParsedDoc | None = await future
+            except Exception as exc:
+                logger.warning("Skipping SOP that failed to parse", extra={"path": str(path), "error": str(exc)})
+                parsed = None
+            submit()
+            yield parsed
+
+
+async def _ingest_doc(
+    session: AsyncSession,
+    parsed: ParsedDoc,
+    index: NearDupIndex,
+) -> tuple[int, int]:
+    doc = KbDoc(title=parsed.title, source_path=parsed.path, content_text=parsed.content_text)
     session.add(doc)
     await session.flush()
 
-    sections = _extract_sections(content)
-    chunks: list[tuple[str, str | None]] = []
-    for section_ref, section_text in sections:
-        words = section_text.split()
-        for chunk_words in _chunk_words(words):
-            chunk_text = " ".join(chunk_words)
-            if section_ref:
-                chunk_text = f"{section_ref}\n{chunk_text}"
-            chunks.append((chunk_text, section_ref))
-
-    embeddings = await embed_texts([chunk[0] for chunk in chunks])
-
-    for idx, (chunk_text, section_ref) in enumerate(chunks):
-        session.add(
-            KbChunk(
-                doc_id=doc.id,
-                chunk_index=idx,
-                chunk_text=chunk_text,
-                section_ref=section_ref,
-                embedding=embeddings[idx],
-            )
+    new_chunks: list[KbChunk] = []
+    sources: list[tuple[KbChunk, int, str | None, str | None, float]] = []
+    for parsed_chunk in parsed.chunks:
+        body = parsed_chunk.body
+        section_ref = parsed_chunk.section_ref
+        section_path = parsed_chunk.section_path
+        chunk_text = f"{section_ref}\n{body}" if section_ref else body
+        # Compare bodies only, so shared boilerplate under different headings still collapses.
+        signature = minhash(body)
+        match = index.match(signature)
+        if match is not None:
+            canonical, score = match
+            sources.append((canonical, len(sources), section_ref, section_path, score))
+            continue
+        chunk = KbChunk(
+            doc_id=doc.id,
+            chunk_index=len(sources),
+            chunk_text=chunk_text,
+            section_ref=section_ref,
+            section_path=section_path,
         )
+        index.add(signature, chunk)
+        new_chunks.append(chunk)
+        sources.append((chunk, len(sources), section_ref, section_path, 1.0))
+
+    embeddings = await embed_texts([chunk.chunk_text for chunk in new_chunks])
+    for chunk, embedding in zip(new_chunks, embeddings):
+        chunk.embedding = embedding
+    session.add_all(new_chunks)
+    await session.flush()
 
-    await session.commit()
-    return len(chunks)
-
-
-async def ingest_all() -> None:
-    paths = sorted(SOPS_DIR.glob("*.md"))
+    session.add_all(
+        KbChunkSource(
+            chunk_id=chunk.id,
+            doc_id=doc.id,
+            chunk_index=chunk_index,
+            section_ref=section_ref,
+            section_path=section_path,
+            similarity=score,
+        )
+        for chunk, chunk_index, section_ref, section_path, score in sources
+    )
+    await session.flush()
+    return len(new_chunks), len(sources) - len(new_chunks)
+
+
+def _version_order(path: Path) -> tuple[str, str, tuple[int, ...]]:
+    # Group versions of one SOP (name_v1_0.md, name_v1_1.md) and put the newest
+    # first, so it becomes the canonical when near-duplicate chunks collapse.
+    match = _VERSION_RE.search(path.stem)
+    family = path.stem[: match.start()] if match else path.stem
+    version = tuple(int(part) for part in re.split(r"[._-]", match.group(1))) if match else ()
+    return (str(path.parent), family.lower(), tuple(-part for part in version))
+
+
+def _sop_paths(directory: Path) -> list[Path]:
+    extensions = supported_extensions()
+    return sorted(
+        (path for path in directory.rglob("*") if path.is_file() and path.suffix.lower() in extensions),
+        key=_version_order,
+    )
+
+
+async def ingest_all(
+    chunk_tokens: int | None = None,
+    workers: int | None = None,
+    directory: Path = SOPS_DIR,
+) -> None:
+    chunk_tokens = chunk_tokens or settings.kb_chunk_tokens
+    workers = workers or settings.ingest_workers or os.cpu_count() or 1
+    paths = _sop_paths(directory)
+    index = NearDupIndex(settings.kb_near_dup_threshold)
+    total_docs = 0
     total_chunks = 0
+    total_collapsed = 0
     async with AsyncSessionLocal() as session:
         await _reset_kb(session)
-        for path in paths:
-            total_chunks += await _ingest_doc(session, path)
-    print(f"Ingested {len(paths)} docs, {total_chunks} chunks.")
+        async for parsed in _parse_all(paths, chunk_tokens, workers):
+            if parsed is None:
+                continue
+            stored, collapsed = await _ingest_doc(session, parsed, index)
+            total_docs += 1
+            total_chunks += stored
+            total_collapsed += collapsed
+        # One transaction for the reset, every doc and the version bump, so
+        # services only ever see a complete KB and are notified on commit.
+        version = await bump_version(session, total_chunks)
+        await session.commit()
+    skipped = len(paths) - total_docs
+    print(
+        f"Ingested {total_docs}/{len(paths)} docs, {total_chunks} chunks "
+        f"({total_collapsed} near-duplicates collapsed), KB version {version}."
+        + (f" {skipped} docs failed to parse; see the log." if skipped else "")
+    )
 
 
 def main() -> None:
-    asyncio.run(ingest_all())
+    parser = argparse.ArgumentParser(description="Replace the KB with the SOPs under a directory.")
+    parser.add_argument("--dir", type=Path, default=SOPS_DIR)
+    parser.add_argument("--chunk-tokens", type=int, default=None, help="Defaults to KB_CHUNK_TOKENS.")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes; defaults to INGEST_WORKERS.")
+    args = parser.parse_args()
+    setup_logging(settings.log_level, settings.log_debug_sample_rate, settings.log_queue_size)
+    asyncio.run(ingest_all(chunk_tokens=args.chunk_tokens, workers=args.workers, directory=args.dir))
 
 
 if __name__ == "__main__":
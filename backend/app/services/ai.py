@@ -1,35 +1,40 @@
 from __future__ import annotations
 
+import copy
+import functools
 import json
 import logging
 import re
-from datetime import date, timedelta
 from typing import Any
 
-from langchain_openai import ChatOpenAI
-
 from app.config import settings
+from app.schemas.extraction import EnrichmentSections, TaskExtraction
+from app.services.context_builder import build_context
+from app.services.extraction_rules import apply_priority_keywords, extract_fields_by_rules, infer_due_date
+from app.services.llm_client import get_llm_client
+from app.services.singleflight import get_flight, normalize_key
 
 logger = logging.getLogger(__name__)
 
 
-def _get_llm(*, temperature: float = 0.1) -> ChatOpenAI:
-    return ChatOpenAI(
-        model=settings.openai_model,
-        temperature=temperature,
-        openai_api_key=settings.openai_api_key,
-        openai_api_base=settings.openai_base_url,
-    )
+@functools.lru_cache(maxsize=None)
+def _structured_format() -> dict[str, Any]:
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "task_extraction",
+            "strict": True,
+            "schema": TaskExtraction.model_json_schema(),
+        },
+    }
 
 
-def _get_llm_json() -> ChatOpenAI:
-    return ChatOpenAI(
-        model=settings.openai_model,
-        temperature=0.0,
-        openai_api_key=settings.openai_api_key,
-        openai_api_base=settings.openai_base_url,
-        model_kwargs={"response_format": {"type": "json_object"}},
-    )
+def warm_llm_clients() -> bool:
+    if settings.mock_mode:
+        return False
+    get_llm_client().warm()
+    _structured_format()
+    return True
 
 
 def _clamp_priority(value: Any) -> int:
@@ -53,44 +58,7 @@ def _extract_json(text: str) -> dict[str, Any]:
         return {}
 
 
-def _infer_due_date(text: str) -> str | None:
-    lower = text.lower()
-    today = date.today()
-
-    if any(token in lower for token in ["today", "eod", "end of day", "midday", "noon", "by lunch"]):
-        return today.isoformat()
-    if "tomorrow" in lower:
-        return (today + timedelta(days=1)).isoformat()
-    if "next week" in lower:
-        return (today + timedelta(days=7)).isoformat()
-
-    weekdays = [
-        ("monday", 0),
-        ("tuesday", 1),
-        ("wednesday", 2),
-        ("thursday", 3),
-        ("friday", 4),
-        ("saturday", 5),
-        ("sunday", 6),
-    ]
-    for name, idx in weekdays:
-        if f"next {name}" in lower:
-            days_ahead = (idx - today.weekday() + 7) % 7
-            if days_ahead == 0:
-                days_ahead = 7
-            return (today + timedelta(days=days_ahead)).isoformat()
-    for name, idx in weekdays:
-        if f"on {name}" in lower or f"by {name}" in lower:
-            days_ahead = (idx - today.weekday() + 7) % 7
-            if days_ahead == 0:
-                days_ahead = 7
-            return (today + timedelta(days=days_ahead)).isoformat()
-
-    return None
-
-
-async def extract_task_fields(text: str, pipeline: str | None) -> dict[str, Any]:
-    llm = _get_llm_json()
+async def _llm_extract(text: str, pipeline: str | None) -> dict[str, Any]:
     system_prompt = (
         "Extract task fields from the message. Return JSON only with keys: "
         "title, summary, priority (1-4), due_date (YYYY-MM-DD or null), "
@@ -107,17 +75,21 @@ async def extract_task_fields(text: str, pipeline: str | None) -> dict[str, Any]
     )
 
     try:
-        response = await llm.ainvoke(
+        content = await get_llm_client().chat(
             [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt},
-            ]
+            ],
+            temperature=0.0,
+            json_mode=True,
         )
-        data = _extract_json(response.content or "{}")
+        return _extract_json(content or "{}")
     except Exception as exc:
         logger.warning("Task extraction failed, using fallback", exc_info=exc)
-        data = {}
+        return {}
+
 
+def _normalize_fields(data: dict[str, Any], text: str, pipeline: str | None) -> dict[str, Any]:
     labels = data.get("labels")
     if isinstance(labels, str):
         labels = [labels]
@@ -149,16 +121,8 @@ async def extract_task_fields(text: str, pipeline: str | None) -> dict[str, Any]
         description_lines.extend([f"- {item}" for item in subtasks])
     description_lines.append(f"Source message: {text}")
 
-    due_date = data.get("due_date") or _infer_due_date(text)
-
-    priority = _clamp_priority(data.get("priority"))
-    lower_text = text.lower()
-    if any(token in lower_text for token in ["high priority", "urgent", "asap", "immediately", "critical"]):
-        priority = 4
-    elif "medium priority" in lower_text:
-        priority = max(priority, 3)
-    elif "low priority" in lower_text:
-        priority = min(priority, 2)
+    due_date = data.get("due_date") or infer_due_date(text)
+    priority = apply_priority_keywords(_clamp_priority(data.get("priority")), text)
 
     assignee = data.get("assignee")
     if isinstance(assignee, str) and assignee.strip().lower() in {"none", "null", ""}:
@@ -174,14 +138,40 @@ async def extract_task_fields(text: str, pipeline: str | None) -> dict[str, Any]
     }
 
 
+def _use_fast_path(confidence: float) -> bool:
+    return settings.fast_path_enabled and confidence >= settings.fast_path_min_confidence
+
+
+async def extract_task_fields(text: str, pipeline: str | None) -> dict[str, Any]:
+    key = (pipeline, normalize_key(text, casefold=False))
+    fields = await get_flight("extract_task_fields").do(key, lambda: _extract_task_fields(text, pipeline))
+    # Callers mutate the result (e.g. assignee fallback), so never hand out the shared dict.
+    return copy.deepcopy(fields)
+
+
+async def _extract_task_fields(text: str, pipeline: str | None) -> dict[str, Any]:
+    rules = extract_fields_by_rules(text, pipeline)
+    if _use_fast_path(rules.confidence):
+        fields = _normalize_fields(rules.fields, text, pipeline)
+        path = "rules"
+    else:
+        fields = _normalize_fields(await _llm_extract(text, pipeline), text, pipeline)
+        path = "llm"
+
+    fields["extraction_path"] = path
+    fields["extraction_confidence"] = rules.confidence
+    logger.info(
+        "Task fields extracted",
+        extra={"extraction_path": path, "rule_confidence": rules.confidence, "pipeline": pipeline},
+    )
+    return fields
+
+
 async def generate_enrichment(task_text: str, chunks: list[dict[str, Any]]) -> str:
     if not chunks:
         return "No relevant SOP tips found."
 
-    context_blob = "\n\n".join(
-        f"[{chunk.get('doc_title')} {chunk.get('section_ref')}] {chunk.get('chunk_text')}"
-        for chunk in chunks
-    )
+    context_blob = build_context(chunks, task_text).text
     system_prompt = (
         "You are an operations assistant. Using ONLY the provided context, produce "
         "a compact checklist with source tags. Format exactly:\n"
@@ -195,11 +185,92 @@ async def generate_enrichment(task_text: str, chunks: list[dict[str, Any]]) -> s
     )
     user_prompt = f"Task: {task_text}\n\nContext:\n{context_blob}"
 
-    llm = _get_llm(temperature=0.1)
-    response = await llm.ainvoke(
+    content = await get_llm_client().chat(
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        temperature=0.1,
+    )
+    return content.strip()
+
+
+def _format_enrichment(sections: EnrichmentSections) -> str:
+    lines: list[str] = []
+    for heading, items in [
+        ("Checklist:", sections.checklist),
+        ("Required fields:", sections.required_fields),
+        ("Approvals / exceptions:", sections.approvals_exceptions),
+    ]:
+        if items:
+            lines.append(heading)
+            lines.extend(f"- {item}" for item in items)
+    return "\n".join(lines) if lines else "No relevant SOP tips found."
+
+
+async def _llm_extract_and_enrich(text: str, pipeline: str | None, chunks: list[dict[str, Any]]) -> TaskExtraction:
+    system_prompt = (
+        "You are an operations assistant. Extract task fields from the message and, "
+        "using ONLY the provided SOP context, produce a compact checklist.\n"
+        "task: title, summary, priority (1-4), due_date (YYYY-MM-DD or null), labels, "
+        "assignee (or null), key_details, questions (missing info), subtasks (short action items). "
+        "If unsure, set priority=3, labels=[pipeline], due_date=null.\n"
+        "enrichment: checklist, required_fields, approvals_exceptions; every item ends with "
+        "a source tag like [Doc §X]. Leave lists empty when the context has nothing relevant."
+    )
+    user_prompt = (
+        f"Message: {text}\n"
+        f"Pipeline: {pipeline or 'general'}\n\n"
+        f"Context:\n{build_context(chunks, text).text}"
+    )
+    content = await get_llm_client().chat(
         [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt},
-        ]
+        ],
+        temperature=0.0,
+        response_format=_structured_format(),
+    )
+    return TaskExtraction.model_validate_json(content)
+
+
+async def extract_and_enrich(
+    text: str,
+    pipeline: str | None,
+    chunks: list[dict[str, Any]],
+) -> tuple[dict[str, Any], str]:
+    # Duplicate concurrent messages retrieve the same chunks, so they share one combined call.
+    key = (
+        pipeline,
+        normalize_key(text, casefold=False),
+        tuple((chunk.get("doc_title"), chunk.get("section_ref"), chunk.get("chunk_text")) for chunk in chunks),
+    )
+    fields, enrichment = await get_flight("extract_and_enrich").do(
+        key, lambda: _extract_and_enrich(text, pipeline, chunks)
+    )
+    return copy.deepcopy(fields), enrichment
+
+
+async def _extract_and_enrich(
+    text: str,
+    pipeline: str | None,
+    chunks: list[dict[str, Any]],
+) -> tuple[dict[str, Any], str]:
+    rules = extract_fields_by_rules(text, pipeline)
+    if not chunks or _use_fast_path(rules.confidence):
+        return await extract_task_fields(text, pipeline), await generate_enrichment(text, chunks)
+
+    try:
+        result = await _llm_extract_and_enrich(text, pipeline, chunks)
+    except Exception as exc:
+        logger.warning("Combined extraction failed, falling back to two calls", exc_info=exc)
+        return await extract_task_fields(text, pipeline), await generate_enrichment(text, chunks)
+
+    fields = _normalize_fields(result.task.model_dump(), text, pipeline)
+    fields["extraction_path"] = "combined"
+    fields["extraction_confidence"] = rules.confidence
+    logger.info(
+        "Task fields extracted",
+        extra={"extraction_path": "combined", "rule_confidence": rules.confidence, "pipeline": pipeline},
     )
-    return (response.content or "").strip()
+    return fields, _format_enrichment(result.enrichment)
@@ -0,0 +1,443 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import functools
+import hashlib
+import ipaddress
+import logging
+import mimetypes
+import multiprocessing
+import os
+import socket
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+from urllib.parse import urljoin, urlsplit
+
+import httpcore
+import httpx
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db import models
+from app.db.session import on_replica
+from app.schemas.inbound import Attachment
+
+logger = logging.getLogger(__name__)
+
+# Extractors run in worker processes: module-level functions taking a file
+# path and a character budget.
+Extractor = Callable[[str, int], str]
+
+
+class AttachmentError(Exception):
+    pass
+
+
+class AttachmentTooLarge(AttachmentError):
+    pass
+
+
+class AttachmentBlocked(AttachmentError):
+    pass
+
+
+def extract_text_file(path: str, max_chars: int) -> str:
+    with open(path, encoding="utf-8", errors="replace") as handle:
+        return handle.read(max_chars).strip()
+
+
+def extract_csv(path: str, max_chars: int) -> str:
+    lines: list[str] = []
+    used = 0
+    with open(path, newline="", encoding="utf-8", errors="replace") as handle:
+        for row in csv.reader(handle):
+            line = " | ".join(cell.strip() for cell in row if cell.strip())
+            if not line:
+                continue
+            if used + len(line) + 1 > max_chars:
+                break
+            lines.append(line)
+            used += len(line) + 1
+    return "\n".join(lines)
+
+
+def extract_pdf(path: str, max_chars: int) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise AttachmentError("pypdf is not installed")
+    parts: list[str] = []
+    used = 0
+    for page in PdfReader(path).pages:
+        page_text = (page.extract_text() or "").strip()
+        if not page_text:
+            continue
+        parts.append(page_text)
+        used += len(page_text)
+        if used >= max_chars:
+            break
+    return "\n".join(parts)[:max_chars]
+
+
+def extract_image(path: str, max_chars: int) -> str:
+    try:
+        import pytesseract
+        from PIL import Image
+    except ImportError:
+        raise AttachmentError("pytesseract and Pillow are not installed")
+    with Image.open(path) as image:
+        return pytesseract.image_to_string(image).strip()[:max_chars]
+
+
+_extractors: dict[str, Extractor] = {}
+_kinds_by_type: dict[str, str] = {}
+_kinds_by_extension: dict[str, str] = {}
+
+
+def register_extractor(
+    kind: str,
+    extractor: Extractor,
+    content_types: tuple[str, ...] = (),
+    extensions: tuple[str, ...] = (),
+) -> None:
+    _extractors[kind] = extractor
+    _kinds_by_type.update({content_type: kind for content_type in content_types})
+    _kinds_by_extension.update({extension: kind for extension in extensions})
+
+
+register_extractor("text", extract_text_file, ("text/plain", "text/markdown"), (".txt", ".md"))
+register_extractor("csv", extract_csv, ("text/csv", "application/csv"), (".csv",))
+register_extractor("pdf", extract_pdf, ("application/pdf",), (".pdf",))
+register_extractor(
+    "image",
+    extract_image,
+    ("image/png", "image/jpeg", "image/gif", "image/tiff", "image/webp"),
+    (".png", ".jpg", ".jpeg", ".gif", ".tif", ".tiff", ".webp"),
+)
+
+
+def _kind(content_type: str | None, attachment: Attachment) -> str | None:
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in _kinds_by_type:
+        return _kinds_by_type[content_type]
+    kind = _kinds_by_extension.get(Path(attachment.name).suffix.lower())
+    if kind is not None:
+        return kind
+    if content_type.startswith("image/"):
+        return "image"
+    return attachment.type if attachment.type in _extractors else None
+
+
+@dataclass
+class AttachmentText:
+    name: str
+    url: str
+    sha256: str | None = None
+    size_bytes: int = 0
+    content_type: str | None = None
+    extractor: str | None = None
+    text: str = ""
+    cached: bool = False
+    error: str | None = None
+
+
+class _TextCache:
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[str | None, str]] = OrderedDict()
+
+    def get(self, sha256: str) -> tuple[str | None, str] | None:
+        entry = self._entries.get(sha256)
+        if entry is not None:
+            self._entries.move_to_end(sha256)
+        return entry
+
+    def put(self, sha256: str, extractor: str | None, text: str) -> None:
+        self._entries[sha256] = (extractor, text)
+        self._entries.move_to_end(sha256)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache = _TextCache(settings.attachment_cache_size)
+_stats = {
+    "downloaded": 0,
+    "bytes": 0,
+    "too_large": 0,
+    "blocked": 0,
+    "failed": 0,
+    "unsupported": 0,
+    "cache_hits": 0,
+    "db_hits": 0,
+    "extracted": 0,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _pool() -> ProcessPoolExecutor:
+    # Spawn, not fork: the server already runs the log listener thread, to_thread
+    # workers and asyncpg connections, and a forked child could inherit held locks.
+    return ProcessPoolExecutor(max_workers=settings.attachment_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def close_attachment_pool() -> None:
+    if _pool.cache_info().currsize:
+        _pool().shutdown(wait=False, cancel_futures=True)
+        _pool.cache_clear()
+
+
+def _host_allowed(host: str) -> bool:
+    host = host.lower().rstrip(".")
+    return any(host == allowed or host.endswith(f".{allowed}") for allowed in settings.attachment_allowed_hosts)
+
+
+async def _public_address(host: str, port: int) -> str:
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError:
+        raise AttachmentError(f"cannot resolve {host}")
+    addresses = [info[4][0] for info in infos]
+    for address in addresses:
+        parsed = ipaddress.ip_address(address.split("%")[0])
+        if not parsed.is_global or parsed.is_multicast:
+            raise AttachmentBlocked(f"host {host} resolves to a non-public address")
+    return addresses[0]
+
+
+class _PublicOnlyBackend(httpcore.AsyncNetworkBackend):
+    # Resolves, checks and connects to the same address, so a DNS-rebinding host
+    # cannot pass the check and then connect somewhere private. TLS still
+    # verifies the certificate against the URL's hostname.
+    def __init__(self) -> None:
+        self._backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: float | None = None,
+        local_address: str | None = None,
+        socket_options: Any = None,
+    ) -> httpcore.AsyncNetworkStream:
+        address = await _public_address(host, port)
+        return await self._backend.connect_tcp(
+            address, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+        )
+
+    async def connect_unix_socket(self, *args: Any, **kwargs: Any) -> httpcore.AsyncNetworkStream:
+        raise AttachmentBlocked("unix sockets are not allowed")
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+class _PublicOnlyTransport(httpx.AsyncHTTPTransport):
+    def __init__(self) -> None:
+        super().__init__()
+        # httpx (pinned in requirements) does not expose network_backend, so
+        # replace its connection pool with one that uses the checking backend.
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(), network_backend=_PublicOnlyBackend()
+        )
+
+
+def _transport() -> httpx.AsyncBaseTransport | None:
+    return None if settings.attachment_allow_private_networks else _PublicOnlyTransport()
+
+
+def _check_url(url: str) -> str:
+    # URLs come from the inbound payload, so every hop is checked before it is
+    # fetched; the address itself is checked at connect time by _PublicOnlyBackend.
+    parts = urlsplit(url)
+    if parts.scheme not in {"http", "https"} or not parts.hostname:
+        raise AttachmentBlocked("unsupported URL")
+    host = parts.hostname
+    if settings.attachment_allowed_hosts and not _host_allowed(host):
+        raise AttachmentBlocked(f"host {host} is not allowed")
+    return host
+
+
+async def _download(client: httpx.AsyncClient, item: AttachmentText, path: str) -> None:
+    limit = settings.attachment_max_bytes
+    digest = hashlib.sha256()
+    url = item.url
+    first_host: str | None = None
+    for _ in range(settings.attachment_max_redirects + 1):
+        host = _check_url(url)
+        first_host = first_host or host
+        headers = {}
+        # The token only goes to allow-listed hosts, and never across a redirect to another host.
+        if settings.attachment_auth_token and host == first_host and _host_allowed(host):
+            headers["Authorization"] = f"Bearer {settings.attachment_auth_token}"
+        async with client.stream("GET", url, headers=headers) as resp:
+            if resp.is_redirect:
+                url = urljoin(url, resp.headers["location"])
+                continue
+            resp.raise_for_status()
+            length = resp.headers.get("content-length")
+            if length and length.isdigit() and int(length) > limit:
+                raise AttachmentTooLarge(f"larger than {limit} bytes")
+            item.content_type = resp.headers.get("content-type") or mimetypes.guess_type(item.name)[0]
+            # Stream to disk while hashing so memory stays at one chunk per download.
+            with open(path, "wb") as handle:
+                async for chunk in resp.aiter_bytes(settings.attachment_chunk_size):
+                    item.size_bytes += len(chunk)
+                    if item.size_bytes > limit:
+                        raise AttachmentTooLarge(f"larger than {limit} bytes")
+                    digest.update(chunk)
+                    handle.write(chunk)
+        item.sha256 = digest.hexdigest()
+        return
+    raise AttachmentError("too many redirects")
+
+
+async def _fetch(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    attachment: Attachment,
+    path: str,
+) -> AttachmentText:
+    item = AttachmentText(name=attachment.name, url=attachment.url)
+    async with semaphore:
+        try:
+            await _download(client, item, path)
+        except AttachmentError as exc:
+            item.error = str(exc)
+            if isinstance(exc, AttachmentTooLarge):
+                _stats["too_large"] += 1
+            elif isinstance(exc, AttachmentBlocked):
+                _stats["blocked"] += 1
+            else:
+                _stats["failed"] += 1
+            return item
+        except Exception as exc:
+            logger.warning("Attachment download failed", extra={"attachment": item.name}, exc_info=exc)
+            item.error = exc.__class__.__name__
+            _stats["failed"] += 1
+            return item
+    _stats["downloaded"] += 1
+    _stats["bytes"] += item.size_bytes
+    item.extractor = _kind(item.content_type, attachment)
+    if item.extractor is None:
+        item.error = "unsupported type"
+        _stats["unsupported"] += 1
+    return item
+
+
+async def _extract(item: AttachmentText, path: str) -> None:
+    loop = asyncio.get_running_loop()
+    try:
+        text = await loop.run_in_executor(_pool(), _extractors[item.extractor], path, settings.attachment_max_chars)
+        # Postgres text columns reject NUL bytes, which CSV and text files can carry.
+        item.text = text.replace("\x00", "")
+        _stats["extracted"] += 1
+    except Exception as exc:
+        logger.warning("Attachment extraction failed", extra={"attachment": item.name}, exc_info=exc)
+        item.error = str(exc) if isinstance(exc, AttachmentError) else exc.__class__.__name__
+        _stats["failed"] += 1
+
+
+async def process_attachments(
+    session: AsyncSession | None,
+    attachments: list[Attachment],
+) -> list[AttachmentText]:
+    if not settings.attachments_enabled or not attachments:
+        return []
+    selected = attachments[: settings.attachment_max_count]
+    paths: list[str] = []
+    for _ in selected:
+        handle, path = tempfile.mkstemp(prefix="attachment-")
+        os.close(handle)
+        paths.append(path)
+    try:
+        semaphore = asyncio.Semaphore(settings.attachment_concurrency)
+        # Redirects are followed by _download so each hop is checked.
+        async with httpx.AsyncClient(
+            timeout=settings.attachment_timeout, follow_redirects=False, transport=_transport()
+        ) as client:
+            items = list(
+                await asyncio.gather(
+                    *(_fetch(client, semaphore, attachment, path) for attachment, path in zip(selected, paths))
+                )
+            )
+
+        pending: dict[str, list[tuple[AttachmentText, str]]] = {}
+        for item, path in zip(items, paths):
+            if item.error or item.sha256 is None:
+                continue
+            hit = _cache.get(item.sha256)
+            if hit is not None:
+                item.extractor, item.text = hit
+                item.cached = True
+                _stats["cache_hits"] += 1
+                continue
+            pending.setdefault(item.sha256, []).append((item, path))
+
+        if pending and session is not None:
+            rows = (
+                await session.execute(
+                    on_replica(select(models.AttachmentText).where(models.AttachmentText.sha256.in_(list(pending))))
+                )
+            ).scalars().all()
+            for row in rows:
+                _cache.put(row.sha256, row.extractor, row.text or "")
+                for item, _ in pending.pop(row.sha256):
+                    item.extractor, item.text = row.extractor, row.text or ""
+                    item.cached = True
+                    _stats["db_hits"] += 1
+
+        # Identical files in one event are extracted once.
+        await asyncio.gather(*(_extract(group[0][0], group[0][1]) for group in pending.values()))
+        new_rows: list[dict[str, Any]] = []
+        for sha256, group in pending.items():
+            first = group[0][0]
+            for item, _ in group[1:]:
+                item.text, item.error = first.text, first.error
+            if first.error is None:
+                _cache.put(sha256, first.extractor, first.text)
+                new_rows.append(
+                    {
+                        "sha256": sha256,
+                        "content_type": first.content_type,
+                        "size_bytes": first.size_bytes,
+                        "extractor": first.extractor,
+                        "text": first.text,
+                    }
+                )
+        if new_rows and session is not None:
+            # The DB cache is best effort: a failed insert only rolls back its savepoint.
+            try:
+                async with session.begin_nested():
+                    await session.execute(insert(models.AttachmentText).values(new_rows).on_conflict_do_nothing())
+            except Exception as exc:
+                logger.warning("Attachment text cache insert failed", exc_info=exc)
+            await session.commit()
+        return items
+    finally:
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+def with_attachment_text(text: str, items: list[AttachmentText]) -> str:
+    blocks = [text]
+    for item in items:
+        if item.text:
+            blocks.append(f"Attachment {item.name}:\n{item.text}")
+    return "\n\n".join(blocks)
+
+
+def attachment_stats() -> dict[str, Any]:
+    return dict(_stats, cached=len(_cache), workers=settings.attachment_workers)
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from typing import Any
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db import models
+from app.db.session import AsyncSessionLocal, on_replica
+from app.services.knowledge_base import embed_texts
+from app.services.router import CHANNEL_ROUTES, route_channel
+
+logger = logging.getLogger(__name__)
+
+SEED_EXAMPLES: dict[str, list[str]] = {
+    "expense": [
+        "Please reimburse my $240 client dinner, receipt attached",
+        "Submit expense report for the Q3 conference hotel and taxis",
+        "Amex charge of 1,200 EUR needs a cost code",
+    ],
+    "travel": [
+        "Book flights to London for the board meeting Oct 12-15",
+        "Need a hotel in Geneva next week for two nights",
+        "Can you arrange a car from the airport on Friday?",
+    ],
+    "vendor": [
+        "Onboard Acme Security as a new vendor, W-9 attached",
+        "Pay the outstanding invoice from Bright Landscaping",
+        "Renew the contract with our IT support provider",
+    ],
+    "maintenance": [
+        "The AC in the guest house is leaking again",
+        "Schedule the annual boiler inspection at the lake house",
+        "Pool pump is making noise, please get someone out",
+    ],
+    "sop_qa": [
+        "What is the approval limit for expenses without a receipt?",
+        "How many days do I have to submit an expense report?",
+        "Which class of travel is allowed for flights over six hours?",
+    ],
+}
+
+_centroids: dict[str, list[float]] = {}
+_refreshed_at = 0.0
+_failed_at: float | None = None
+_refresh_lock = asyncio.Lock()
+_refresh_task: asyncio.Task[None] | None = None
+_stats = {"refresh_failures": 0}
+
+
+def _normalize(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def _centroid(vectors: list[list[float]]) -> list[float]:
+    return _normalize([sum(column) / len(vectors) for column in zip(*vectors)])
+
+
+async def _load_examples(session: AsyncSession) -> dict[str, list[str]]:
+    examples = {pipeline: list(texts) for pipeline, texts in SEED_EXAMPLES.items()}
+    # Only channel-mapped (tier 1) events are used as labels, so content-routed
+    # events never feed back into their own centroids.
+    ranked = (
+        select(
+            models.InboxEvent.pipeline,
+            models.InboxEvent.text,
+            func.row_number()
+            .over(partition_by=models.InboxEvent.pipeline, order_by=models.InboxEvent.created_at.desc())
+            .label("rank"),
+        )
+        .where(models.InboxEvent.intake_tier == 1, models.InboxEvent.pipeline.in_(list(examples)))
+        .subquery()
+    )
+    stmt = select(ranked.c.pipeline, ranked.c.text).where(
+        ranked.c.rank <= settings.content_router_examples_per_pipeline
+    )
+    result = await session.execute(on_replica(stmt))
+    for pipeline, text_value in result.all():
+        examples[pipeline].append(text_value)
+    return examples
+
+
+async def refresh_centroids(session: AsyncSession) -> dict[str, list[float]]:
+    global _centroids, _refreshed_at
+    examples = await _load_examples(session)
+    pipelines = [pipeline for pipeline, texts in examples.items() if texts]
+    flat = [text_value for pipeline in pipelines for text_value in examples[pipeline]]
+    vectors = await embed_texts(flat)
+    centroids: dict[str, list[float]] = {}
+    offset = 0
+    for pipeline in pipelines:
+        count = len(examples[pipeline])
+        centroids[pipeline] = _centroid(vectors[offset:offset + count])
+        offset += count
+    _centroids = centroids
+    _refreshed_at = time.monotonic()
+    logger.info("Content router centroids refreshed", extra={"examples": len(flat), "pipelines": len(centroids)})
+    return centroids
+
+
+def _refresh_failed(exc: Exception) -> None:
+    global _failed_at
+    _failed_at = time.monotonic()
+    _stats["refresh_failures"] += 1
+    logger.warning("Content router refresh failed", exc_info=exc)
+
+
+def _backing_off() -> bool:
+    # After a failure, wait before trying again instead of re-embedding on every request.
+    return _failed_at is not None and time.monotonic() - _failed_at < settings.content_router_retry_seconds
+
+
+async def _refresh_in_background() -> None:
+    try:
+        async with _refresh_lock:
+            async with AsyncSessionLocal() as session:
+                await refresh_centroids(session)
+    except Exception as exc:
+        # Keep serving the previous centroids rather than failing intake.
+        _refresh_failed(exc)
+
+
+async def _get_centroids(session: AsyncSession) -> dict[str, list[float]]:
+    global _refresh_task
+    if _centroids:
+        # Stale centroids are still served; the refresh re-embeds every example,
+        # so it runs off the request path (at most one at a time).
+        stale = time.monotonic() - _refreshed_at >= settings.content_router_refresh_seconds
+        if stale and not _backing_off() and (_refresh_task is None or _refresh_task.done()):
+            _refresh_task = asyncio.create_task(_refresh_in_background())
+        return _centroids
+    # Nothing to serve yet (warm-up failed or is disabled): build them inline once.
+    if _backing_off():
+        return _centroids
+    async with _refresh_lock:
+        if _centroids or _backing_off():
+            return _centroids
+        try:
+            return await refresh_centroids(session)
+        except Exception as exc:
+            _refresh_failed(exc)
+            return _centroids
+
+
+async def classify_text(session: AsyncSession, text_value: str) -> tuple[str, float] | None:
+    centroids = await _get_centroids(session)
+    if not centroids:
+        return None
+    query = _normalize((await embed_texts([text_value]))[0])
+    scores = sorted(
+        ((sum(a * b for a, b in zip(query, centroid)), pipeline) for pipeline, centroid in centroids.items()),
+        reverse=True,
+    )
+    best_score, best_pipeline = scores[0]
+    runner_up = scores[1][0] if len(scores) > 1 else 0.0
+    if best_score < settings.content_router_min_similarity or best_score - runner_up < settings.content_router_min_margin:
+        return None
+    return best_pipeline, best_score
+
+
+def _routes_by_pipeline() -> dict[str, dict[str, Any]]:
+    return {route["pipeline"]: route for route in CHANNEL_ROUTES.values()}
+
+
+async def route_event(session: AsyncSession, channel: str | None, text_value: str) -> dict[str, Any]:
+    route_info = route_channel(channel)
+    if route_info["intake_tier"] == 1 or not settings.content_router_enabled or settings.mock_mode:
+        return route_info
+    try:
+        match = await classify_text(session, text_value)
+    except Exception as exc:
+        logger.warning("Content routing failed, using general pipeline", exc_info=exc)
+        return route_info
+    if match is None:
+        return route_info
+    pipeline, score = match
+    return {
+        **_routes_by_pipeline()[pipeline],
+        "intake_tier": 2,
+        "routed_by": "content",
+        "route_confidence": round(score, 4),
+    }
+
+
+def router_stats() -> dict[str, Any]:
+    return {
+        "pipelines": sorted(_centroids),
+        "age_s": round(time.monotonic() - _refreshed_at, 1) if _centroids else None,
+        "refresh_failures": _stats["refresh_failures"],
+        "backing_off": _backing_off(),
+    }
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import functools
+import logging
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?;:])\s+|\s+(?=-\s)|\n+")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+@functools.lru_cache(maxsize=None)
+def _encoder() -> Callable[[str], list[int]] | None:
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(settings.openai_model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as exc:
+        # Encodings are downloaded on first use; offline hosts fall back to the estimate.
+        logger.warning("tiktoken encoding unavailable, estimating token counts", exc_info=exc)
+        return None
+    return encoding.encode
+
+
+def count_tokens(text: str) -> int:
+    encode = _encoder()
+    if encode is not None:
+        return len(encode(text))
+    # Roughly four characters per token for English prose.
+    return math.ceil(len(text) / 4)
+
+
+def _terms(text: str) -> set[str]:
+    return {word for word in _WORD_RE.findall(text.lower()) if len(word) > 3}
+
+
+def _label(chunk: dict[str, Any]) -> str:
+    return f"[{chunk.get('doc_title')} {chunk.get('section_ref')}]"
+
+
+def _body(chunk: dict[str, Any]) -> str:
+    chunk_text = (chunk.get("chunk_text") or "").strip()
+    section = (chunk.get("section_ref") or "").strip()
+    # Ingestion prepends the section heading, which the label already carries.
+    if section and chunk_text.startswith(section):
+        chunk_text = chunk_text[len(section):].lstrip()
+    return chunk_text
+
+
+def _relevant_sentences(body: str, query_terms: set[str], limit: int) -> list[str]:
+    sentences = [sentence.strip() for sentence in _SENTENCE_RE.split(body) if sentence and sentence.strip()]
+    if len(sentences) <= limit:
+        return sentences
+    scores = [len(query_terms & _terms(sentence)) for sentence in sentences]
+    if not any(scores):
+        return sentences[:limit]
+    ranked = sorted(range(len(sentences)), key=lambda idx: (-scores[idx], idx))[:limit]
+    return [sentences[idx] for idx in sorted(ranked)]
+
+
+def _truncate_words(text: str, max_tokens: int) -> str:
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:mid])) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return " ".join(words[:low])
+
+
+@dataclass
+class BuiltContext:
+    text: str
+    tokens: int
+    raw_tokens: int
+    chunks_used: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.raw_tokens - self.tokens, 0)
+
+
+_stats = {"requests": 0, "raw_tokens": 0, "tokens": 0, "tokens_saved": 0, "chunks_dropped": 0}
+
+
+def build_context(
+    chunks: list[dict[str, Any]],
+    query: str,
+    budget: int | None = None,
+    max_sentences: int | None = None,
+) -> BuiltContext:
+    budget = settings.context_token_budget if budget is None else budget
+    max_sentences = settings.context_max_sentences if max_sentences is None else max_sentences
+    query_terms = _terms(query)
+
+    raw_tokens = count_tokens(
+        "\n\n".join(f"{_label(chunk)} {chunk.get('chunk_text')}" for chunk in chunks)
+    )
+    blocks: list[str] = []
+    used = 0
+    for chunk in chunks:
+        label = _label(chunk)
+        sentences = _relevant_sentences(_body(chunk), query_terms, max_sentences)
+        separator = count_tokens("\n\n") if blocks else 0
+        block = None
+        for count in range(len(sentences), 0, -1):
+            candidate = f"{label} {' '.join(sentences[:count])}"
+            if used + count_tokens(candidate) + separator <= budget:
+                block = candidate
+                break
+        if block is None and sentences:
+            # Even the best sentence is over budget (or the chunk has no sentence
+            # breaks), so keep as many of its words as fit.
+            words = _truncate_words(sentences[0], budget - used - separator - count_tokens(f"{label} "))
+            if words:
+                block = f"{label} {words}"
+        if block is None:
+            # A later, shorter chunk may still fit.
+            continue
+        blocks.append(block)
+        used += count_tokens(block) + separator
+
+    text = "\n\n".join(blocks)
+    result = BuiltContext(text=text, tokens=count_tokens(text), raw_tokens=raw_tokens, chunks_used=len(blocks))
+    _stats["requests"] += 1
+    _stats["raw_tokens"] += result.raw_tokens
+    _stats["tokens"] += result.tokens
+    _stats["tokens_saved"] += result.tokens_saved
+    _stats["chunks_dropped"] += len(chunks) - result.chunks_used
+    logger.info(
+        "Context built",
+        extra={
+            "context_tokens": result.tokens,
+            "raw_tokens": result.raw_tokens,
+            "tokens_saved": result.tokens_saved,
+            "chunks_used": result.chunks_used,
+            "chunks_total": len(chunks),
+        },
+    )
+    return result
+
+
+def context_stats() -> dict[str, Any]:
+    return dict(_stats, tokenizer="tiktoken" if _encoder() is not None else "heuristic")
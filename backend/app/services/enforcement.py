@@ -1,13 +1,21 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 from dataclasses import dataclass
-from datetime import date, datetime, timezone
-from typing import Any
+from datetime import date, datetime, time, timezone, tzinfo
+from typing import Any, AsyncIterator
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from app.config import settings
 from app.db import models
+from app.db.session import on_replica
+from app.services.audit import log_action
+from app.services.n8n_client import post_outbound
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -29,13 +37,15 @@ def _parse_ts(ts: str | None) -> datetime | None:
         return None
 
 
-def _has_user_update_today(comments: list[Any]) -> bool:
-    today = datetime.now(timezone.utc).date()
+def _has_user_update_today(comments: list[Any], tz: tzinfo = timezone.utc) -> bool:
+    today = datetime.now(tz).date()
     for comment in comments:
         content = (getattr(comment, "content", "") or "").strip()
         if content.startswith("📋 SOP Reminders") or "Auto-generated from company SOPs." in content:
             continue
         posted_at = _parse_ts(getattr(comment, "posted_at", None))
+        if posted_at and posted_at.tzinfo is not None:
+            posted_at = posted_at.astimezone(tz)
         if posted_at and posted_at.date() == today:
             return True
     return False
@@ -55,46 +65,199 @@ def _is_due_today_or_overdue(task: Any) -> bool:
     return False
 
 
+def already_notified_query(task_ids: list[str], check_type: str, since: datetime) -> Any:
+    # Served by enforcement_log_task_check_created_at_idx.
+    return (
+        select(models.EnforcementLog.task_id)
+        .where(
+            models.EnforcementLog.task_id.in_(task_ids),
+            models.EnforcementLog.check_type == check_type,
+            models.EnforcementLog.created_at >= since,
+        )
+        .distinct()
+    )
+
+
+async def _already_notified(
+    session: AsyncSession,
+    task_ids: list[str],
+    check_type: str,
+    since: datetime,
+) -> set[str]:
+    if not task_ids:
+        return set()
+    result = await session.execute(already_notified_query(task_ids, check_type, since))
+    return set(result.scalars().all())
+
+
+def candidate_tasks_query(
+    today: date,
+    only_assignees: list[str] | None = None,
+    skip_assignees: list[str] | None = None,
+) -> Any:
+    stmt = select(models.Task).where(
+        models.Task.status == "open",
+        models.Task.priority >= 3,
+        models.Task.due_date <= today,
+    )
+    if only_assignees is not None:
+        stmt = stmt.where(models.Task.assignee.in_(only_assignees))
+    if skip_assignees:
+        stmt = stmt.where(
+            (models.Task.assignee.is_(None)) | (models.Task.assignee.not_in(skip_assignees))
+        )
+    return stmt
+
+
+async def iter_candidate_pages(
+    session: AsyncSession,
+    today: date,
+    only_assignees: list[str] | None = None,
+    skip_assignees: list[str] | None = None,
+    after_id: str | None = None,
+    page_size: int | None = None,
+) -> AsyncIterator[list[models.Task]]:
+    page_size = page_size or settings.enforcement_page_size
+    # Keyset pages on the primary key: bounded memory, and each page is a short
+    # query, so no cursor or transaction stays open across Todoist calls.
+    while True:
+        stmt = candidate_tasks_query(today, only_assignees, skip_assignees).order_by(models.Task.id).limit(page_size)
+        if after_id is not None:
+            stmt = stmt.where(models.Task.id > after_id)
+        page = (await session.execute(on_replica(stmt))).scalars().all()
+        if not page:
+            return
+        yield list(page)
+        if len(page) < page_size:
+            return
+        after_id = page[-1].id
+
+
 async def check_high_priority_tasks(
     session: AsyncSession,
     todoist_client: Any,
     check_type: str,
+    tz: tzinfo = timezone.utc,
+    only_assignees: list[str] | None = None,
+    skip_assignees: list[str] | None = None,
+    pace_seconds: float = 0.0,
+    run: models.EnforcementRun | None = None,
 ) -> tuple[list[Reminder], int]:
-    today = datetime.now(timezone.utc).date()
-    result = await session.execute(
-        select(models.Task).where(
-            models.Task.status == "open",
-            models.Task.priority >= 3,
-            models.Task.due_date <= today,
-        )
-    )
-    db_tasks = result.scalars().all()
+    today = datetime.now(tz).date()
+    day_start = datetime.combine(today, time.min, tzinfo=tz)
+    after_id = run.last_task_id if run is not None else None
     reminders: list[Reminder] = []
     checked = 0
-    for task in db_tasks:
-        checked += 1
-        if not task.todoist_id:
-            continue
-        comments = await todoist_client.get_comments(task.todoist_id)
-        if _has_user_update_today(comments):
-            continue
+    suppressed_total = 0
+    async for db_tasks in iter_candidate_pages(session, today, only_assignees, skip_assignees, after_id):
+        suppressed = await _already_notified(session, [task.id for task in db_tasks], check_type, day_start)
+        suppressed_total += len(suppressed)
+        # End the read transaction before the paced Todoist calls so the
+        # connection is not left idle in transaction for the spread window.
+        await session.commit()
+        page_logs: list[models.EnforcementLog] = []
+        for task in db_tasks:
+            checked += 1
+            if not task.todoist_id or task.id in suppressed:
+                continue
+            if pace_seconds and checked > 1:
+                await asyncio.sleep(pace_seconds)
+            comments = await todoist_client.get_comments(task.todoist_id)
+            if _has_user_update_today(comments, tz):
+                continue
 
-        reminder = Reminder(
-            todoist_task_id=task.todoist_id,
-            title=task.title,
-            assignee=task.assignee,
-            reminded=True,
-        )
-        reminders.append(reminder)
-
-        log = models.EnforcementLog(
-            task_id=task.id,
-            todoist_task_id=task.todoist_id,
-            check_type=check_type,
-            has_update=False,
-            notified_user=reminder.assignee,
-        )
-        session.add(log)
+            reminder = Reminder(
+                todoist_task_id=task.todoist_id,
+                title=task.title,
+                assignee=task.assignee,
+                reminded=True,
+            )
+            reminders.append(reminder)
+
+            log = models.EnforcementLog(
+                task_id=task.id,
+                todoist_task_id=task.todoist_id,
+                check_type=check_type,
+                has_update=False,
+                notified_user=reminder.assignee,
+                run_id=run.id if run is not None else None,
+            )
+            page_logs.append(log)
+
+        if run is not None:
+            run.last_task_id = db_tasks[-1].id
+            run.checked += len(db_tasks)
+            run.reminders += len(page_logs)
+            run.checkpoint_at = datetime.now(timezone.utc)
+        # Short write transaction per page, so a crash loses at most one page of
+        # decisions; then drop the page from the identity map to keep memory flat.
+        session.add_all(page_logs)
+        await session.commit()
+        for obj in [*db_tasks, *page_logs]:
+            session.expunge(obj)
 
-    await session.commit()
+    if suppressed_total:
+        logger.info("Suppressed repeat reminders", extra={"check_type": check_type, "suppressed": suppressed_total})
     return reminders, checked
+
+
+async def run_reminders(session: AsyncSession, run_id: str) -> list[Reminder]:
+    # Includes reminders logged by earlier, interrupted attempts of the same run.
+    result = await session.execute(
+        select(models.EnforcementLog.todoist_task_id, models.Task.title, models.EnforcementLog.notified_user)
+        .join(models.Task, models.Task.id == models.EnforcementLog.task_id)
+        .where(models.EnforcementLog.run_id == run_id)
+        .order_by(models.EnforcementLog.created_at)
+    )
+    return [
+        Reminder(todoist_task_id=todoist_task_id, title=title, assignee=assignee, reminded=True)
+        for todoist_task_id, title, assignee in result.all()
+    ]
+
+
+def _reminder_target(assignee: str | None) -> dict[str, Any]:
+    if isinstance(assignee, str) and assignee.strip().lower() in {"none", "null", ""}:
+        assignee = None
+
+    if assignee:
+        return {"action": "send_slack_dm", "user_id": assignee}
+    if settings.default_reminder_channel:
+        return {"action": "send_slack_message", "channel": settings.default_reminder_channel}
+    if settings.default_reminder_user_id:
+        return {"action": "send_slack_dm", "user_id": settings.default_reminder_user_id}
+    return {"action": "send_log"}
+
+
+def _digest_text(reminders: list[Reminder], personal: bool) -> str:
+    if len(reminders) == 1:
+        subject = "Your task" if personal else "Task"
+        return f"⏰ Reminder: {subject} '{reminders[0].title}' is high priority and needs an EOD status update in Todoist comments."
+    subject = "Your" if personal else "These"
+    lines = [f"⏰ Reminder: {subject} {len(reminders)} high priority tasks need an EOD status update in Todoist comments:"]
+    lines.extend(f"• {reminder.title}" for reminder in reminders)
+    return "\n".join(lines)
+
+
+async def send_reminders(session: AsyncSession, reminders: list[Reminder]) -> int:
+    digests: dict[tuple[tuple[str, str], ...], tuple[dict[str, Any], bool, list[Reminder]]] = {}
+    for reminder in reminders:
+        target = _reminder_target(reminder.assignee)
+        personal = target.get("user_id") is not None and target.get("user_id") == reminder.assignee
+        key = tuple(sorted(target.items()))
+        digests.setdefault(key, (target, personal, []))[2].append(reminder)
+
+    for target, personal, items in digests.values():
+        await post_outbound(
+            {**target, "text": _digest_text(items, personal)},
+            session=session,
+        )
+        await log_action(
+            session,
+            actor="system",
+            action="reminder_digest_sent",
+            details={
+                "user": target.get("user_id") or target.get("channel"),
+                "todoist_task_ids": [item.todoist_task_id for item in items],
+            },
+        )
+    return len(digests)
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any
+
+from app.services.router import CHANNEL_ROUTES
+
+HIGH_PRIORITY_TOKENS = ["high priority", "urgent", "asap", "immediately", "critical"]
+
+_WEEKDAYS = [
+    ("monday", 0),
+    ("tuesday", 1),
+    ("wednesday", 2),
+    ("thursday", 3),
+    ("friday", 4),
+    ("saturday", 5),
+    ("sunday", 6),
+]
+
+_MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "sept": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+_MONTH_PATTERN = (
+    r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|"
+    r"sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+)
+_MONTH_WORD_RE = re.compile(_MONTH_PATTERN, re.IGNORECASE)
+_MONTH_DAY_RE = re.compile(rf"\b{_MONTH_PATTERN}\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?\b", re.IGNORECASE)
+_DAY_MONTH_RE = re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?{_MONTH_PATTERN}\b", re.IGNORECASE)
+_ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_RELATIVE_RE = re.compile(r"\bin\s+(\d{1,3}|a|one|two|three|four|five|six|seven)\s+(day|week)s?\b", re.IGNORECASE)
+_NUMBER_WORDS = {"a": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7}
+
+_CURRENCY = r"(AED|USD|EUR|GBP|PLN|\$|€|£)"
+_NUMBER = r"(\d[\d,]*(?:\.\d{1,2})?)"
+_AMOUNT_PREFIX_RE = re.compile(rf"{_CURRENCY}\s?{_NUMBER}", re.IGNORECASE)
+_AMOUNT_SUFFIX_RE = re.compile(rf"{_NUMBER}\s?(AED|USD|EUR|GBP|PLN|dirhams?|dollars?|euros?)\b", re.IGNORECASE)
+
+_NAME = r"([A-Z][\w&.'-]*(?:\s+(?:[A-Z][\w&.'-]*|&))*)"
+# Only phrases that name a vendor outright; "with John" or "at Reception" are
+# people and places, so bare prepositions need a company suffix.
+_VENDOR_LABEL_RE = re.compile(
+    rf"\b(?i:vendor|supplier|contractor)\s*:\s*{_NAME}|"
+    rf"\b(?i:invoice|bill|quote|quotation|receipt|order|payment)\s+(?:from|to)\s+{_NAME}"
+)
+_VENDOR_COMPANY_RE = re.compile(
+    r"\b(?:from|at|with|to)\s+"
+    r"([A-Z][\w&.'-]*(?:\s+(?:[A-Z][\w&.'-]*|&))*?\s+"
+    r"(?:LLC|L\.L\.C\.?|Ltd\.?|Limited|Inc\.?|Corp\.?|Co\.|GmbH|LLP|PLC|FZE|FZCO|FZ-LLC|DMCC|Sp\. z o\.o\.|S\.A\.))"
+)
+_SLACK_MENTION_RE = re.compile(r"<@([A-Z0-9]+)(?:\|[^>]+)?>")
+_HANDLE_MENTION_RE = re.compile(r"(?<![\w.])@([A-Za-z][\w.-]{1,40})")
+
+# Pipelines without required fields need one of these before the rules are
+# trusted on their own; a date word alone says nothing about the task.
+_PIPELINE_SIGNAL_RE: dict[str, re.Pattern[str]] = {
+    "maintenance": re.compile(
+        r"\b(?:broken|leak(?:ing|s)?|repair|fix|replace|not working|out of order|faulty|"
+        r"clogged|blocked|no power|ac|a/c|aircon|light|bulb|plumb\w*|electric\w*)\b",
+        re.IGNORECASE,
+    ),
+}
+
+# Maps router required_fields onto what the rules can extract; None means the
+# rules cannot produce the field and the LLM has to.
+_REQUIRED_FIELD_MAP: dict[str, str | None] = {
+    "amount": "amount",
+    "vendor_name": "vendor",
+    "dates": "due_date",
+    "destination": None,
+}
+
+
+@dataclass
+class RuleExtraction:
+    fields: dict[str, Any]
+    confidence: float
+    matched: list[str] = field(default_factory=list)
+
+
+def _next_weekday(today: date, idx: int) -> date:
+    days_ahead = (idx - today.weekday() + 7) % 7
+    if days_ahead == 0:
+        days_ahead = 7
+    return today + timedelta(days=days_ahead)
+
+
+def _month_day(today: date, month: int, day: int) -> date | None:
+    try:
+        candidate = date(today.year, month, day)
+    except ValueError:
+        return None
+    if candidate < today - timedelta(days=30):
+        try:
+            candidate = date(today.year + 1, month, day)
+        except ValueError:
+            return None
+    return candidate
+
+
+def infer_due_date(text: str, today: date | None = None) -> str | None:
+    lower = text.lower()
+    today = today or date.today()
+
+    if any(token in lower for token in ["today", "eod", "end of day", "midday", "noon", "by lunch"]):
+        return today.isoformat()
+    if "tomorrow" in lower:
+        return (today + timedelta(days=1)).isoformat()
+    if "next week" in lower:
+        return (today + timedelta(days=7)).isoformat()
+
+    for name, idx in _WEEKDAYS:
+        if f"next {name}" in lower:
+            return _next_weekday(today, idx).isoformat()
+    for name, idx in _WEEKDAYS:
+        if f"on {name}" in lower or f"by {name}" in lower:
+            return _next_weekday(today, idx).isoformat()
+
+    match = _RELATIVE_RE.search(lower)
+    if match:
+        count_raw, unit = match.groups()
+        count = int(count_raw) if count_raw.isdigit() else _NUMBER_WORDS[count_raw]
+        days = count * 7 if unit == "week" else count
+        return (today + timedelta(days=days)).isoformat()
+
+    match = _ISO_DATE_RE.search(text)
+    if match:
+        try:
+            return date(int(match.group(1)), int(match.group(2)), int(match.group(3))).isoformat()
+        except ValueError:
+            pass
+
+    match = _MONTH_DAY_RE.search(text)
+    if match:
+        parsed = _month_day(today, _MONTHS[match.group(1).lower()[:3]], int(match.group(2)))
+        if parsed:
+            return parsed.isoformat()
+    match = _DAY_MONTH_RE.search(text)
+    if match:
+        parsed = _month_day(today, _MONTHS[match.group(2).lower()[:3]], int(match.group(1)))
+        if parsed:
+            return parsed.isoformat()
+
+    return None
+
+
+def apply_priority_keywords(priority: int, text: str) -> int:
+    lower_text = text.lower()
+    if any(token in lower_text for token in HIGH_PRIORITY_TOKENS):
+        return 4
+    if "medium priority" in lower_text:
+        return max(priority, 3)
+    if "low priority" in lower_text:
+        return min(priority, 2)
+    return priority
+
+
+def _extract_amount(text: str) -> str | None:
+    match = _AMOUNT_PREFIX_RE.search(text)
+    if match:
+        currency, number = match.groups()
+        return f"{currency.upper()} {number}" if currency.isalpha() else f"{currency}{number}"
+    match = _AMOUNT_SUFFIX_RE.search(text)
+    if match:
+        number, currency = match.groups()
+        return f"{number} {currency.upper() if len(currency) == 3 else currency}"
+    return None
+
+
+def _vendor_name(raw: str) -> str | None:
+    skip = {name for name, _ in _WEEKDAYS} | {"today", "tomorrow", "eod"}
+    words = [
+        w for w in raw.split()
+        if w.lower().strip(".,") not in skip and not _MONTH_WORD_RE.fullmatch(w.strip(".,"))
+    ]
+    return " ".join(words).rstrip(",") or None
+
+
+def _extract_vendor(text: str) -> str | None:
+    for match in _VENDOR_LABEL_RE.finditer(text):
+        name = _vendor_name(match.group(1) or match.group(2))
+        if name:
+            return name.rstrip(".")
+    match = _VENDOR_COMPANY_RE.search(text)
+    if match:
+        return _vendor_name(match.group(1))
+    return None
+
+
+def _extract_assignee(text: str) -> str | None:
+    match = _SLACK_MENTION_RE.search(text)
+    if match:
+        return match.group(1)
+    match = _HANDLE_MENTION_RE.search(text)
+    if match:
+        return match.group(1)
+    return None
+
+
+def _title_from_text(text: str) -> str:
+    cleaned = _SLACK_MENTION_RE.sub("", text)
+    cleaned = re.sub(r"\s+", " ", cleaned).strip()
+    cleaned = re.sub(r"^(please|pls|hey|hi)[,!\s]+", "", cleaned, flags=re.IGNORECASE)
+    first_sentence = re.split(r"(?<=[.!?])\s", cleaned, maxsplit=1)[0].rstrip(".")
+    title = first_sentence[:80].strip()
+    return title[:1].upper() + title[1:] if title else ""
+
+
+def _required_fields(pipeline: str | None) -> list[str]:
+    for route in CHANNEL_ROUTES.values():
+        if route["pipeline"] == pipeline:
+            return list(route["required_fields"])
+    return []
+
+
+def extract_fields_by_rules(text: str, pipeline: str | None) -> RuleExtraction:
+    amount = _extract_amount(text)
+    vendor = _extract_vendor(text)
+    due_date = infer_due_date(text)
+    assignee = _extract_assignee(text)
+    priority = apply_priority_keywords(3, text)
+    title = _title_from_text(text)
+
+    found = {"amount": amount, "vendor": vendor, "due_date": due_date, "assignee": assignee}
+    matched = [name for name, value in found.items() if value]
+
+    key_details: list[str] = []
+    if amount:
+        key_details.append(f"Amount: {amount}")
+    if vendor:
+        key_details.append(f"Vendor: {vendor}")
+    if due_date:
+        key_details.append(f"Due: {due_date}")
+
+    word_count = len(text.split())
+    confidence = 0.4
+    if word_count <= 30:
+        confidence += 0.2
+    elif word_count <= 60:
+        confidence += 0.1
+    else:
+        confidence -= 0.2
+    if "?" in text:
+        confidence -= 0.2
+    else:
+        confidence += 0.1
+    if not title:
+        confidence -= 0.4
+
+    required = _required_fields(pipeline)
+    if required:
+        mapped = [_REQUIRED_FIELD_MAP.get(name) for name in required]
+        if all(name and found.get(name) for name in mapped):
+            confidence += 0.2
+        else:
+            confidence = min(confidence, 0.4)
+    else:
+        pattern = _PIPELINE_SIGNAL_RE.get(pipeline or "")
+        # General tasks count as specific once they name who should do them.
+        has_signal = bool(pattern.search(text)) if pattern else assignee is not None
+        if has_signal:
+            confidence += 0.1
+        else:
+            confidence = min(confidence, 0.4)
+    if due_date:
+        confidence += 0.1
+    if amount:
+        confidence += 0.05
+    if assignee:
+        confidence += 0.05
+
+    fields = {
+        "title": title,
+        "summary": title,
+        "priority": priority,
+        "due_date": due_date,
+        "labels": [pipeline or "general"],
+        "assignee": assignee,
+        "key_details": key_details,
+    }
+    return RuleExtraction(fields=fields, confidence=round(max(0.0, min(1.0, confidence)), 2), matched=matched)
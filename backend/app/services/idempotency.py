@@ -0,0 +1,161 @@
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db import models
+from app.schemas.inbound import InboundEvent
+
+
+def inbound_key(event: InboundEvent) -> str:
+    text_hash = hashlib.sha256(event.text.encode("utf-8")).hexdigest()
+    parts = [
+        event.source,
+        event.source_channel or "",
+        event.thread_id or "",
+        event.timestamp.isoformat(),
+        text_hash,
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def request_key(event: InboundEvent, header: str | None = None) -> str:
+    if header and header.strip():
+        # Hashed so any caller-supplied value fits the column and cannot collide
+        # with a derived key.
+        return hashlib.sha256(f"header\x1f{header.strip()}".encode("utf-8")).hexdigest()
+    return inbound_key(event)
+
+
+class ResponseCache:
+    def __init__(self, max_size: int, ttl_seconds: float) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, response = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def put(self, key: str, response: dict[str, Any]) -> None:
+        self._entries[key] = (time.monotonic(), response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache = ResponseCache(settings.idempotency_cache_size, settings.idempotency_cache_ttl_seconds)
+_stats = {"cache_hits": 0, "db_hits": 0, "conflicts": 0, "takeovers": 0, "released": 0, "failed": 0}
+
+
+def cached_response(key: str) -> dict[str, Any] | None:
+    response = _cache.get(key)
+    if response is not None:
+        _stats["cache_hits"] += 1
+    return response
+
+
+class InFlightElsewhere(Exception):
+    pass
+
+
+async def claim(
+    session: AsyncSession, key: str, inbox: models.InboxEvent
+) -> tuple[models.InboxEvent, dict[str, Any] | None]:
+    # The unique index on inbox_events.idempotency_key decides which request
+    # (in any worker or replica) does the work.
+    inbox.idempotency_key = key
+    inbox.claimed_at = datetime.now(timezone.utc)
+    session.add(inbox)
+    try:
+        await session.commit()
+        return inbox, None
+    except IntegrityError:
+        await session.rollback()
+
+    existing = (
+        await session.execute(select(models.InboxEvent).where(models.InboxEvent.idempotency_key == key))
+    ).scalar_one_or_none()
+    if existing is None:
+        # The owner released its claim between our insert and lookup.
+        raise InFlightElsewhere(key)
+    if existing.response_json is not None:
+        _stats["db_hits"] += 1
+        _cache.put(key, existing.response_json)
+        return existing, existing.response_json
+
+    # Still unanswered: either in flight in another process, or that process died.
+    stale_before = datetime.now(timezone.utc) - timedelta(seconds=settings.idempotency_inflight_timeout_seconds)
+    result = await session.execute(
+        update(models.InboxEvent)
+        .where(
+            models.InboxEvent.id == existing.id,
+            models.InboxEvent.response_json.is_(None),
+            # Rows claimed before claimed_at existed fall back to created_at.
+            func.coalesce(models.InboxEvent.claimed_at, models.InboxEvent.created_at) < stale_before,
+        )
+        .values(claimed_at=datetime.now(timezone.utc))
+    )
+    await session.commit()
+    if result.rowcount:
+        _stats["takeovers"] += 1
+        await session.refresh(existing)
+        return existing, None
+    _stats["conflicts"] += 1
+    raise InFlightElsewhere(key)
+
+
+async def complete(session: AsyncSession, inbox: models.InboxEvent, response: dict[str, Any]) -> None:
+    inbox.response_json = response
+    await session.commit()
+    if inbox.idempotency_key:
+        _cache.put(inbox.idempotency_key, response)
+
+
+async def release(session: AsyncSession, inbox_id: str) -> None:
+    # Failed before producing a response: drop the claim so a retry can run.
+    await session.rollback()
+    await session.execute(
+        update(models.InboxEvent)
+        .where(models.InboxEvent.id == inbox_id, models.InboxEvent.response_json.is_(None))
+        .values(idempotency_key=None)
+    )
+    await session.commit()
+    _stats["released"] += 1
+
+
+async def fail(session: AsyncSession, inbox_id: str, response: dict[str, Any]) -> None:
+    # Failed after a side effect (Todoist task, Task row, outbound message) went
+    # out: keep the claim and store the failure, so a retry cannot repeat it.
+    await session.rollback()
+    result = await session.execute(
+        update(models.InboxEvent)
+        .where(models.InboxEvent.id == inbox_id, models.InboxEvent.response_json.is_(None))
+        .values(response_json=response)
+        .returning(models.InboxEvent.idempotency_key)
+    )
+    key = result.scalar_one_or_none()
+    await session.commit()
+    if key:
+        _cache.put(key, response)
+    _stats["failed"] += 1
+
+
+def idempotency_stats() -> dict[str, Any]:
+    return dict(_stats, cached=len(_cache))
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.config import settings
+from app.db.session import engine, on_replica
+
+logger = logging.getLogger(__name__)
+
+KB_VERSION_CHANNEL = "kb_version"
+
+Invalidator = Callable[[int], Awaitable[None] | None]
+
+_caches: dict[str, Invalidator] = {}
+_current: int | None = None
+_background: set[asyncio.Task[None]] = set()
+_stats: dict[str, Any] = {
+    "notifications": 0,
+    "polls": 0,
+    "changes": 0,
+    "invalidations": 0,
+    "failures": 0,
+    "listening": False,
+    "changed_at": None,
+}
+
+
+async def bump_version(session: AsyncSession, chunk_count: int) -> int:
+    # Call inside the ingest transaction: the new version and the NOTIFY only
+    # become visible when the KB rows commit with them.
+    version = (
+        await session.execute(
+            text(
+                "UPDATE kb_version SET version = version + 1, chunk_count = :chunk_count, updated_at = NOW() "
+                "WHERE id = 1 RETURNING version"
+            ),
+            {"chunk_count": chunk_count},
+        )
+    ).scalar_one()
+    await session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": KB_VERSION_CHANNEL, "payload": str(version)})
+    return int(version)
+
+
+async def read_version(session: AsyncSession) -> int:
+    result = await session.execute(on_replica(text("SELECT version FROM kb_version WHERE id = 1")))
+    return int(result.scalar() or 0)
+
+
+async def wait_for_version(session: AsyncSession, version: int) -> bool:
+    # Notifications come from the primary; give a replica time to catch up
+    # before rebuilding from it.
+    deadline = time.monotonic() + settings.kb_version_replica_wait_seconds
+    while True:
+        if await read_version(session) >= version:
+            return True
+        await session.rollback()
+        if time.monotonic() >= deadline:
+            logger.warning("KB version not visible yet, rebuilding anyway", extra={"kb_version": version})
+            return False
+        await asyncio.sleep(0.5)
+
+
+def register_cache(name: str, invalidator: Invalidator) -> None:
+    _caches[name] = invalidator
+
+
+def current_version() -> int | None:
+    return _current
+
+
+async def _invalidate(name: str, invalidator: Invalidator, version: int) -> None:
+    try:
+        result = invalidator(version)
+        if inspect.isawaitable(result):
+            await result
+        _stats["invalidations"] += 1
+    except Exception as exc:
+        _stats["failures"] += 1
+        logger.warning("KB cache invalidation failed", extra={"cache": name, "kb_version": version}, exc_info=exc)
+
+
+async def record_baseline(session: AsyncSession) -> int:
+    # Read before the caches are warmed, so a bump during warm-up still counts
+    # as a change when the listener first polls.
+    global _current
+    version = await read_version(session)
+    await session.rollback()
+    if _current is None:
+        _current = version
+    return version
+
+
+def apply_version(version: int) -> bool:
+    global _current
+    if _current is not None and version <= _current:
+        return False
+    # Without a baseline from warm-up we cannot tell what the caches were built
+    # from, so the first observed version invalidates them too.
+    _current = version
+    _stats["changes"] += 1
+    _stats["changed_at"] = datetime.now(timezone.utc).isoformat()
+    logger.info("KB version changed", extra={"kb_version": version, "caches": len(_caches)})
+    for name, invalidator in list(_caches.items()):
+        task = asyncio.create_task(_invalidate(name, invalidator, version))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+    return True
+
+
+async def _poll(conn: AsyncConnection) -> int:
+    _stats["polls"] += 1
+    version = int((await conn.execute(text("SELECT version FROM kb_version WHERE id = 1"))).scalar() or 0)
+    # End the transaction: notifications are only delivered between transactions.
+    await conn.commit()
+    return version
+
+
+async def _listen() -> None:
+    versions: asyncio.Queue[int] = asyncio.Queue()
+
+    def _on_notify(_conn: Any, _pid: int, _channel: str, payload: str) -> None:
+        _stats["notifications"] += 1
+        try:
+            versions.put_nowait(int(payload))
+        except ValueError:
+            logger.warning("Ignoring malformed KB version notification", extra={"payload": payload})
+
+    # Always the primary: NOTIFY is not replicated to standbys.
+    async with engine.connect() as conn:
+        driver = (await conn.get_raw_connection()).driver_connection
+        # PgBouncer in transaction mode cannot hold a LISTEN; poll only.
+        listen = not settings.db_pgbouncer
+        if listen:
+            await driver.add_listener(KB_VERSION_CHANNEL, _on_notify)
+            _stats["listening"] = True
+        try:
+            # Catch up on anything committed while we were not subscribed.
+            apply_version(await _poll(conn))
+            while True:
+                try:
+                    version = await asyncio.wait_for(versions.get(), timeout=settings.kb_version_poll_seconds)
+                except asyncio.TimeoutError:
+                    # Doubles as a liveness check for the listening connection.
+                    version = await _poll(conn)
+                apply_version(version)
+        finally:
+            _stats["listening"] = False
+            if listen:
+                try:
+                    await driver.remove_listener(KB_VERSION_CHANNEL, _on_notify)
+                except Exception:
+                    pass
+
+
+async def kb_version_loop() -> None:
+    while True:
+        try:
+            await _listen()
+        except Exception as exc:
+            logger.warning("KB version listener failed, reconnecting", exc_info=exc)
+        await asyncio.sleep(settings.kb_version_poll_seconds)
+
+
+def start_kb_listener() -> asyncio.Task[None] | None:
+    if not settings.kb_version_listen_enabled:
+        return None
+    return asyncio.create_task(kb_version_loop())
+
+
+async def stop_kb_listener(task: asyncio.Task[None] | None) -> None:
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+def kb_version_stats() -> dict[str, Any]:
+    return dict(_stats, version=_current, caches=sorted(_caches))
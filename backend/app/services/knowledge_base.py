@@ -8,6 +8,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from pgvector.sqlalchemy import Vector
 
 from app.config import settings
+from app.db.session import on_replica
+from app.services.llm_client import get_llm_client
+from app.services.singleflight import get_flight
 
 
 def _mock_vector(text_value: str, dim: int = 1536) -> list[float]:
@@ -25,14 +28,45 @@ async def embed_texts(texts: list[str]) -> list[list[float]]:
     if settings.mock_mode:
         return [_mock_vector(text_value) for text_value in texts]
 
-    from langchain_openai import OpenAIEmbeddings
+    key = (settings.embedding_model, tuple(texts))
+    return await get_flight("embed_texts").do(key, lambda: _embed_texts(texts))
 
-    embeddings = OpenAIEmbeddings(
-        model=settings.embedding_model,
-        openai_api_key=settings.openai_api_key,
-        openai_api_base=settings.openai_base_url,
-    )
-    return await embeddings.aembed_documents(texts)
+
+async def _embed_texts(texts: list[str]) -> list[list[float]]:
+    return await get_llm_client().embed(texts)
+
+
+# Other documents a near-duplicate chunk was collapsed from (kb_chunk_sources),
+# so every version stays citable.
+_SOURCE_DOCS_SELECT = """(
+            SELECT array_agg(DISTINCT sd.title ORDER BY sd.title)
+            FROM kb_chunk_sources s
+            JOIN kb_docs sd ON sd.id = s.doc_id
+            WHERE s.chunk_id = kc.id AND s.doc_id <> kc.doc_id
+        ) AS source_docs"""
+
+# Shared with scripts/bench_query_plans.py, which checks the plans of these statements.
+VECTOR_SEARCH_SQL = f"""
+        SELECT kc.chunk_text, kc.section_ref, kd.title as doc_title, {_SOURCE_DOCS_SELECT},
+               1 - (kc.embedding <=> :embedding) AS similarity
+        FROM kb_chunks kc
+        JOIN kb_docs kd ON kd.id = kc.doc_id
+        ORDER BY kc.embedding <=> :embedding
+        LIMIT :k
+        """
+
+
+def keyword_search_sql(term_count: int) -> str:
+    # One ILIKE per term, bound as :t0, :t1, ...
+    like_clauses = " OR ".join(f"kc.chunk_text ILIKE :t{i}" for i in range(term_count))
+    return f"""
+        SELECT kc.chunk_text, kc.section_ref, kd.title as doc_title, {_SOURCE_DOCS_SELECT},
+               0.0 AS similarity
+        FROM kb_chunks kc
+        JOIN kb_docs kd ON kd.id = kc.doc_id
+        WHERE {like_clauses}
+        LIMIT :k
+        """
 
 
 async def _vector_search(
@@ -42,17 +76,8 @@ async def _vector_search(
     min_similarity: float,
 ) -> list[dict[str, Any]]:
     embedding = (await embed_texts([query]))[0]
-    stmt = text(
-        """
-        SELECT kc.chunk_text, kc.section_ref, kd.title as doc_title,
-               1 - (kc.embedding <=> :embedding) AS similarity
-        FROM kb_chunks kc
-        JOIN kb_docs kd ON kd.id = kc.doc_id
-        ORDER BY kc.embedding <=> :embedding
-        LIMIT :k
-        """
-    ).bindparams(bindparam("embedding", type_=Vector(1536)))
-    result = await session.execute(stmt, {"embedding": embedding, "k": k})
+    stmt = text(VECTOR_SEARCH_SQL).bindparams(bindparam("embedding", type_=Vector(1536)))
+    result = await session.execute(on_replica(stmt), {"embedding": embedding, "k": k})
     chunks: list[dict[str, Any]] = []
     seen: set[str] = set()
     for row in result.fetchall():
@@ -67,6 +92,7 @@ async def _vector_search(
                 "chunk_text": row.chunk_text,
                 "section_ref": row.section_ref,
                 "doc_title": row.doc_title,
+                "source_docs": list(row.source_docs or []),
                 "similarity": similarity,
             }
         )
@@ -77,20 +103,10 @@ async def _keyword_search(session: AsyncSession, query: str, k: int) -> list[dic
     terms = _keywords(query)
     if not terms:
         return []
-    like_clauses = " OR ".join(["kc.chunk_text ILIKE :t" + str(i) for i in range(len(terms))])
     params = {"t" + str(i): f"%{term}%" for i, term in enumerate(terms)}
-    stmt = text(
-        f"""
-        SELECT kc.chunk_text, kc.section_ref, kd.title as doc_title,
-               0.0 AS similarity
-        FROM kb_chunks kc
-        JOIN kb_docs kd ON kd.id = kc.doc_id
-        WHERE {like_clauses}
-        LIMIT :k
-        """
-    )
+    stmt = text(keyword_search_sql(len(terms)))
     params["k"] = k
-    result = await session.execute(stmt, params)
+    result = await session.execute(on_replica(stmt), params)
     chunks: list[dict[str, Any]] = []
     seen: set[str] = set()
     for row in result.fetchall():
@@ -102,6 +118,7 @@ async def _keyword_search(session: AsyncSession, query: str, k: int) -> list[dic
                 "chunk_text": row.chunk_text,
                 "section_ref": row.section_ref,
                 "doc_title": row.doc_title,
+                "source_docs": list(row.source_docs or []),
                 "similarity": 0.0,
             }
         )
@@ -118,3 +135,49 @@ async def retrieve_chunks(
     if chunks:
         return chunks
     return await _keyword_search(session, query, k)
+
+
+def _merge_chunks(
+    vector_chunks: list[dict[str, Any]],
+    keyword_chunks: list[dict[str, Any]],
+    k: int,
+) -> list[dict[str, Any]]:
+    seen: set[str] = set()
+    merged: list[dict[str, Any]] = []
+    for chunk in vector_chunks + keyword_chunks:
+        text_value = chunk.get("chunk_text") or ""
+        if text_value in seen:
+            continue
+        seen.add(text_value)
+        merged.append(chunk)
+        if len(merged) >= k:
+            break
+    return merged
+
+
+async def retrieve_candidates(
+    session: AsyncSession,
+    query: str,
+    k: int = 6,
+    min_similarity: float = 0.05,
+) -> list[dict[str, Any]]:
+    # Same hybrid candidate set rag_agent reranks: vector hits, then keyword hits.
+    vector_chunks = await _vector_search(session, query, k, min_similarity)
+    keyword_chunks = await _keyword_search(session, query, k)
+    return _merge_chunks(vector_chunks, keyword_chunks, k)
+
+
+async def warm_retrieval(session: AsyncSession) -> int:
+    if not settings.mock_mode:
+        get_llm_client().warm()
+    probe = [1.0] + [0.0] * 1535
+    stmt = text(
+        """
+        SELECT kc.id
+        FROM kb_chunks kc
+        ORDER BY kc.embedding <=> :embedding
+        LIMIT 1
+        """
+    ).bindparams(bindparam("embedding", type_=Vector(1536)))
+    result = await session.execute(on_replica(stmt), {"embedding": probe})
+    return len(result.fetchall())
@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import functools
+import json
+import random
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Protocol
+
+import httpx
+
+from app.config import settings
+from app.services.resilience import get_dependency
+
+Message = dict[str, str]
+
+
+class LLMClient(Protocol):
+    async def chat(
+        self,
+        messages: list[Message],
+        *,
+        temperature: float = 0.1,
+        json_mode: bool = False,
+        response_format: dict[str, Any] | None = None,
+    ) -> str: ...
+
+    def stream_chat(self, messages: list[Message], *, temperature: float = 0.1) -> AsyncIterator[str]: ...
+
+    async def embed(self, texts: list[str]) -> list[list[float]]: ...
+
+    def warm(self) -> None: ...
+
+    async def aclose(self) -> None: ...
+
+
+def _response_format(json_mode: bool, response_format: dict[str, Any] | None) -> dict[str, Any] | None:
+    if response_format is not None:
+        return response_format
+    if json_mode:
+        return {"type": "json_object"}
+    return None
+
+
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _retry_after(resp: httpx.Response) -> float | None:
+    value = resp.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class OpenAICompatClient:
+    def __init__(
+        self,
+        api_key: str | None,
+        base_url: str,
+        model: str,
+        embedding_model: str,
+        *,
+        timeout: float = 60.0,
+        embedding_batch_size: int = 256,
+        max_retries: int = 2,
+        retry_base_seconds: float = 0.5,
+        retry_max_seconds: float = 10.0,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.model = model
+        self.embedding_model = embedding_model
+        self.embedding_batch_size = embedding_batch_size
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers={"Authorization": f"Bearer {api_key}"} if api_key else {},
+            timeout=timeout,
+            transport=transport,
+        )
+
+    def _backoff(self, attempt: int, resp: httpx.Response | None = None) -> float | None:
+        delay = _retry_after(resp) if resp is not None else None
+        if delay is not None:
+            # Waiting less than the server asked for would only be rejected again.
+            return delay if delay <= self.retry_max_seconds else None
+        # Full jitter, so callers that failed together do not retry together.
+        return random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * 2**attempt))
+
+    async def _send(self, request: httpx.Request, *, stream: bool = False) -> httpx.Response:
+        # Retries connection errors, 429 and 5xx. Runs inside GuardedClient, so the
+        # breaker records one outcome per call, not one per attempt.
+        attempt = 0
+        while True:
+            delay: float | None
+            try:
+                resp = await self._client.send(request, stream=stream)
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                if resp.is_success:
+                    return resp
+                delay = None
+                if resp.status_code in _RETRY_STATUSES and attempt < self.max_retries:
+                    delay = self._backoff(attempt, resp)
+                await resp.aclose()
+                if delay is None:
+                    resp.raise_for_status()
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _post(self, url: str, payload: dict[str, Any]) -> httpx.Response:
+        return await self._send(self._client.build_request("POST", url, json=payload))
+
+    async def chat(
+        self,
+        messages: list[Message],
+        *,
+        temperature: float = 0.1,
+        json_mode: bool = False,
+        response_format: dict[str, Any] | None = None,
+    ) -> str:
+        payload: dict[str, Any] = {"model": self.model, "messages": messages, "temperature": temperature}
+        fmt = _response_format(json_mode, response_format)
+        if fmt is not None:
+            payload["response_format"] = fmt
+        resp = await self._post("/chat/completions", payload)
+        return resp.json()["choices"][0]["message"].get("content") or ""
+
+    async def stream_chat(self, messages: list[Message], *, temperature: float = 0.1) -> AsyncIterator[str]:
+        payload = {"model": self.model, "messages": messages, "temperature": temperature, "stream": True}
+        # Only opening the stream is retried; once deltas are yielded a retry would repeat them.
+        resp = await self._send(self._client.build_request("POST", "/chat/completions", json=payload), stream=True)
+        try:
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or []
+                delta = choices[0].get("delta", {}).get("content") if choices else None
+                if delta:
+                    yield delta
+        finally:
+            await resp.aclose()
+
+    async def _embed_batch(self, batch: list[str]) -> list[list[float]]:
+        resp = await self._post("/embeddings", {"model": self.embedding_model, "input": batch})
+        data = sorted(resp.json()["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        batches = [
+            texts[start:start + self.embedding_batch_size]
+            for start in range(0, len(texts), self.embedding_batch_size)
+        ]
+        results = await asyncio.gather(*(self._embed_batch(batch) for batch in batches))
+        return [vector for batch in results for vector in batch]
+
+    def warm(self) -> None:
+        return None
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+class LangChainClient:
+    def __init__(
+        self,
+        api_key: str | None,
+        base_url: str,
+        model: str,
+        embedding_model: str,
+        *,
+        http_async_client: httpx.AsyncClient | None = None,
+    ) -> None:
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.embedding_model = embedding_model
+        self.http_async_client = http_async_client
+        self._chat_models: dict[str, Any] = {}
+        self._embeddings: Any = None
+
+    def _chat_model(self, temperature: float, response_format: dict[str, Any] | None) -> Any:
+        key = json.dumps([temperature, response_format], sort_keys=True)
+        if key not in self._chat_models:
+            from langchain_openai import ChatOpenAI
+
+            kwargs: dict[str, Any] = {}
+            if response_format is not None:
+                kwargs["model_kwargs"] = {"response_format": response_format}
+            if self.http_async_client is not None:
+                kwargs["http_async_client"] = self.http_async_client
+            self._chat_models[key] = ChatOpenAI(
+                model=self.model,
+                temperature=temperature,
+                openai_api_key=self.api_key,
+                openai_api_base=self.base_url,
+                **kwargs,
+            )
+        return self._chat_models[key]
+
+    async def chat(
+        self,
+        messages: list[Message],
+        *,
+        temperature: float = 0.1,
+        json_mode: bool = False,
+        response_format: dict[str, Any] | None = None,
+    ) -> str:
+        llm = self._chat_model(temperature, _response_format(json_mode, response_format))
+        response = await llm.ainvoke(messages)
+        return response.content or ""
+
+    async def stream_chat(self, messages: list[Message], *, temperature: float = 0.1) -> AsyncIterator[str]:
+        async for chunk in self._chat_model(temperature, None).astream(messages):
+            if chunk.content:
+                yield chunk.content
+
+    def _embeddings_model(self) -> Any:
+        if self._embeddings is None:
+            from langchain_openai import OpenAIEmbeddings
+
+            kwargs: dict[str, Any] = {}
+            if self.http_async_client is not None:
+                kwargs["http_async_client"] = self.http_async_client
+            self._embeddings = OpenAIEmbeddings(
+                model=self.embedding_model,
+                openai_api_key=self.api_key,
+                openai_api_base=self.base_url,
+                **kwargs,
+            )
+        return self._embeddings
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        return await self._embeddings_model().aembed_documents(texts)
+
+    def warm(self) -> None:
+        self._chat_model(0.1, None)
+        self._chat_model(0.0, {"type": "json_object"})
+        self._embeddings_model()
+
+    async def aclose(self) -> None:
+        if self.http_async_client is not None:
+            await self.http_async_client.aclose()
+
+
+class GuardedClient:
+    # Routes every upstream call through the dependency's bulkhead and breaker.
+    def __init__(self, inner: LLMClient, dependency: str) -> None:
+        self.inner = inner
+        self.dependency = get_dependency(dependency)
+
+    async def chat(self, messages: list[Message], **kwargs: Any) -> str:
+        async with self.dependency.guard():
+            return await self.inner.chat(messages, **kwargs)
+
+    async def stream_chat(self, messages: list[Message], *, temperature: float = 0.1) -> AsyncIterator[str]:
+        async with self.dependency.guard():
+            async for delta in self.inner.stream_chat(messages, temperature=temperature):
+                yield delta
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        async with self.dependency.guard():
+            return await self.inner.embed(texts)
+
+    def warm(self) -> None:
+        self.inner.warm()
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+@functools.lru_cache(maxsize=None)
+def get_llm_client() -> LLMClient:
+    client: LLMClient
+    if settings.llm_backend == "langchain":
+        client = LangChainClient(
+            settings.openai_api_key,
+            settings.openai_base_url,
+            settings.openai_model,
+            settings.embedding_model,
+        )
+    else:
+        client = OpenAICompatClient(
+            settings.openai_api_key,
+            settings.openai_base_url,
+            settings.openai_model,
+            settings.embedding_model,
+            timeout=settings.llm_timeout,
+            embedding_batch_size=settings.embedding_batch_size,
+            max_retries=settings.llm_max_retries,
+            retry_base_seconds=settings.llm_retry_base_seconds,
+            retry_max_seconds=settings.llm_retry_max_seconds,
+        )
+    return GuardedClient(client, "openai")
+
+
+async def close_llm_client() -> None:
+    if get_llm_client.cache_info().currsize:
+        await get_llm_client().aclose()
+        get_llm_client.cache_clear()
@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
 from app.services.audit import log_action
+from app.services.resilience import Overloaded, get_dependency
 
 logger = logging.getLogger(__name__)
 
@@ -16,9 +17,11 @@ async def post_outbound(payload: dict[str, Any], session: AsyncSession | None =
         return
     async with httpx.AsyncClient(timeout=10) as client:
         try:
-            logger.info("Outbound payload", extra={"payload": payload})
-            resp = await client.post(settings.n8n_outbound_webhook_url, json=payload)
-            resp.raise_for_status()
+            logger.info("Outbound message", extra={"action": payload.get("action"), "channel": payload.get("channel")})
+            logger.debug("Outbound payload", extra={"payload": payload})
+            async with get_dependency("n8n").guard():
+                resp = await client.post(settings.n8n_outbound_webhook_url, json=payload)
+                resp.raise_for_status()
             if session is not None:
                 await log_action(
                     session,
@@ -26,6 +29,9 @@ async def post_outbound(payload: dict[str, Any], session: AsyncSession | None =
                     action="outbound_sent",
                     details={"action": payload.get("action"), "channel": payload.get("channel")},
                 )
+        except Overloaded as exc:
+            logger.warning("Outbound message shed", extra={"reason": str(exc), "action": payload.get("action")})
+            return
         except Exception as exc:
             logger.exception("Failed to post outbound message", exc_info=exc)
             return
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import hashlib
+import random
+import re
+from collections import defaultdict
+from typing import Any
+
+_WORD_RE = re.compile(r"\w+")
+_MERSENNE_61 = (1 << 61) - 1
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_61), _rng.randrange(0, _MERSENNE_61)) for _ in range(NUM_PERM)]
+
+
+def _shingles(text: str, size: int = 3) -> set[str]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[idx:idx + size]) for idx in range(len(words) - size + 1)}
+
+
+def minhash(text: str) -> tuple[int, ...]:
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for shingle in _shingles(text)
+    ]
+    if not hashes:
+        return tuple([_MERSENNE_61] * NUM_PERM)
+    return tuple(min((a * value + b) % _MERSENNE_61 for value in hashes) for a, b in _PERMUTATIONS)
+
+
+def estimate_jaccard(left: tuple[int, ...], right: tuple[int, ...]) -> float:
+    return sum(1 for a, b in zip(left, right) if a == b) / NUM_PERM
+
+
+# MinHash LSH: signatures sharing any band are candidates, the estimated
+# Jaccard similarity decides whether a candidate is a near duplicate.
+class NearDupIndex:
+    def __init__(self, threshold: float) -> None:
+        self.threshold = threshold
+        self._buckets: dict[tuple[int, tuple[int, ...]], list[int]] = defaultdict(list)
+        self._entries: list[tuple[tuple[int, ...], Any]] = []
+
+    def _bands(self, signature: tuple[int, ...]) -> list[tuple[int, tuple[int, ...]]]:
+        return [(band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+    def match(self, signature: tuple[int, ...]) -> tuple[Any, float] | None:
+        best: tuple[Any, float] | None = None
+        seen: set[int] = set()
+        for bucket in self._bands(signature):
+            for entry_id in self._buckets.get(bucket, []):
+                if entry_id in seen:
+                    continue
+                seen.add(entry_id)
+                other, value = self._entries[entry_id]
+                score = estimate_jaccard(signature, other)
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (value, score)
+        return best
+
+    def add(self, signature: tuple[int, ...], value: Any) -> None:
+        entry_id = len(self._entries)
+        self._entries.append((signature, value))
+        for bucket in self._bands(signature):
+            self._buckets[bucket].append(entry_id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,13 +1,30 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 from typing import Any
 
 import httpx
 
 from app.config import settings
+from app.db.session import AsyncSessionLocal
+from app.services import rag_engine
+from app.services.resilience import Overloaded, get_dependency
+from app.services.singleflight import get_flight, normalize_key
 
+logger = logging.getLogger(__name__)
 
-async def answer_with_confidence(query: str, _: list[dict[str, Any]]) -> dict[str, Any]:
+
+async def answer_with_confidence(query: str, chunks: list[dict[str, Any]]) -> dict[str, Any]:
+    return await get_flight("answer_with_confidence").do(
+        normalize_key(query),
+        lambda: _answer_with_confidence(query, chunks),
+    )
+
+
+async def _answer_with_confidence(query: str, _: list[dict[str, Any]]) -> dict[str, Any]:
+    if settings.rag_mode == "inprocess":
+        return await _answer_in_process(query)
     if not settings.rag_agent_url:
         return {
             "answer": "RAG service unavailable. Please configure RAG_AGENT_URL.",
@@ -16,7 +33,7 @@ async def answer_with_confidence(query: str, _: list[dict[str, Any]]) -> dict[st
         }
 
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
+        async with get_dependency("rag_agent").guard(), httpx.AsyncClient(timeout=settings.rag_agent_timeout) as client:
             resp = await client.post(settings.rag_agent_url, json={"query": query})
             resp.raise_for_status()
             data = resp.json()
@@ -25,9 +42,85 @@ async def answer_with_confidence(query: str, _: list[dict[str, Any]]) -> dict[st
                 "citations": data.get("citations", []),
                 "confidence": float(data.get("confidence", 0.0)),
             }
+    except Overloaded:
+        raise
     except Exception:
         return {
             "answer": "RAG service unavailable. Please try again later.",
             "citations": [],
             "confidence": 0.0,
         }
+
+
+async def _answer_in_process(query: str) -> dict[str, Any]:
+    try:
+        async with AsyncSessionLocal() as session:
+            chunks = await rag_engine.retrieve(session, query)
+        return await rag_engine.build_answer(query, chunks)
+    except Overloaded:
+        raise
+    except Exception as exc:
+        logger.warning("In-process RAG answer failed", exc_info=exc)
+        return {
+            "answer": "RAG service unavailable. Please try again later.",
+            "citations": [],
+            "confidence": 0.0,
+        }
+
+
+async def _answer_batch_in_process(queries: list[str]) -> list[dict[str, Any]]:
+    try:
+        async with AsyncSessionLocal() as session:
+            chunk_groups = await rag_engine.retrieve_batch(session, queries)
+    except Overloaded:
+        raise
+    except Exception as exc:
+        logger.warning("In-process RAG retrieval failed", exc_info=exc)
+        return [{"error": "RAG service unavailable. Please try again later."} for _ in queries]
+
+    semaphore = asyncio.Semaphore(settings.rag_batch_concurrency)
+
+    async def _run(query: str, chunks: list[dict[str, Any]]) -> dict[str, Any]:
+        async with semaphore:
+            try:
+                return await rag_engine.build_answer(query, chunks)
+            except Exception as exc:
+                return {"error": str(exc) or exc.__class__.__name__}
+
+    return list(await asyncio.gather(*(_run(query, chunks) for query, chunks in zip(queries, chunk_groups))))
+
+
+def _batch_url(url: str) -> str:
+    return url.rstrip("/") + "/batch"
+
+
+async def answer_batch_with_confidence(queries: list[str]) -> list[dict[str, Any]]:
+    if settings.rag_mode == "inprocess":
+        return await _answer_batch_in_process(queries)
+    if not settings.rag_agent_url:
+        return [{"error": "RAG service unavailable. Please configure RAG_AGENT_URL."} for _ in queries]
+
+    try:
+        async with get_dependency("rag_agent").guard(), httpx.AsyncClient(timeout=settings.rag_agent_batch_timeout) as client:
+            resp = await client.post(_batch_url(settings.rag_agent_url), json={"queries": queries})
+            resp.raise_for_status()
+            results = resp.json().get("results", [])
+    except Overloaded:
+        raise
+    except Exception:
+        return [{"error": "RAG service unavailable. Please try again later."} for _ in queries]
+
+    answers: list[dict[str, Any]] = []
+    for idx in range(len(queries)):
+        data = results[idx] if idx < len(results) else {"error": "Missing result from RAG service."}
+        if data.get("error"):
+            answers.append({"error": data["error"]})
+            continue
+        answers.append(
+            {
+                "answer": data.get("answer") or "",
+                "citations": data.get("citations", []),
+                "confidence": float(data.get("confidence", 0.0)),
+            }
+        )
+    return answers
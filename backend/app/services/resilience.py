@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    def __init__(self, dependency: str, reason: str, retry_after: float) -> None:
+        super().__init__(f"{dependency}: {reason}")
+        self.dependency = dependency
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _is_failure(exc: BaseException) -> bool:
+    # Client errors mean the upstream is healthy and rejected our request.
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500 and status != 429:
+        return False
+    return True
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float,
+        min_calls: int,
+        window_seconds: float,
+        open_seconds: float,
+        half_open_probes: int,
+    ) -> None:
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = "closed"
+        self.times_opened = 0
+        self._results: deque[tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    def _prune(self, now: float) -> None:
+        while self._results and now - self._results[0][0] > self.window_seconds:
+            self._results.popleft()
+
+    def _open(self, now: float) -> None:
+        self.state = "open"
+        self.times_opened += 1
+        self._opened_at = now
+        self._results.clear()
+        logger.warning("Circuit opened", extra={"dependency": self.name})
+
+    def check(self) -> None:
+        if self.state == "open":
+            remaining = self.open_seconds - (time.monotonic() - self._opened_at)
+            if remaining > 0:
+                raise Overloaded(self.name, "circuit open", remaining)
+
+    def before_call(self) -> bool:
+        # Returns whether this call is a half-open probe.
+        self.check()
+        if self.state == "open":
+            self.state = "half_open"
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        if self.state == "half_open":
+            if self._probes_in_flight >= self.half_open_probes:
+                raise Overloaded(self.name, "circuit half-open", self.open_seconds)
+            self._probes_in_flight += 1
+            return True
+        return False
+
+    def record(self, ok: bool, probe: bool) -> None:
+        now = time.monotonic()
+        if probe:
+            if self.state != "half_open":
+                return
+            self._probes_in_flight -= 1
+            if not ok:
+                self._open(now)
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_probes:
+                self.state = "closed"
+                logger.info("Circuit closed", extra={"dependency": self.name})
+            return
+        if self.state != "closed":
+            # Finished after the breaker tripped; probes decide what happens next.
+            return
+        self._results.append((now, ok))
+        self._prune(now)
+        failures = sum(1 for _, result_ok in self._results if not result_ok)
+        if len(self._results) >= self.min_calls and failures / len(self._results) >= self.failure_rate:
+            self._open(now)
+
+    def stats(self) -> dict[str, Any]:
+        self._prune(time.monotonic())
+        calls = len(self._results)
+        failures = sum(1 for _, ok in self._results if not ok)
+        return {
+            "state": self.state,
+            "times_opened": self.times_opened,
+            "window_calls": calls,
+            "window_failure_rate": round(failures / calls, 3) if calls else 0.0,
+        }
+
+
+class Bulkhead:
+    def __init__(self, name: str, max_concurrent: int, max_queue: int) -> None:
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.name, "too many queued calls", settings.shed_retry_after_seconds)
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+        }
+
+
+class Dependency:
+    def __init__(self, name: str, bulkhead: Bulkhead, breaker: CircuitBreaker) -> None:
+        self.name = name
+        self.bulkhead = bulkhead
+        self.breaker = breaker
+        self.calls = 0
+        self.failures = 0
+        self.shed = 0
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        try:
+            # Fail fast before queueing behind a dependency that is known to be down.
+            self.breaker.check()
+            async with self.bulkhead.slot():
+                probe = self.breaker.before_call()
+                self.calls += 1
+                ok = False
+                try:
+                    yield
+                    ok = True
+                except Exception as exc:
+                    ok = not _is_failure(exc)
+                    raise
+                finally:
+                    if not ok:
+                        self.failures += 1
+                    self.breaker.record(ok, probe)
+        except Overloaded as exc:
+            if exc.dependency == self.name:
+                self.shed += 1
+            raise
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "shed": self.shed,
+            "breaker": self.breaker.stats(),
+            "bulkhead": self.bulkhead.stats(),
+        }
+
+
+_dependencies: dict[str, Dependency] = {}
+
+
+def get_dependency(name: str) -> Dependency:
+    dependency = _dependencies.get(name)
+    if dependency is None:
+        dependency = _dependencies[name] = Dependency(
+            name,
+            Bulkhead(
+                name,
+                settings.dependency_concurrency.get(name, settings.dependency_default_concurrency),
+                settings.dependency_max_queue,
+            ),
+            CircuitBreaker(
+                name,
+                failure_rate=settings.breaker_failure_rate,
+                min_calls=settings.breaker_min_calls,
+                window_seconds=settings.breaker_window_seconds,
+                open_seconds=settings.breaker_open_seconds,
+                half_open_probes=settings.breaker_half_open_probes,
+            ),
+        )
+    return dependency
+
+
+def dependency_stats() -> dict[str, dict[str, Any]]:
+    return {name: dependency.stats() for name, dependency in _dependencies.items()}
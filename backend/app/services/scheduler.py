@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import os
+import random
+import socket
+from collections import defaultdict
+from datetime import date, datetime, time, timezone
+from typing import Any
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.db import models
+from app.db.session import AsyncSessionLocal, engine, on_replica
+from app.services.enforcement import candidate_tasks_query, check_high_priority_tasks, run_reminders, send_reminders
+from app.services.todoist_client import TodoistClient
+
+logger = logging.getLogger(__name__)
+
+# Local start hour of each enforcement window; a window lasts until the next one starts.
+WINDOWS: list[tuple[str, int]] = [("reminder_16", 16), ("escalation_18", 18), ("escalation_20", 20)]
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+@functools.lru_cache(maxsize=None)
+def _local_timezone() -> str:
+    # The server's own zone, which the cron endpoint used before the setting existed.
+    name = os.environ.get("TZ", "").lstrip(":")
+    if not name and os.path.islink("/etc/localtime"):
+        target = os.path.realpath("/etc/localtime")
+        if "/zoneinfo/" in target:
+            name = target.split("/zoneinfo/", 1)[1]
+    try:
+        ZoneInfo(name)
+    except (ValueError, ZoneInfoNotFoundError):
+        logger.warning("Cannot determine the local timezone, using UTC", extra={"tz": name})
+        return "UTC"
+    return name
+
+
+def default_timezone() -> str:
+    return settings.enforcement_timezone or _local_timezone()
+
+
+def timezone_groups() -> dict[str, list[str]]:
+    groups: dict[str, list[str]] = defaultdict(list)
+    for assignee, tz_name in settings.enforcement_assignee_timezones.items():
+        groups[tz_name].append(assignee)
+    groups.setdefault(default_timezone(), [])
+    return dict(groups)
+
+
+def current_window(now: datetime, tz: ZoneInfo) -> tuple[str, date] | None:
+    local = now.astimezone(tz)
+    check_type = None
+    for name, hour in WINDOWS:
+        if local.hour >= hour:
+            check_type = name
+    return (check_type, local.date()) if check_type else None
+
+
+def _spread_seconds_left(check_type: str, run_date: date, tz: ZoneInfo) -> float:
+    hour = dict(WINDOWS)[check_type]
+    window_start = datetime.combine(run_date, time(hour), tzinfo=tz)
+    elapsed = (datetime.now(timezone.utc) - window_start).total_seconds()
+    return min(settings.enforcement_spread_seconds, max(0.0, settings.enforcement_spread_seconds - elapsed))
+
+
+def _assignee_scope(tz_name: str, assignees: list[str]) -> dict[str, list[str] | None]:
+    # Assignees without an explicit timezone belong to the default group.
+    if tz_name == default_timezone():
+        others = [a for a, tz in settings.enforcement_assignee_timezones.items() if tz != tz_name]
+        return {"only_assignees": None, "skip_assignees": others}
+    return {"only_assignees": assignees, "skip_assignees": None}
+
+
+async def _claim_run(session: Any, check_type: str, tz_name: str, run_date: date) -> models.EnforcementRun | None:
+    await session.execute(
+        insert(models.EnforcementRun)
+        .values(check_type=check_type, timezone=tz_name, run_date=run_date, status="pending", owner=OWNER)
+        .on_conflict_do_nothing(index_elements=["check_type", "timezone", "run_date"])
+    )
+    run = (
+        await session.execute(
+            select(models.EnforcementRun).where(
+                models.EnforcementRun.check_type == check_type,
+                models.EnforcementRun.timezone == tz_name,
+                models.EnforcementRun.run_date == run_date,
+            )
+        )
+    ).scalar_one()
+    if run.status == "done":
+        await session.commit()
+        return None
+    run.status = "running"
+    run.owner = OWNER
+    run.started_at = datetime.now(timezone.utc)
+    await session.commit()
+    return run
+
+
+async def run_window(
+    todoist_client: Any,
+    check_type: str,
+    tz_name: str,
+    run_date: date,
+    assignees: list[str],
+) -> str:
+    lock_key = f"enforcement:{check_type}:{tz_name}:{run_date.isoformat()}"
+    async with engine.connect() as lock_conn:
+        # Session-level lock on a dedicated connection: held for the whole run,
+        # released on unlock or when the connection drops.
+        locked = (
+            await lock_conn.execute(text("SELECT pg_try_advisory_lock(hashtextextended(:key, 0))"), {"key": lock_key})
+        ).scalar()
+        await lock_conn.commit()
+        if not locked:
+            return "busy"
+        try:
+            async with AsyncSessionLocal() as session:
+                run = await _claim_run(session, check_type, tz_name, run_date)
+                if run is None:
+                    return "already_done"
+                tz = ZoneInfo(tz_name)
+                scope = _assignee_scope(tz_name, assignees)
+                remaining_query = candidate_tasks_query(datetime.now(tz).date(), **scope)
+                if run.last_task_id is not None:
+                    remaining_query = remaining_query.where(models.Task.id > run.last_task_id)
+                remaining = (
+                    await session.execute(
+                        on_replica(select(func.count()).select_from(remaining_query.subquery()))
+                    )
+                ).scalar_one()
+                # Spread the Todoist calls still to make over what is left of the
+                # spread period, so a resumed or late run still finishes on time.
+                spread_left = _spread_seconds_left(check_type, run_date, tz)
+                pace = spread_left / remaining if remaining > 1 else 0.0
+                if run.last_task_id is not None:
+                    logger.info(
+                        "Resuming enforcement window",
+                        extra={"check_type": check_type, "timezone": tz_name, "checked": run.checked},
+                    )
+                try:
+                    await check_high_priority_tasks(
+                        session, todoist_client, check_type, tz=tz, pace_seconds=pace, run=run, **scope
+                    )
+                    reminders = await run_reminders(session, run.id)
+                    await send_reminders(session, reminders)
+                except Exception:
+                    run.status = "failed"
+                    await session.commit()
+                    raise
+                run.status = "done"
+                run.finished_at = datetime.now(timezone.utc)
+                await session.commit()
+                logger.info(
+                    "Enforcement window complete",
+                    extra={"check_type": check_type, "timezone": tz_name, "checked": run.checked, "reminders": run.reminders},
+                )
+                return "done"
+        finally:
+            await lock_conn.execute(text("SELECT pg_advisory_unlock(hashtextextended(:key, 0))"), {"key": lock_key})
+            await lock_conn.commit()
+
+
+async def _tick(todoist_client: Any, finished: set[tuple[str, str, date]]) -> None:
+    now = datetime.now(timezone.utc)
+    finished.difference_update({key for key in finished if (now.date() - key[2]).days > 1})
+    jobs: list[tuple[tuple[str, str, date], Any]] = []
+    for tz_name, assignees in timezone_groups().items():
+        window = current_window(now, ZoneInfo(tz_name))
+        if window is None:
+            continue
+        run_key = (window[0], tz_name, window[1])
+        if run_key in finished:
+            continue
+        jobs.append((run_key, run_window(todoist_client, window[0], tz_name, window[1], assignees)))
+    if not jobs:
+        return
+    results = await asyncio.gather(*(job for _, job in jobs), return_exceptions=True)
+    for (run_key, _), result in zip(jobs, results):
+        if isinstance(result, Exception):
+            logger.warning("Enforcement window failed", exc_info=result, extra={"run": list(map(str, run_key))})
+        elif result in {"done", "already_done"}:
+            finished.add(run_key)
+
+
+async def scheduler_loop() -> None:
+    todoist_client = TodoistClient(settings.todoist_api_token)
+    finished: set[tuple[str, str, date]] = set()
+    # Desynchronise replicas that start together.
+    await asyncio.sleep(random.uniform(0, settings.enforcement_tick_seconds))
+    while True:
+        try:
+            await _tick(todoist_client, finished)
+        except Exception as exc:
+            logger.warning("Enforcement scheduler tick failed", exc_info=exc)
+        await asyncio.sleep(settings.enforcement_tick_seconds)
+
+
+def start_scheduler() -> asyncio.Task[None] | None:
+    if not settings.enforcement_scheduler_enabled:
+        return None
+    if not settings.todoist_api_token:
+        logger.warning("Enforcement scheduler disabled: TODOIST_API_TOKEN not configured")
+        return None
+    return asyncio.create_task(scheduler_loop())
+
+
+async def stop_scheduler(task: asyncio.Task[None] | None) -> None:
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
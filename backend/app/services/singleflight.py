@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import asyncio
+import re
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_key(text: str, *, casefold: bool = True) -> str:
+    value = _WHITESPACE_RE.sub(" ", text).strip()
+    return value.casefold() if casefold else value
+
+
+class SingleFlight:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Future[Any]] = {}
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.executed += 1
+        future = asyncio.ensure_future(fn())
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so a cancelled caller does not cancel the work other callers await.
+        return await asyncio.shield(future)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+        }
+
+
+_flights: dict[str, SingleFlight] = {}
+
+
+def get_flight(name: str) -> SingleFlight:
+    flight = _flights.get(name)
+    if flight is None:
+        flight = _flights[name] = SingleFlight(name)
+    return flight
+
+
+def flight_stats() -> dict[str, dict[str, Any]]:
+    return {name: flight.stats() for name, flight in _flights.items()}
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Callable
+
+from app.services.context_builder import count_tokens
+
+_ATX_RE = re.compile(r"^(#{1,6})\s+\S")
+_SECTION_RE = re.compile(r"^§\s*(\d+(?:\.\d+)*)")
+_LIST_RE = re.compile(r"^\s*(?:[-*+•]|\d+[.)])\s+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?;:])\s+")
+
+
+class ParserUnavailable(Exception):
+    pass
+
+
+@dataclass
+class Block:
+    kind: str  # heading | paragraph | list | table | code
+    text: str
+    level: int = 0
+
+
+@dataclass
+class ParsedChunk:
+    body: str
+    section_ref: str | None
+    section_path: str | None
+
+
+@dataclass
+class ParsedDoc:
+    path: str
+    title: str
+    content_text: str
+    chunks: list[ParsedChunk]
+
+
+# A parser returns the document's plain text (stored on kb_docs) and its blocks.
+Parser = Callable[[Path], tuple[str, list[Block]]]
+
+
+def _heading_level(line: str) -> int | None:
+    match = _ATX_RE.match(line)
+    if match:
+        return len(match.group(1))
+    match = _SECTION_RE.match(line)
+    if match:
+        # §2 sits at ## level and §2.1 nests under it.
+        return 2 + match.group(1).count(".")
+    return None
+
+
+def _append(blocks: list[Block], kind: str, text: str) -> None:
+    text = text.strip()
+    if not text:
+        return
+    if kind in {"list", "table"} and blocks and blocks[-1].kind == kind:
+        blocks[-1].text += "\n" + text
+        return
+    blocks.append(Block(kind, text))
+
+
+def parse_markdown_text(text: str) -> list[Block]:
+    blocks: list[Block] = []
+    buffer: list[str] = []
+    kind: str | None = None
+
+    def flush() -> None:
+        nonlocal buffer, kind
+        if buffer:
+            blocks.append(Block(kind or "paragraph", "\n".join(buffer).strip()))
+        buffer = []
+        kind = None
+
+    for raw in text.splitlines():
+        line = raw.rstrip()
+        stripped = line.strip()
+        if kind == "code":
+            buffer.append(line)
+            if stripped.startswith("```"):
+                flush()
+            continue
+        if stripped.startswith("```"):
+            flush()
+            kind = "code"
+            buffer.append(line)
+            continue
+        if not stripped:
+            flush()
+            continue
+        level = _heading_level(stripped)
+        if level is not None:
+            flush()
+            blocks.append(Block("heading", stripped, level))
+            continue
+        if stripped.startswith("|"):
+            line_kind = "table"
+        elif _LIST_RE.match(line) or (kind == "list" and line[:1].isspace()):
+            line_kind = "list"
+        else:
+            line_kind = "paragraph"
+        if kind is not None and line_kind != kind:
+            flush()
+        kind = line_kind
+        buffer.append(line)
+    flush()
+    return blocks
+
+
+def parse_markdown(path: Path) -> tuple[str, list[Block]]:
+    text = path.read_text(encoding="utf-8", errors="replace")
+    return text, parse_markdown_text(text)
+
+
+class _HTMLBlocks(HTMLParser):
+    _HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+    _BREAKS = {"p", "div", "section", "article", "blockquote", "pre", "ul", "ol", "table", "body"}
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.blocks: list[Block] = []
+        self._text: list[str] = []
+        self._skip = 0
+        self._cells: list[str] | None = None
+
+    def _take(self) -> str:
+        text = re.sub(r"[ \t\r\f\v]+", " ", "".join(self._text)).strip()
+        self._text = []
+        return text
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if tag in {"script", "style", "noscript"}:
+            self._skip += 1
+        elif tag in self._HEADINGS or tag in self._BREAKS or tag == "li":
+            _append(self.blocks, "paragraph", self._take())
+        elif tag == "tr":
+            self._cells = []
+        elif tag in {"td", "th"}:
+            self._take()
+        elif tag == "br":
+            self._text.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in {"script", "style", "noscript"}:
+            self._skip = max(0, self._skip - 1)
+        elif tag in self._HEADINGS:
+            text = self._take()
+            if text:
+                self.blocks.append(Block("heading", text, self._HEADINGS[tag]))
+        elif tag == "li":
+            _append(self.blocks, "list", f"- {self._take()}")
+        elif tag in {"td", "th"} and self._cells is not None:
+            self._cells.append(self._take())
+        elif tag == "tr" and self._cells is not None:
+            _append(self.blocks, "table", " | ".join(cell for cell in self._cells if cell))
+            self._cells = None
+        elif tag in self._BREAKS:
+            _append(self.blocks, "paragraph", self._take())
+
+    def handle_data(self, data: str) -> None:
+        if not self._skip:
+            self._text.append(data)
+
+    def close(self) -> None:
+        super().close()
+        _append(self.blocks, "paragraph", self._take())
+
+
+def parse_html(path: Path) -> tuple[str, list[Block]]:
+    parser = _HTMLBlocks()
+    parser.feed(path.read_text(encoding="utf-8", errors="replace"))
+    parser.close()
+    return "\n\n".join(block.text for block in parser.blocks), parser.blocks
+
+
+def parse_docx(path: Path) -> tuple[str, list[Block]]:
+    try:
+        import docx
+        from docx.table import Table
+        from docx.text.paragraph import Paragraph
+    except ImportError:
+        raise ParserUnavailable("python-docx is not installed")
+    document = docx.Document(str(path))
+    blocks: list[Block] = []
+    for element in document.element.body.iterchildren():
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag == "tbl":
+            for row in Table(element, document).rows:
+                _append(blocks, "table", " | ".join(cell.text.strip() for cell in row.cells if cell.text.strip()))
+            continue
+        if tag != "p":
+            continue
+        paragraph = Paragraph(element, document)
+        text = paragraph.text.strip()
+        if not text:
+            continue
+        style = paragraph.style.name if paragraph.style is not None else ""
+        if style == "Title":
+            # Above Heading 1, so the document title heads every section path.
+            blocks.append(Block("heading", text, 0))
+        elif style.startswith("Heading"):
+            suffix = style.split()[-1]
+            blocks.append(Block("heading", text, int(suffix) if suffix.isdigit() else 1))
+        elif "List" in style:
+            _append(blocks, "list", f"- {text}")
+        else:
+            _append(blocks, "paragraph", text)
+    return "\n\n".join(block.text for block in blocks), blocks
+
+
+def parse_pdf(path: Path) -> tuple[str, list[Block]]:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ParserUnavailable("pypdf is not installed")
+    text = "\n\n".join((page.extract_text() or "").strip() for page in PdfReader(str(path)).pages)
+    # PDFs carry no structure markup; pick up §/# headings and lists from the text.
+    return text, parse_markdown_text(text)
+
+
+_parsers: dict[str, Parser] = {}
+
+
+def register_parser(extensions: tuple[str, ...], parser: Parser) -> None:
+    # Ingest workers are spawned and only import this module, so parsers used
+    # by ingest_sops must be registered here (or in a module imported here).
+    _parsers.update({extension.lower(): parser for extension in extensions})
+
+
+register_parser((".md", ".markdown", ".txt"), parse_markdown)
+register_parser((".html", ".htm"), parse_html)
+register_parser((".docx",), parse_docx)
+register_parser((".pdf",), parse_pdf)
+
+
+def supported_extensions() -> set[str]:
+    return set(_parsers)
+
+
+def _split_words(text: str, max_tokens: int) -> list[str]:
+    words = text.split()
+    per_piece = max(1, len(words) * max_tokens // max(count_tokens(text), 1))
+    return [" ".join(words[start:start + per_piece]) for start in range(0, len(words), per_piece)]
+
+
+def _split_block(block: Block, max_tokens: int) -> list[str]:
+    if count_tokens(block.text) <= max_tokens:
+        return [block.text]
+    header = ""
+    if block.kind in {"list", "code"}:
+        units = block.text.splitlines()
+    elif block.kind == "table":
+        # Repeat the header row so every piece of a long table stays readable.
+        header, *units = block.text.splitlines()
+    else:
+        units = [unit for unit in _SENTENCE_RE.split(block.text) if unit.strip()]
+    budget = max_tokens - (count_tokens(header) if header else 0)
+    joiner = " " if block.kind == "paragraph" else "\n"
+
+    pieces: list[str] = []
+    current: list[str] = []
+    used = 0
+    for unit in units:
+        cost = count_tokens(unit)
+        if cost > budget:
+            subunits = _split_words(unit, budget)
+        else:
+            subunits = [unit]
+        for subunit in subunits:
+            cost = count_tokens(subunit)
+            if current and used + cost > budget:
+                pieces.append(joiner.join(current))
+                current, used = [], 0
+            current.append(subunit)
+            used += cost
+    if current:
+        pieces.append(joiner.join(current))
+    return [f"{header}\n{piece}" if header else piece for piece in pieces]
+
+
+def _heading_name(text: str) -> str:
+    return text.lstrip("#").strip()
+
+
+def chunk_blocks(blocks: list[Block], max_tokens: int) -> list[ParsedChunk]:
+    chunks: list[ParsedChunk] = []
+    stack: list[tuple[int, str]] = []
+    parts: list[str] = []
+    used = 0
+
+    def flush() -> None:
+        nonlocal parts, used
+        if parts:
+            section_ref = stack[-1][1][:100] if stack else None
+            section_path = " > ".join(_heading_name(heading) for _, heading in stack) or None
+            chunks.append(ParsedChunk("\n".join(parts), section_ref, section_path))
+        parts, used = [], 0
+
+    for block in blocks:
+        if block.kind == "heading":
+            # Chunks never span headings.
+            flush()
+            while stack and stack[-1][0] >= block.level:
+                stack.pop()
+            stack.append((block.level, block.text))
+            continue
+        for piece in _split_block(block, max_tokens):
+            cost = count_tokens(piece)
+            if parts and used + cost > max_tokens:
+                flush()
+            parts.append(piece)
+            used += cost
+    flush()
+    return chunks
+
+
+def parse_document(path: str, max_tokens: int) -> ParsedDoc:
+    # Entry point for ingest worker processes: plain arguments in, picklable result out.
+    source = Path(path)
+    parser = _parsers.get(source.suffix.lower())
+    if parser is None:
+        raise ParserUnavailable(f"no parser for {source.suffix or 'files without an extension'}")
+    content_text, blocks = parser(source)
+    return ParsedDoc(
+        path=str(source),
+        title=source.name,
+        content_text=content_text,
+        chunks=chunk_blocks(blocks, max_tokens),
+    )
@@ -10,7 +10,7 @@ from app.services.audit import log_action
 logger = logging.getLogger(__name__)
 
 
-def _parse_due_date(value: str | None) -> date | None:
+def parse_due_date(value: str | None) -> date | None:
     if not value:
         return None
     try:
@@ -19,6 +19,14 @@ def _parse_due_date(value: str | None) -> date | None:
         return None
 
 
+def format_enrichment_comment(enrichment_tips: str) -> str:
+    return (
+        "📋 SOP Reminders for this task:\n"
+        f"{enrichment_tips}\n\n---\n"
+        "Auto-generated from company SOPs."
+    )
+
+
 async def create_task_with_enrichment(
     session: AsyncSession,
     todoist_client: Any,
@@ -26,6 +34,7 @@ async def create_task_with_enrichment(
     enrichment_tips: str,
     inbox_event_id: str | None,
     task_type: str | None,
+    side_effects: list[str] | None = None,
 ) -> models.Task:
     title = extracted_fields.get("title") or "Untitled task"
     priority = extracted_fields.get("priority")
@@ -57,15 +66,13 @@ async def create_task_with_enrichment(
             details={"error": str(exc)},
         )
         raise
+    if side_effects is not None:
+        side_effects.append(f"todoist_task:{task.id}")
 
     try:
         await todoist_client.add_comment(
             task_id=str(task.id),
-            content=(
-                "📋 SOP Reminders for this task:\n"
-                f"{enrichment_tips}\n\n---\n"
-                "Auto-generated from company SOPs."
-            ),
+            content=format_enrichment_comment(enrichment_tips),
         )
         enrichment_added = True
     except Exception as exc:
@@ -88,7 +95,7 @@ async def create_task_with_enrichment(
         task_type=task_type,
         priority=priority,
         assignee=assignee,
-        due_date=_parse_due_date(due_date),
+        due_date=parse_due_date(due_date),
         enrichment_added=enrichment_added,
         sops_cited=None,
         inbox_event_id=inbox_event_id,
@@ -102,6 +109,10 @@ async def create_task_with_enrichment(
         action="task_created",
         entity_type="task",
         entity_id=record.id,
-        details={"todoist_id": str(task.id), "enrichment_added": enrichment_added},
+        details={
+            "todoist_id": str(task.id),
+            "enrichment_added": enrichment_added,
+            "extraction_path": extracted_fields.get("extraction_path"),
+        },
     )
     return record
@@ -1,12 +1,23 @@
 import asyncio
-from typing import Any, Iterable
+from typing import Any, Callable, Iterable
 
+import httpx
 from todoist_api_python.api import TodoistAPI
 
+from app.config import settings
+from app.services.resilience import get_dependency
+
+SYNC_COMMAND_LIMIT = 100
+
 
 class TodoistClient:
     def __init__(self, api_token: str) -> None:
         self.api = TodoistAPI(api_token)
+        self.api_token = api_token
+
+    async def _run(self, call: Callable[[], Any]) -> Any:
+        async with get_dependency("todoist").guard():
+            return await asyncio.to_thread(call)
 
     async def add_task(
         self,
@@ -25,22 +36,34 @@ class TodoistClient:
                 description=description,
             )
 
-        return await asyncio.to_thread(_call)
+        return await self._run(_call)
 
     async def add_comment(self, task_id: str, content: str) -> Any:
         def _call() -> Any:
             return self.api.add_comment(task_id=task_id, content=content)
 
-        return await asyncio.to_thread(_call)
+        return await self._run(_call)
 
     async def get_tasks(self, filter_query: str | None = None) -> list[Any]:
         def _call() -> list[Any]:
             return self.api.get_tasks(filter=filter_query)
 
-        return await asyncio.to_thread(_call)
+        return await self._run(_call)
 
     async def get_comments(self, task_id: str) -> list[Any]:
         def _call() -> list[Any]:
             return self.api.get_comments(task_id=task_id)
 
-        return await asyncio.to_thread(_call)
+        return await self._run(_call)
+
+    async def sync_commands(self, commands: list[dict[str, Any]]) -> dict[str, Any]:
+        if len(commands) > SYNC_COMMAND_LIMIT:
+            raise ValueError(f"Todoist accepts at most {SYNC_COMMAND_LIMIT} commands per sync request")
+        async with get_dependency("todoist").guard(), httpx.AsyncClient(timeout=30) as client:
+            resp = await client.post(
+                settings.todoist_sync_url,
+                headers={"Authorization": f"Bearer {self.api_token}"},
+                json={"commands": commands},
+            )
+            resp.raise_for_status()
+            return resp.json()
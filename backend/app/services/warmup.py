@@ -0,0 +1,48 @@
+import logging
+import time
+from typing import Any
+
+from app.config import settings
+from app.db.session import AsyncSessionLocal, replica_engine, warm_pool
+from app.services.ai import warm_llm_clients
+from app.services.content_router import refresh_centroids
+from app.services.kb_version import record_baseline
+from app.services.knowledge_base import warm_retrieval
+from app.services.reranker import load_term_stats
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_up() -> dict[str, Any]:
+    start = time.perf_counter()
+    report: dict[str, Any] = {"db_connections": await warm_pool()}
+    if replica_engine is not None:
+        report["db_replica_connections"] = await warm_pool(replica_engine)
+    report["llm_clients"] = warm_llm_clients()
+    try:
+        async with AsyncSessionLocal() as session:
+            report["kb_version"] = await record_baseline(session)
+    except Exception as exc:
+        logger.warning("KB version baseline failed", exc_info=exc)
+    try:
+        async with AsyncSessionLocal() as session:
+            report["retrieval_primed"] = bool(await warm_retrieval(session))
+    except Exception as exc:
+        logger.warning("Retrieval warm-up failed", exc_info=exc)
+        report["retrieval_primed"] = False
+    if settings.rag_mode == "inprocess":
+        try:
+            async with AsyncSessionLocal() as session:
+                report["term_stats_chunks"] = (await load_term_stats(session)).doc_count
+        except Exception as exc:
+            logger.warning("Term stats warm-up failed", exc_info=exc)
+    if settings.content_router_enabled and not settings.mock_mode:
+        try:
+            async with AsyncSessionLocal() as session:
+                report["router_pipelines"] = len(await refresh_centroids(session))
+        except Exception as exc:
+            logger.warning("Content router warm-up failed", exc_info=exc)
+            report["router_pipelines"] = 0
+    report["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    logger.info("Warm-up complete", extra=report)
+    return report
@@ -1,11 +1,95 @@
+import asyncio
+import logging
+import time
+from typing import Any
+
+from sqlalchemy import exc as sa_exc, text
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    def _do_get(self) -> Any:
+        stats = self.__dict__.setdefault(
+            "wait_stats", {"checkouts": 0, "timeouts": 0, "wait_total_s": 0.0, "wait_max_s": 0.0}
+        )
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except sa_exc.TimeoutError:
+            stats["timeouts"] += 1
+            raise
+        waited = time.perf_counter() - start
+        stats["checkouts"] += 1
+        stats["wait_total_s"] += waited
+        stats["wait_max_s"] = max(stats["wait_max_s"], waited)
+        return conn
+
+
+def _connect_args() -> dict[str, Any]:
+    if settings.db_pgbouncer:
+        # PgBouncer in transaction mode cannot keep server-side prepared statements.
+        return {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+    return {"statement_cache_size": settings.db_statement_cache_size}
+
 
-def get_engine() -> AsyncEngine:
-    return create_async_engine(settings.database_url, future=True, echo=False)
+def get_engine(url: str | None = None) -> AsyncEngine:
+    return create_async_engine(
+        url or settings.database_url,
+        future=True,
+        echo=False,
+        poolclass=InstrumentedPool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args=_connect_args(),
+    )
 
 
 engine = get_engine()
-AsyncSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+replica_engine = get_engine(settings.database_replica_url) if settings.database_replica_url else None
+# rag_agent only reads, so every session goes to the replica when one is configured.
+AsyncSessionLocal = async_sessionmaker(
+    bind=replica_engine or engine,
+    expire_on_commit=False,
+    class_=AsyncSession,
+)
+
+
+async def warm_pool(target: AsyncEngine | None = None, connections: int | None = None) -> int:
+    target = target or replica_engine or engine
+    count = min(settings.db_pool_warmup if connections is None else connections, settings.db_pool_size)
+
+    async def _ping() -> None:
+        async with target.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    # Concurrent pings force distinct connections to be opened.
+    try:
+        await asyncio.gather(*(_ping() for _ in range(count)))
+    except Exception as exc:
+        logger.warning("Database pool warm-up failed", exc_info=exc)
+        return 0
+    return count
+
+
+def pool_stats(target: AsyncEngine | None = None) -> dict[str, Any]:
+    pool = (target or replica_engine or engine).pool
+    stats = getattr(pool, "wait_stats", {"checkouts": 0, "timeouts": 0, "wait_total_s": 0.0, "wait_max_s": 0.0})
+    checkouts = stats["checkouts"]
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "checkouts": checkouts,
+        "timeouts": stats["timeouts"],
+        "wait_ms_avg": round(stats["wait_total_s"] / checkouts * 1000, 3) if checkouts else 0.0,
+        "wait_ms_max": round(stats["wait_max_s"] * 1000, 3),
+    }
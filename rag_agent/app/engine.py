@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.context_builder import build_context
+from app.knowledge_base import retrieve_chunks, retrieve_chunks_batch
+from app.llm_client import get_llm_client
+from app.reranker import get_term_stats, rerank, tokenize
+
+# A chunk matching every query term (idf-weighted) adds this much to its similarity.
+TERM_COVERAGE_WEIGHT = 0.1
+
+
+def _rerank_score(chunk: dict[str, Any]) -> float:
+    return float(chunk.get("rerank_score", chunk.get("similarity")) or 0.0)
+
+
+def compute_confidence(chunks: list[dict[str, Any]]) -> float:
+    if not chunks:
+        return 0.0
+    # Absolute signals only: the rerank score scales BM25 against the best
+    # candidate, so it is high even when nothing is relevant.
+    return max(
+        min(1.0, float(chunk.get("similarity") or 0.0) + TERM_COVERAGE_WEIGHT * float(chunk.get("term_coverage") or 0.0))
+        for chunk in chunks
+    )
+
+
+def dedupe_citations(query: str, chunks: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    # Cite in rerank order, but only chunks that share a term with the query.
+    chunks = sorted(chunks, key=_rerank_score, reverse=True)
+    has_terms = bool(tokenize(query))
+    seen: set[tuple[str | None, str | None, str | None]] = set()
+    citations: list[dict[str, Any]] = []
+    for c in chunks:
+        chunk_text = c.get("chunk_text") or ""
+        section = c.get("section_ref")
+        if chunk_text.strip().startswith("#") and not section:
+            continue
+        if has_terms and not c.get("matched_terms"):
+            continue
+        key = (c.get("doc_title"), section, chunk_text)
+        if key in seen:
+            continue
+        seen.add(key)
+        citations.append(
+            {
+                "source": c.get("doc_title"),
+                "section": section,
+                "chunk": chunk_text,
+                "also_in": c.get("source_docs") or [],
+            }
+        )
+        if len(citations) >= 2:
+            break
+    if citations:
+        return citations
+    for c in chunks[:2]:
+        citations.append(
+            {
+                "source": c.get("doc_title"),
+                "section": c.get("section_ref"),
+                "chunk": c.get("chunk_text"),
+                "also_in": c.get("source_docs") or [],
+            }
+        )
+    return citations
+
+
+async def answer_with_context(query: str, chunks: list[dict[str, Any]]) -> str:
+    if not chunks:
+        return "I couldn't find a policy covering this."
+
+    context_blob = build_context(chunks, query).text
+    system_prompt = (
+        "You are a strict policy assistant for a Family Office. "
+        "Use ONLY the provided context. Never guess or invent policies. "
+        "Answer concisely and in a structured way (short title + bullet points if helpful). "
+        "Always include a short 'Source:' line at the end with document name and section."
+    )
+    user_prompt = (
+        "Question: {query}\n\n"
+        "Context:\n{context_blob}\n\n"
+        "If the context does not answer the question, reply exactly: "
+        "\"I couldn't find a policy covering this.\""
+    ).format(query=query, context_blob=context_blob)
+
+    content = await get_llm_client().chat(
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        temperature=0.1,
+    )
+    return content.strip()
+
+
+async def build_answer(query: str, chunks: list[dict[str, Any]]) -> dict[str, Any]:
+    content = await answer_with_context(query, chunks)
+    return {
+        "answer": content,
+        "citations": dedupe_citations(query, chunks),
+        "confidence": compute_confidence(chunks),
+    }
+
+
+async def retrieve(session: AsyncSession, query: str) -> list[dict[str, Any]]:
+    candidates = await retrieve_chunks(session, query, k=settings.rerank_candidates)
+    stats = await get_term_stats(session)
+    return rerank(query, candidates, stats)
+
+
+async def retrieve_batch(session: AsyncSession, queries: list[str]) -> list[list[dict[str, Any]]]:
+    candidate_groups = await retrieve_chunks_batch(session, queries, k=settings.rerank_candidates)
+    stats = await get_term_stats(session)
+    return [rerank(query, candidates, stats) for query, candidates in zip(queries, candidate_groups)]
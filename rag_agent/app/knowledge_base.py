@@ -8,6 +8,40 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from pgvector.sqlalchemy import Vector
 
 from app.config import settings
+from app.llm_client import get_llm_client
+
+
+# Other documents a near-duplicate chunk was collapsed from (kb_chunk_sources),
+# so every version stays citable.
+_SOURCE_DOCS_SELECT = """(
+            SELECT array_agg(DISTINCT sd.title ORDER BY sd.title)
+            FROM kb_chunk_sources s
+            JOIN kb_docs sd ON sd.id = s.doc_id
+            WHERE s.chunk_id = kc.id AND s.doc_id <> kc.doc_id
+        ) AS source_docs"""
+
+# Shared with scripts/bench_query_plans.py, which checks the plans of these statements.
+VECTOR_SEARCH_SQL = f"""
+        SELECT kc.chunk_text, kc.section_ref, kd.title as doc_title, {_SOURCE_DOCS_SELECT},
+               1 - (kc.embedding <=> :embedding) AS similarity
+        FROM kb_chunks kc
+        JOIN kb_docs kd ON kd.id = kc.doc_id
+        ORDER BY kc.embedding <=> :embedding
+        LIMIT :k
+        """
+
+
+def keyword_search_sql(term_count: int) -> str:
+    # One ILIKE per term, bound as :t0, :t1, ...
+    like_clauses = " OR ".join(f"kc.chunk_text ILIKE :t{i}" for i in range(term_count))
+    return f"""
+        SELECT kc.chunk_text, kc.section_ref, kd.title as doc_title, {_SOURCE_DOCS_SELECT},
+               0.0 AS similarity
+        FROM kb_chunks kc
+        JOIN kb_docs kd ON kd.id = kc.doc_id
+        WHERE {like_clauses}
+        LIMIT :k
+        """
 
 
 def _mock_vector(text_value: str, dim: int = 1536) -> list[float]:
@@ -25,14 +59,7 @@ async def embed_texts(texts: list[str]) -> list[list[float]]:
     if not settings.openai_api_key:
         return [_mock_vector(text_value) for text_value in texts]
 
-    from langchain_openai import OpenAIEmbeddings
-
-    embeddings = OpenAIEmbeddings(
-        model=settings.embedding_model,
-        openai_api_key=settings.openai_api_key,
-        openai_api_base=settings.openai_base_url,
-    )
-    return await embeddings.aembed_documents(texts)
+    return await get_llm_client().embed(texts)
 
 
 async def _vector_search(
@@ -42,16 +69,7 @@ async def _vector_search(
     min_similarity: float,
 ) -> list[dict[str, Any]]:
     embedding = (await embed_texts([query]))[0]
-    stmt = text(
-        """
-        SELECT kc.chunk_text, kc.section_ref, kd.title as doc_title,
-               1 - (kc.embedding <=> :embedding) AS similarity
-        FROM kb_chunks kc
-        JOIN kb_docs kd ON kd.id = kc.doc_id
-        ORDER BY kc.embedding <=> :embedding
-        LIMIT :k
-        """
-    ).bindparams(bindparam("embedding", type_=Vector(1536)))
+    stmt = text(VECTOR_SEARCH_SQL).bindparams(bindparam("embedding", type_=Vector(1536)))
     result = await session.execute(stmt, {"embedding": embedding, "k": k})
     chunks: list[dict[str, Any]] = []
     seen: set[str] = set()
@@ -67,6 +85,7 @@ async def _vector_search(
                 "chunk_text": row.chunk_text,
                 "section_ref": row.section_ref,
                 "doc_title": row.doc_title,
+                "source_docs": list(row.source_docs or []),
                 "similarity": similarity,
             }
         )
@@ -77,18 +96,8 @@ async def _keyword_search(session: AsyncSession, query: str, k: int) -> list[dic
     terms = _keywords(query)
     if not terms:
         return []
-    like_clauses = " OR ".join(["kc.chunk_text ILIKE :t" + str(i) for i in range(len(terms))])
     params = {"t" + str(i): f"%{term}%" for i, term in enumerate(terms)}
-    stmt = text(
-        f"""
-        SELECT kc.chunk_text, kc.section_ref, kd.title as doc_title,
-               0.0 AS similarity
-        FROM kb_chunks kc
-        JOIN kb_docs kd ON kd.id = kc.doc_id
-        WHERE {like_clauses}
-        LIMIT :k
-        """
-    )
+    stmt = text(keyword_search_sql(len(terms)))
     params["k"] = k
     result = await session.execute(stmt, params)
     chunks: list[dict[str, Any]] = []
@@ -102,21 +111,18 @@ async def _keyword_search(session: AsyncSession, query: str, k: int) -> list[dic
                 "chunk_text": row.chunk_text,
                 "section_ref": row.section_ref,
                 "doc_title": row.doc_title,
+                "source_docs": list(row.source_docs or []),
                 "similarity": 0.0,
             }
         )
     return chunks
 
 
-async def retrieve_chunks(
-    session: AsyncSession,
-    query: str,
-    k: int = 6,
-    min_similarity: float = 0.05,
+def _merge_chunks(
+    vector_chunks: list[dict[str, Any]],
+    keyword_chunks: list[dict[str, Any]],
+    k: int,
 ) -> list[dict[str, Any]]:
-    vector_chunks = await _vector_search(session, query, k, min_similarity)
-    keyword_chunks = await _keyword_search(session, query, k)
-
     seen: set[str] = set()
     merged: list[dict[str, Any]] = []
     for chunk in vector_chunks + keyword_chunks:
@@ -128,3 +134,142 @@ async def retrieve_chunks(
         if len(merged) >= k:
             break
     return merged
+
+
+async def retrieve_chunks(
+    session: AsyncSession,
+    query: str,
+    k: int = 6,
+    min_similarity: float = 0.05,
+) -> list[dict[str, Any]]:
+    vector_chunks = await _vector_search(session, query, k, min_similarity)
+    keyword_chunks = await _keyword_search(session, query, k)
+    return _merge_chunks(vector_chunks, keyword_chunks, k)
+
+
+def _vector_literal(embedding: list[float]) -> str:
+    return "[" + ",".join(str(float(value)) for value in embedding) + "]"
+
+
+async def _vector_search_batch(
+    session: AsyncSession,
+    queries: list[str],
+    k: int,
+    min_similarity: float,
+) -> list[list[dict[str, Any]]]:
+    embeddings = await embed_texts(queries)
+    stmt = text(
+        f"""
+        SELECT q.idx, hit.chunk_text, hit.section_ref, hit.doc_title, hit.source_docs, hit.similarity
+        FROM unnest(CAST(:embeddings AS text[])) WITH ORDINALITY AS q(embedding, idx)
+        CROSS JOIN LATERAL (
+            SELECT kc.chunk_text, kc.section_ref, kd.title AS doc_title, {_SOURCE_DOCS_SELECT},
+                   1 - (kc.embedding <=> CAST(q.embedding AS vector)) AS similarity
+            FROM kb_chunks kc
+            JOIN kb_docs kd ON kd.id = kc.doc_id
+            ORDER BY kc.embedding <=> CAST(q.embedding AS vector)
+            LIMIT :k
+        ) hit
+        ORDER BY q.idx, hit.similarity DESC
+        """
+    )
+    result = await session.execute(
+        stmt,
+        {"embeddings": [_vector_literal(embedding) for embedding in embeddings], "k": k},
+    )
+    grouped: list[list[dict[str, Any]]] = [[] for _ in queries]
+    seen: list[set[str]] = [set() for _ in queries]
+    for row in result.fetchall():
+        idx = int(row.idx) - 1
+        similarity = float(row.similarity or 0.0)
+        if similarity < min_similarity or row.chunk_text in seen[idx]:
+            continue
+        seen[idx].add(row.chunk_text)
+        grouped[idx].append(
+            {
+                "chunk_text": row.chunk_text,
+                "section_ref": row.section_ref,
+                "doc_title": row.doc_title,
+                "source_docs": list(row.source_docs or []),
+                "similarity": similarity,
+            }
+        )
+    return grouped
+
+
+async def _keyword_search_batch(session: AsyncSession, queries: list[str], k: int) -> list[list[dict[str, Any]]]:
+    idxs: list[int] = []
+    patterns: list[str] = []
+    for idx, query in enumerate(queries):
+        for term in _keywords(query):
+            idxs.append(idx)
+            patterns.append(f"%{term}%")
+    grouped: list[list[dict[str, Any]]] = [[] for _ in queries]
+    if not patterns:
+        return grouped
+
+    stmt = text(
+        f"""
+        WITH p AS (
+            SELECT * FROM unnest(CAST(:idxs AS int[]), CAST(:patterns AS text[])) AS p(idx, pattern)
+        )
+        SELECT q.idx, hit.chunk_text, hit.section_ref, hit.doc_title, hit.source_docs
+        FROM (SELECT DISTINCT idx FROM p) q
+        CROSS JOIN LATERAL (
+            SELECT kc.chunk_text, kc.section_ref, kd.title AS doc_title, {_SOURCE_DOCS_SELECT}
+            FROM kb_chunks kc
+            JOIN kb_docs kd ON kd.id = kc.doc_id
+            WHERE EXISTS (SELECT 1 FROM p WHERE p.idx = q.idx AND kc.chunk_text ILIKE p.pattern)
+            LIMIT :k
+        ) hit
+        """
+    )
+    result = await session.execute(stmt, {"idxs": idxs, "patterns": patterns, "k": k})
+    seen: list[set[str]] = [set() for _ in queries]
+    for row in result.fetchall():
+        idx = int(row.idx)
+        if row.chunk_text in seen[idx]:
+            continue
+        seen[idx].add(row.chunk_text)
+        grouped[idx].append(
+            {
+                "chunk_text": row.chunk_text,
+                "section_ref": row.section_ref,
+                "doc_title": row.doc_title,
+                "source_docs": list(row.source_docs or []),
+                "similarity": 0.0,
+            }
+        )
+    return grouped
+
+
+async def retrieve_chunks_batch(
+    session: AsyncSession,
+    queries: list[str],
+    k: int = 6,
+    min_similarity: float = 0.05,
+) -> list[list[dict[str, Any]]]:
+    if not queries:
+        return []
+    vector_groups = await _vector_search_batch(session, queries, k, min_similarity)
+    keyword_groups = await _keyword_search_batch(session, queries, k)
+    return [
+        _merge_chunks(vector_chunks, keyword_chunks, k)
+        for vector_chunks, keyword_chunks in zip(vector_groups, keyword_groups)
+    ]
+
+
+async def warm_retrieval(session: AsyncSession) -> int:
+    if settings.openai_api_key:
+        get_llm_client().warm()
+    probe = [1.0] + [0.0] * 1535
+    stmt = text(
+        """
+        SELECT kc.id
+        FROM kb_chunks kc
+        ORDER BY kc.embedding <=> :embedding
+        LIMIT 1
+        """
+    ).bindparams(bindparam("embedding", type_=Vector(1536)))
+    result = await session.execute(stmt, {"embedding": probe})
+    return len(result.fetchall())
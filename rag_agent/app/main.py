@@ -1,16 +1,62 @@
 from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
 from typing import Any
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 
-from langchain_openai import ChatOpenAI
 from app.config import settings
-from app.db import AsyncSessionLocal
-from app.knowledge_base import retrieve_chunks
-
-
-app = FastAPI(title="RAG Agent Service")
+from app.context_builder import context_stats
+from app.db import AsyncSessionLocal, engine, pool_stats, replica_engine, warm_pool
+from app.engine import build_answer, retrieve, retrieve_batch
+from app.kb_version import kb_version_stats, record_baseline, register_cache, start_kb_listener, stop_kb_listener
+from app.knowledge_base import warm_retrieval
+from app.llm_client import close_llm_client, get_llm_client
+from app.reranker import load_term_stats, reload_term_stats
+
+logger = logging.getLogger(__name__)
+
+
+async def _warm_up() -> dict[str, Any]:
+    start = time.perf_counter()
+    report: dict[str, Any] = {"db_connections": await warm_pool()}
+    if settings.openai_api_key:
+        get_llm_client().warm()
+    report["llm_client"] = bool(settings.openai_api_key)
+    try:
+        async with AsyncSessionLocal() as session:
+            report["kb_version"] = await record_baseline(session)
+            report["retrieval_primed"] = bool(await warm_retrieval(session))
+            report["term_stats_chunks"] = (await load_term_stats(session)).doc_count
+    except Exception as exc:
+        logger.warning("Retrieval warm-up failed", exc_info=exc)
+        report["retrieval_primed"] = False
+    report["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    logger.info("Warm-up complete", extra=report)
+    return report
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    app.state.warmup = await _warm_up()
+    register_cache("reranker_term_stats", reload_term_stats)
+    app.state.kb_listener = start_kb_listener()
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    await stop_kb_listener(app.state.kb_listener)
+    await close_llm_client()
+    await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+
+
+app = FastAPI(title="RAG Agent Service", lifespan=lifespan)
 
 
 class AskRequest(BaseModel):
@@ -23,108 +69,78 @@ class AskResponse(BaseModel):
     confidence: float
 
 
-def _keywords(query: str) -> list[str]:
-    tokens = [t.strip().lower() for t in query.replace("?", " ").split()]
-    return [t for t in tokens if len(t) > 3]
+class AskBatchRequest(BaseModel):
+    queries: list[str]
 
 
-def _compute_confidence(query: str, chunks: list[dict[str, Any]]) -> float:
-    if not chunks:
-        return 0.0
-    max_similarity = max(chunk.get("similarity", 0.0) for chunk in chunks)
-    terms = _keywords(query)
-    if terms:
-        hit = any(
-            any(term in (c.get("chunk_text") or "").lower() for term in terms)
-            for c in chunks
-        )
-        if hit:
-            max_similarity = min(1.0, max_similarity + 0.1)
-    return max_similarity
+class AskBatchItem(BaseModel):
+    answer: str | None = None
+    citations: list[dict[str, Any]] = []
+    confidence: float = 0.0
+    error: str | None = None
 
 
-def _dedupe_citations(query: str, chunks: list[dict[str, Any]]) -> list[dict[str, Any]]:
-    terms = _keywords(query)
-    seen: set[tuple[str | None, str | None, str | None]] = set()
-    citations: list[dict[str, Any]] = []
-    sorted_chunks = sorted(chunks, key=lambda c: c.get("similarity", 0.0), reverse=True)
-    for c in sorted_chunks:
-        chunk_text = c.get("chunk_text") or ""
-        section = c.get("section_ref")
-        if chunk_text.strip().startswith("#") and not section:
-            continue
-        if terms and not any(term in chunk_text.lower() for term in terms):
-            continue
-        key = (c.get("doc_title"), section, chunk_text)
-        if key in seen:
-            continue
-        seen.add(key)
-        citations.append(
-            {
-                "source": c.get("doc_title"),
-                "section": section,
-                "chunk": chunk_text,
-            }
-        )
-        if len(citations) >= 2:
-            break
-    if citations:
-        return citations
-    for c in sorted_chunks[:2]:
-        citations.append(
-            {
-                "source": c.get("doc_title"),
-                "section": c.get("section_ref"),
-                "chunk": c.get("chunk_text"),
-            }
+class AskBatchResponse(BaseModel):
+    results: list[AskBatchItem]
+
+
+@app.post("/answer", response_model=AskResponse)
+async def answer(request: AskRequest) -> AskResponse:
+    async with AsyncSessionLocal() as session:
+        chunks = await retrieve(session, request.query)
+
+    return AskResponse(**await build_answer(request.query, chunks))
+
+
+@app.post("/answer/batch", response_model=AskBatchResponse)
+async def answer_batch(request: AskBatchRequest) -> AskBatchResponse:
+    if len(request.queries) > settings.answer_batch_max_size:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large (max {settings.answer_batch_max_size} queries)",
         )
-    return citations
 
+    async with AsyncSessionLocal() as session:
+        chunk_groups = await retrieve_batch(session, request.queries)
 
-async def _answer_with_context(query: str, chunks: list[dict[str, Any]]) -> str:
-    if not chunks:
-        return "I couldn't find a policy covering this."
+    semaphore = asyncio.Semaphore(settings.answer_batch_concurrency)
 
-    context_blob = "\n\n".join(
-        f"[{c.get('doc_title')} {c.get('section_ref')}] {c.get('chunk_text')}"
-        for c in chunks
-    )
-    system_prompt = (
-        "You are a strict policy assistant for a Family Office. "
-        "Use ONLY the provided context. Never guess or invent policies. "
-        "Answer concisely and in a structured way (short title + bullet points if helpful). "
-        "Always include a short 'Source:' line at the end with document name and section."
-    )
-    user_prompt = (
-        "Question: {query}\n\n"
-        "Context:\n{context_blob}\n\n"
-        "If the context does not answer the question, reply exactly: "
-        "\"I couldn't find a policy covering this.\""
-    ).format(query=query, context_blob=context_blob)
-
-    llm = ChatOpenAI(
-        model=settings.openai_model,
-        temperature=0.1,
-        api_key=settings.openai_api_key,
-        base_url=settings.openai_base_url,
-    )
-    response = await llm.ainvoke(
-        [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ]
+    async def _run(query: str, chunks: list[dict[str, Any]]) -> AskBatchItem:
+        async with semaphore:
+            try:
+                result = await build_answer(query, chunks)
+            except Exception as exc:
+                return AskBatchItem(error=str(exc) or exc.__class__.__name__)
+        return AskBatchItem(**result)
+
+    results = await asyncio.gather(
+        *(_run(query, chunks) for query, chunks in zip(request.queries, chunk_groups))
     )
-    return (response.content or "").strip()
+    return AskBatchResponse(results=list(results))
 
 
-@app.post("/answer", response_model=AskResponse)
-async def answer(request: AskRequest) -> AskResponse:
-    async with AsyncSessionLocal() as session:
-        chunks = await retrieve_chunks(session, request.query, k=6)
+@app.get("/health")
+async def health() -> dict[str, str]:
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+async def ready(request: Request) -> dict[str, str]:
+    if not getattr(request.app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"status": "ready"}
+
+
+@app.get("/debug/pool")
+async def debug_pool() -> dict[str, Any]:
+    return pool_stats()
+
 
-    content = await _answer_with_context(request.query, chunks)
+@app.get("/debug/context")
+async def debug_context() -> dict[str, Any]:
+    return context_stats()
 
-    confidence = _compute_confidence(request.query, chunks)
-    citations = _dedupe_citations(request.query, chunks)
 
-    return AskResponse(answer=content, citations=citations, confidence=confidence)
+@app.get("/debug/kb_version")
+async def debug_kb_version() -> dict[str, Any]:
+    return kb_version_stats()
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.kb_version import wait_for_version
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "all", "any", "can", "has", "have", "how", "what",
+    "when", "where", "which", "who", "why", "with", "this", "that", "from", "into", "our", "your", "does",
+    "should", "must", "will", "per",
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(value: str) -> list[str]:
+    return [word for word in _WORD_RE.findall(value.lower()) if len(word) > 2 and word not in _STOPWORDS]
+
+
+@dataclass
+class TermStats:
+    doc_count: int = 0
+    avg_length: float = 0.0
+    doc_freq: dict[str, int] = field(default_factory=dict)
+
+    def idf(self, term: str) -> float:
+        df = self.doc_freq.get(term, 0)
+        return math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+
+
+_term_stats: TermStats | None = None
+_term_stats_lock = asyncio.Lock()
+
+
+async def load_term_stats(session: AsyncSession) -> TermStats:
+    global _term_stats
+    result = await session.execute(text("SELECT chunk_text FROM kb_chunks"))
+    doc_freq: Counter[str] = Counter()
+    total_length = 0
+    doc_count = 0
+    for (chunk_text,) in result:
+        tokens = tokenize(chunk_text or "")
+        doc_freq.update(set(tokens))
+        total_length += len(tokens)
+        doc_count += 1
+    _term_stats = TermStats(
+        doc_count=doc_count,
+        avg_length=total_length / doc_count if doc_count else 0.0,
+        doc_freq=dict(doc_freq),
+    )
+    return _term_stats
+
+
+async def get_term_stats(session: AsyncSession) -> TermStats:
+    if _term_stats is not None:
+        return _term_stats
+    async with _term_stats_lock:
+        if _term_stats is not None:
+            return _term_stats
+        return await load_term_stats(session)
+
+
+def invalidate_term_stats() -> None:
+    global _term_stats
+    _term_stats = None
+
+
+async def reload_term_stats(version: int) -> None:
+    # Rebuild in place; requests keep using the old stats until the new ones are ready.
+    if _term_stats is None:
+        return
+    async with AsyncSessionLocal() as session:
+        await wait_for_version(session, version)
+        await load_term_stats(session)
+
+
+def _bm25(query_terms: list[str], tokens: list[str], stats: TermStats) -> float:
+    if not tokens or not stats.doc_count:
+        return 0.0
+    counts = Counter(tokens)
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / (stats.avg_length or len(tokens)))
+    score = 0.0
+    for term in query_terms:
+        tf = counts.get(term, 0)
+        if tf:
+            score += stats.idf(term) * tf * (BM25_K1 + 1) / (tf + norm)
+    return score
+
+
+def rerank(
+    query: str,
+    chunks: list[dict[str, Any]],
+    stats: TermStats,
+    top_n: int | None = None,
+) -> list[dict[str, Any]]:
+    top_n = settings.rerank_top_n if top_n is None else top_n
+    query_terms = list(dict.fromkeys(tokenize(query)))
+    query_idf = sum(stats.idf(term) for term in query_terms)
+    scored: list[dict[str, Any]] = []
+    for chunk in chunks:
+        tokens = tokenize(chunk.get("chunk_text") or "")
+        section_terms = set(tokenize(chunk.get("section_ref") or ""))
+        matched = set(query_terms) & set(tokens)
+        scored.append(
+            {
+                **chunk,
+                "bm25": _bm25(query_terms, tokens, stats),
+                "matched_terms": len(matched),
+                # Absolute, unlike the BM25 share: rare query terms count for more
+                # than common ones such as "company".
+                "term_coverage": sum(stats.idf(term) for term in matched) / query_idf if query_idf else 0.0,
+                "section_match": bool(section_terms & set(query_terms)),
+            }
+        )
+    # BM25 is unbounded, so scale it against the best candidate before blending.
+    max_bm25 = max((chunk["bm25"] for chunk in scored), default=0.0) or 1.0
+    for chunk in scored:
+        chunk["rerank_score"] = (
+            settings.rerank_bm25_weight * chunk["bm25"] / max_bm25
+            + settings.rerank_vector_weight * float(chunk.get("similarity") or 0.0)
+            + (settings.rerank_section_boost if chunk["section_match"] else 0.0)
+        )
+    scored.sort(key=lambda chunk: chunk["rerank_score"], reverse=True)
+    return scored[:top_n]